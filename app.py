@@ -1,30 +1,67 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify
+# Primo import: con un message queue applica il monkey patching di eventlet
+import socketio_backend
+from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify, has_app_context
 from flask_login import LoginManager, UserMixin, login_user, login_required, logout_user, current_user
 from flask_socketio import SocketIO, emit
 from werkzeug.security import generate_password_hash, check_password_hash
 from werkzeug.utils import secure_filename
 import sqlite3
 import os
-from datetime import datetime
+from datetime import datetime, timezone
 import uuid
 import time
 import requests
 import json
+import logging
 
 # Importa il nuovo servizio di traduzione
 from translation_service import translation_service
+from translation_queue import translation_queue
+from database import db_pool, get_db, init_app as init_database, start_checkpoint_task
+from menu_cache import menu_cache, normalizza_lingua, LINGUE_MENU
+from menu_read_model import (init_read_model, lingua_read_model, versione_menu, maschera_allergeni,
+                             ID_ALLERGENE_LIBERO, MAX_ID_ALLERGENE)
+from menu_search import init_search_index, espressione_ricerca, ordinamento_bm25
+from menu_realtime import menu_realtime, MENU_ATTESA_MAX_S
+from image_pipeline import image_pipeline, elimina_varianti
+from static_assets import static_assets
+from compression import compressione, negozia_encoding, COMPRESSIONE_RISPOSTE
+from json_provider import init_app as init_json
+from schema_migrations import run_migrations, check_query_plans
+from user_cache import user_cache
+from instrumentation import init_app as init_instrumentation, request_metrics, prometheus_metric, metrics_authorized
+from logging_config import setup_logging, init_app as init_logging, logging_stats, CAMPIONATO
 
-# Variabile globale per tracciare l'ultimo aggiornamento
-ultimo_aggiornamento = int(time.time() * 1000)
+# Log strutturati (JSON) scritti da un thread dedicato, livelli per modulo da LOG_LEVELS
+setup_logging()
+logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'dev-key-change-in-production')
 app.config['UPLOAD_FOLDER'] = 'static/uploads'
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
+# jsonify con orjson se installato, altrimenti la libreria standard
+init_json(app)
 
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
+# Secondi per cui browser e proxy possono riusare le API del menu senza rivalidarle
+MENU_CACHE_MAX_AGE = int(os.environ.get('MENU_CACHE_MAX_AGE', '0'))
 cors_origins = os.environ.get('CORS_ORIGINS', 'http://localhost:5001,http://127.0.0.1:5001').split(',')
-socketio = SocketIO(app, cors_allowed_origins=cors_origins)
+# Con SOCKETIO_MESSAGE_QUEUE gli emit passano dal message queue e raggiungono i client di tutti i worker
+socketio = SocketIO(app, cors_allowed_origins=cors_origins, **socketio_backend.socketio_options())
+# Delta del menu per stanze di lingua/categoria, eventi admin solo ai client autenticati
+menu_realtime.init_app(socketio)
+
+# Pool di connessioni SQLite: una connessione per richiesta, rilasciata al teardown
+init_database(app)
+# Tempo per richiesta, conteggio query SQL e log delle query lente
+init_instrumentation(app)
+# Id della richiesta nei log e nell'header X-Request-ID
+init_logging(app)
+# File statici con impronta (asset_url nei template) e cache immutabile
+static_assets.init_app(app)
+# gzip/brotli per JSON e HTML dinamici (dopo la misurazione: il tempo di compressione è incluso)
+compressione.init_app(app)
 
 # Configurazione Flask-Login
 login_manager = LoginManager()
@@ -55,13 +92,15 @@ class User(UserMixin):
         self.username = username
         self.password_hash = password_hash
 
+def carica_utente(user_id):
+    cursor = get_db().cursor()
+    cursor.execute('SELECT id, username, password_hash FROM utenti WHERE id = ?', (user_id,))
+    return cursor.fetchone()
+
 @login_manager.user_loader
 def load_user(user_id):
-    conn = sqlite3.connect('ristorante.db')
-    cursor = conn.cursor()
-    cursor.execute('SELECT * FROM utenti WHERE id = ?', (user_id,))
-    user_data = cursor.fetchone()
-    conn.close()
+    # Cache in processo (e opzionalmente sessione firmata) davanti alla tabella utenti
+    user_data = user_cache.load(user_id, carica_utente)
     
     if user_data:
         return User(user_data[0], user_data[1], user_data[2])
@@ -69,7 +108,7 @@ def load_user(user_id):
 
 # Inizializzazione database
 def init_db():
-    conn = sqlite3.connect('ristorante.db')
+    conn = db_pool.acquire()
     cursor = conn.cursor()
     
     # Tabella utenti
@@ -266,23 +305,16 @@ def init_db():
     
     conn.commit()
     
-    # Aggiungi colonna 'attivo' alla tabella prodotti se non esiste
-    try:
-        cursor.execute('ALTER TABLE prodotti ADD COLUMN attivo BOOLEAN DEFAULT 1')
-        conn.commit()
-    except sqlite3.OperationalError:
-        # La colonna esiste già
-        pass
+    # Colonne aggiunte nel tempo e indici: migrazioni versionate in migrations/
+    run_migrations(conn)
     
-    # Aggiungi colonna 'ultimo_aggiornamento' alla tabella prodotti se non esiste
-    try:
-        cursor.execute('ALTER TABLE prodotti ADD COLUMN ultimo_aggiornamento TIMESTAMP DEFAULT CURRENT_TIMESTAMP')
-        conn.commit()
-    except sqlite3.OperationalError:
-        # La colonna esiste già
-        pass
+    # Modello di lettura del menu pubblico, mantenuto dai trigger
+    init_read_model(conn)
+    # Indice FTS5 della ricerca nel menu, anch'esso mantenuto dai trigger
+    init_search_index(conn)
+    check_query_plans(conn)
     
-    conn.close()
+    db_pool.release(conn)
 
 # Route per il login
 @app.route('/')
@@ -292,11 +324,10 @@ def login():
         username = request.form['username']
         password = request.form['password']
         
-        conn = sqlite3.connect('ristorante.db')
+        conn = get_db()
         cursor = conn.cursor()
         cursor.execute('SELECT * FROM utenti WHERE username = ?', (username,))
         user_data = cursor.fetchone()
-        conn.close()
         
         if user_data and check_password_hash(user_data[2], password):
             user = User(user_data[0], user_data[1], user_data[2])
@@ -316,21 +347,22 @@ def home():
 # Route per visualizzare tutti i prodotti (senza autenticazione)
 @app.route('/menu')
 def menu():
-    conn = sqlite3.connect('ristorante.db')
+    conn = get_db()
     cursor = conn.cursor()
     
     # Recupera i dati azienda
     cursor.execute('SELECT * FROM azienda LIMIT 1')
     dati_azienda = cursor.fetchone()
     
-    conn.close()
+    # Varianti ridimensionate del logo (None finché non sono pronte)
+    logo_varianti = json.loads(dati_azienda[15]) or None if dati_azienda and dati_azienda[15] else None
     
-    return render_template('menu.html', dati_azienda=dati_azienda)
+    return render_template('menu.html', dati_azienda=dati_azienda, logo_varianti=logo_varianti)
 
 @app.route('/gestione-prodotti')
 @login_required
 def gestione_prodotti():
-    conn = sqlite3.connect('ristorante.db')
+    conn = get_db()
     cursor = conn.cursor()
     
     # Recupera tutti i prodotti con informazioni sulla categoria
@@ -381,8 +413,6 @@ def gestione_prodotti():
         }
         categorie.append(categoria)
     
-    conn.close()
-    
     return render_template('gestione_prodotti.html', prodotti=prodotti, categorie=categorie)
 
 # API per aggiungere prodotto
@@ -414,15 +444,14 @@ def aggiungi_prodotto():
             categoria_id = int(categoria_id)
         disponibile = request.form.get('disponibile', 'false').lower() == 'true'
         
-        print(f"=== DEBUG BACKEND PUT ===")
-        print(f"Disponibile raw value: '{request.form.get('disponibile')}'")
-        print(f"Disponibile converted: {disponibile}")
-        print(f"All form data: {dict(request.form)}")
+        logger.debug("Nuovo prodotto %r: disponibile=%r (valore ricevuto %r)",
+                     nome, disponibile, request.form.get('disponibile'))
         
         # Gestione allergeni e ingredienti
         allergeni_json = request.form.get('allergeni', '[]')
         ingredienti_json = request.form.get('ingredienti', '[]')
-        foto_path = None
+        # Solo l'originale: le varianti vengono generate in background
+        foto_path = save_uploaded_file(request.files.get('foto'))
     
     # Parse degli array JSON
     import json
@@ -433,7 +462,7 @@ def aggiungi_prodotto():
         allergeni_ids = []
         ingredienti_ids = []
     
-    conn = sqlite3.connect('ristorante.db')
+    conn = get_db()
     cursor = conn.cursor()
     
     # Inserisci il prodotto con traduzioni automatiche
@@ -444,16 +473,11 @@ def aggiungi_prodotto():
     
     prodotto_id = cursor.lastrowid
     
-    # Chiudi la connessione temporaneamente per usare il servizio di traduzione
     conn.commit()
-    conn.close()
     
-    # Traduci e salva automaticamente nel database
-    translation_service.translate_and_save_product(prodotto_id, nome, descrizione)
-    
-    # Riapri la connessione per le associazioni
-    conn = sqlite3.connect('ristorante.db')
-    cursor = conn.cursor()
+    # Accoda la traduzione automatica e le varianti della foto (eseguite in background)
+    job_traduzione = translation_queue.enqueue('prodotti', prodotto_id, nome, descrizione)
+    image_pipeline.accoda('prodotti', prodotto_id, foto_path)
     
     # Inserisci associazioni con allergeni
     for allergene_id in allergeni_ids:
@@ -470,17 +494,15 @@ def aggiungi_prodotto():
         ''', (prodotto_id, ingrediente_id))
     
     conn.commit()
-    conn.close()
     
     # Traduzioni automatiche disabilitate per migliorare le performance
     # Le traduzioni possono essere aggiunte manualmente tramite l'interfaccia admin
     
-    # Aggiorna timestamp per polling
-    global ultimo_aggiornamento
-    ultimo_aggiornamento = int(time.time() * 1000)
+    # Aggiorna la snapshot del menu pubblico
+    versione = invalida_menu()
     
     # Emetti aggiornamento in tempo reale
-    socketio.emit('prodotto_aggiunto', {
+    menu_realtime.admin('prodotto_aggiunto', {
         'id': prodotto_id,
         'nome': nome,
         'descrizione': descrizione,
@@ -489,8 +511,9 @@ def aggiungi_prodotto():
         'foto': foto_path,
         'disponibile': disponibile
     })
+    notifica_prodotto(cursor, prodotto_id, None, versione)
     
-    return jsonify({'success': True, 'id': prodotto_id, 'foto': foto_path})
+    return jsonify({'success': True, 'id': prodotto_id, 'foto': foto_path, 'traduzione_job_id': job_traduzione})
 
 
 
@@ -498,18 +521,18 @@ def aggiungi_prodotto():
 @app.route('/api/menu/<int:prodotto_id>', methods=['DELETE'])
 @login_required
 def elimina_prodotto(prodotto_id):
-    conn = sqlite3.connect('ristorante.db')
+    conn = get_db()
     cursor = conn.cursor()
     
     # Prima di eliminare il prodotto, recupera il percorso della foto
-    cursor.execute('SELECT foto FROM prodotti WHERE id = ?', (prodotto_id,))
+    cursor.execute('SELECT foto, foto_varianti FROM prodotti WHERE id = ?', (prodotto_id,))
     result = cursor.fetchone()
-    foto_path = result[0] if result else None
+    foto_path, foto_varianti = result if result else (None, None)
+    radice = radice_prodotto(cursor, prodotto_id)
     
     # Elimina il prodotto dal database
     cursor.execute('DELETE FROM prodotti WHERE id = ?', (prodotto_id,))
     conn.commit()
-    conn.close()
     
     # Elimina la foto dal filesystem se esiste
     if foto_path:
@@ -517,12 +540,17 @@ def elimina_prodotto(prodotto_id):
         if os.path.exists(full_foto_path):
             try:
                 os.remove(full_foto_path)
-                print(f"Foto eliminata: {full_foto_path}")
+                logger.info("Foto eliminata: %s", full_foto_path)
             except OSError as e:
-                print(f"Errore nell'eliminazione della foto {full_foto_path}: {e}")
+                logger.warning("Errore nell'eliminazione della foto %s: %s", full_foto_path, e)
+    elimina_varianti(foto_varianti)
+    
+    # Aggiorna la snapshot del menu pubblico
+    versione = invalida_menu()
     
     # Emetti aggiornamento in tempo reale
-    socketio.emit('prodotto_eliminato', {'id': prodotto_id})
+    menu_realtime.admin('prodotto_eliminato', {'id': prodotto_id})
+    notifica_prodotto(cursor, prodotto_id, radice, versione)
     
     return {'success': True}
 
@@ -560,12 +588,11 @@ def dati_azienda():
 @app.route('/api/dati-azienda', methods=['GET'])
 @login_required
 def get_dati_azienda():
-    conn = sqlite3.connect('ristorante.db')
+    conn = get_db()
     cursor = conn.cursor()
     
     cursor.execute('SELECT * FROM azienda WHERE id = 1')
     azienda = cursor.fetchone()
-    conn.close()
     
     if azienda:
         return jsonify({
@@ -581,7 +608,8 @@ def get_dati_azienda():
             'google_url': azienda[9],
             'sito_web': azienda[10],
             'descrizione': azienda[11],
-            'orari_apertura': azienda[12]
+            'orari_apertura': azienda[12],
+            'logo_varianti': json.loads(azienda[15]) if azienda[15] else None  # migrazione 0004
         })
     else:
         return jsonify({
@@ -605,7 +633,7 @@ def update_dati_azienda():
     try:
         data = request.get_json()
         
-        conn = sqlite3.connect('ristorante.db')
+        conn = get_db()
         cursor = conn.cursor()
         
         # Aggiorna o inserisce i dati azienda
@@ -629,7 +657,6 @@ def update_dati_azienda():
         ))
         
         conn.commit()
-        conn.close()
         
         return jsonify({'success': True, 'message': 'Dati azienda aggiornati con successo'})
         
@@ -651,11 +678,13 @@ def upload_logo():
             filename = save_uploaded_file(file)
             
             # Aggiorna il logo nel database
-            conn = sqlite3.connect('ristorante.db')
+            conn = get_db()
             cursor = conn.cursor()
-            cursor.execute('UPDATE azienda SET logo = ?, updated_at = CURRENT_TIMESTAMP WHERE id = 1', (filename,))
+            cursor.execute('''
+                UPDATE azienda SET logo = ?, logo_varianti = NULL, updated_at = CURRENT_TIMESTAMP WHERE id = 1
+            ''', (filename,))
             conn.commit()
-            conn.close()
+            image_pipeline.accoda('azienda', 1, filename)
             
             return jsonify({'success': True, 'message': 'Logo caricato con successo', 'logo_path': filename})
         else:
@@ -668,7 +697,7 @@ def upload_logo():
 @app.route('/api/categorie', methods=['GET'])
 @login_required
 def get_categorie():
-    conn = sqlite3.connect('ristorante.db')
+    conn = get_db()
     cursor = conn.cursor()
     
     # Query per ottenere tutte le categorie con i loro parent
@@ -681,8 +710,6 @@ def get_categorie():
     ''')
     all_categorie = cursor.fetchall()
     
-    conn.close()
-    
     categorie_list = []
     for cat in all_categorie:
         categorie_list.append({
@@ -703,7 +730,7 @@ def aggiungi_categoria():
     try:
         data = request.get_json()
         
-        conn = sqlite3.connect('ristorante.db')
+        conn = get_db()
         cursor = conn.cursor()
         cursor.execute('''
             INSERT INTO categorie (nome, parent_id, descrizione, ordine) 
@@ -712,19 +739,22 @@ def aggiungi_categoria():
         
         categoria_id = cursor.lastrowid
         conn.commit()
-        conn.close()
         
-        # Traduci e salva automaticamente nel database
+        # Accoda la traduzione automatica (eseguita in background)
+        job_traduzione = None
         try:
-            translation_service.translate_and_save_category(categoria_id, data['nome'], data.get('descrizione'))
-            print(f"Traduzione salvata per categoria {categoria_id}: {data['nome']} - {data.get('descrizione', 'Nessuna descrizione')}")
-        except Exception as e:
-            print(f"Errore nella traduzione categoria {categoria_id}: {e}")
+            job_traduzione = translation_queue.enqueue('categorie', categoria_id, data['nome'], data.get('descrizione'))
+            logger.info("Traduzione accodata per categoria %s (job %s)", categoria_id, job_traduzione)
+        except Exception:
+            logger.exception("Errore nella traduzione categoria %s", categoria_id)
             # Continua comunque, la categoria è stata creata
         
-        return {'success': True, 'id': categoria_id}
+        # Aggiorna la snapshot del menu pubblico
+        invalida_menu()
+        
+        return {'success': True, 'id': categoria_id, 'traduzione_job_id': job_traduzione}
     except Exception as e:
-        print(f"Errore nell'aggiunta categoria: {e}")
+        logger.exception("Errore nell'aggiunta categoria")
         return {'success': False, 'error': str(e)}, 500
 
 # Funzione duplicata rimossa - mantenuta solo la prima definizione
@@ -732,7 +762,7 @@ def aggiungi_categoria():
 @app.route('/api/categorie/<int:categoria_id>', methods=['DELETE'])
 @login_required
 def elimina_categoria(categoria_id):
-    conn = sqlite3.connect('ristorante.db')
+    conn = get_db()
     cursor = conn.cursor()
     
     # Verifica se ci sono prodotti associati a questa categoria
@@ -740,7 +770,6 @@ def elimina_categoria(categoria_id):
     prodotti_count = cursor.fetchone()[0]
     
     if prodotti_count > 0:
-        conn.close()
         return {'success': False, 'error': 'Impossibile eliminare la categoria: ci sono prodotti associati'}, 400
     
     # Verifica se ci sono sottocategorie
@@ -748,16 +777,17 @@ def elimina_categoria(categoria_id):
     sottocategorie_count = cursor.fetchone()[0]
     
     if sottocategorie_count > 0:
-        conn.close()
         return {'success': False, 'error': 'Impossibile eliminare la categoria: ci sono sottocategorie associate'}, 400
     
     # Elimina fisicamente la categoria
     cursor.execute('DELETE FROM categorie WHERE id = ?', (categoria_id,))
     conn.commit()
-    conn.close()
+    
+    # Aggiorna la snapshot del menu pubblico e avvisa gli ospiti
+    menu_realtime.menu(LINGUE_MENU, invalida_menu())
     
     # Emetti evento SocketIO per aggiornamento real-time
-    socketio.emit('categoria_eliminata', {'id': categoria_id})
+    menu_realtime.admin('categoria_eliminata', {'id': categoria_id})
     
     return {'success': True}
 
@@ -769,7 +799,7 @@ def aggiorna_categoria(categoria_id):
     try:
         data = request.get_json()
         
-        conn = sqlite3.connect('ristorante.db')
+        conn = get_db()
         cursor = conn.cursor()
         cursor.execute('''
             UPDATE categorie 
@@ -778,22 +808,25 @@ def aggiorna_categoria(categoria_id):
         ''', (data['nome'], data.get('parent_id'), data.get('descrizione', ''), data.get('ordine', 0), categoria_id))
         
         conn.commit()
-        conn.close()
         
-        # Traduci e salva automaticamente nel database
+        # Accoda la traduzione automatica (eseguita in background)
+        job_traduzione = None
         try:
-            translation_service.translate_and_save_category(categoria_id, data['nome'], data.get('descrizione'))
-            print(f"Traduzione aggiornata per categoria {categoria_id}: {data['nome']} - {data.get('descrizione', 'Nessuna descrizione')}")
-        except Exception as e:
-            print(f"Errore nella traduzione categoria {categoria_id}: {e}")
+            job_traduzione = translation_queue.enqueue('categorie', categoria_id, data['nome'], data.get('descrizione'))
+            logger.info("Traduzione accodata per categoria %s (job %s)", categoria_id, job_traduzione)
+        except Exception:
+            logger.exception("Errore nella traduzione categoria %s", categoria_id)
             # Continua comunque, la categoria è stata aggiornata
         
+        # Aggiorna la snapshot del menu pubblico e avvisa gli ospiti
+        menu_realtime.menu(LINGUE_MENU, invalida_menu())
+        
         # Emetti evento SocketIO per aggiornamento real-time
-        socketio.emit('categoria_aggiornata', {'id': categoria_id, 'data': data})
+        menu_realtime.admin('categoria_aggiornata', {'id': categoria_id, 'data': data})
         
-        return {'success': True}
+        return {'success': True, 'traduzione_job_id': job_traduzione}
     except Exception as e:
-        print(f"Errore nell'aggiornamento categoria: {e}")
+        logger.exception("Errore nell'aggiornamento categoria %s", categoria_id)
         return {'success': False, 'error': str(e)}, 500
 
 # Funzione duplicata rimossa - mantenuta solo la prima definizione
@@ -802,11 +835,10 @@ def aggiorna_categoria(categoria_id):
 @app.route('/api/allergeni', methods=['GET'])
 @login_required
 def get_allergeni():
-    conn = sqlite3.connect('ristorante.db')
+    conn = get_db()
     cursor = conn.cursor()
     cursor.execute('SELECT * FROM allergeni ORDER BY nome')
     allergeni = cursor.fetchall()
-    conn.close()
     
     allergeni_list = []
     for all in allergeni:
@@ -825,28 +857,35 @@ def get_allergeni():
 def aggiungi_allergene():
     data = request.get_json()
     
-    conn = sqlite3.connect('ristorante.db')
+    conn = get_db()
     cursor = conn.cursor()
-    cursor.execute('''
-        INSERT INTO allergeni (nome, icona, codice, descrizione, created_at) 
-        VALUES (?, ?, ?, ?, datetime('now'))
+    # Riusa il primo id libero: oltre MAX_ID_ALLERGENE l'allergene non entrerebbe nella maschera
+    cursor.execute(f'''
+        INSERT INTO allergeni (id, nome, icona, codice, descrizione, created_at) 
+        SELECT {ID_ALLERGENE_LIBERO}, ?, ?, ?, ?, datetime('now')
+        WHERE {ID_ALLERGENE_LIBERO} IS NOT NULL
     ''', (data['nome'], data.get('icona', ''), data.get('codice', ''), data.get('descrizione', '')))
     
+    if cursor.rowcount == 0:
+        return {'success': False, 'message': f'Raggiunto il numero massimo di allergeni ({MAX_ID_ALLERGENE})'}, 400
+    
     allergene_id = cursor.lastrowid
     conn.commit()
-    conn.close()
     
-    # Traduci e salva automaticamente nel database
-    translation_service.translate_and_save_allergen(allergene_id, data['nome'], data.get('descrizione', ''))
+    # Accoda la traduzione automatica (eseguita in background)
+    job_traduzione = translation_queue.enqueue('allergeni', allergene_id, data['nome'], data.get('descrizione', ''))
+    
+    # Aggiorna la snapshot del menu pubblico
+    invalida_menu()
     
-    return {'success': True, 'id': allergene_id}
+    return {'success': True, 'id': allergene_id, 'traduzione_job_id': job_traduzione}
 
 @app.route('/api/allergeni/<int:allergene_id>', methods=['PUT'])
 @login_required
 def aggiorna_allergene(allergene_id):
     data = request.get_json()
     
-    conn = sqlite3.connect('ristorante.db')
+    conn = get_db()
     cursor = conn.cursor()
     cursor.execute('''
         UPDATE allergeni 
@@ -855,20 +894,22 @@ def aggiorna_allergene(allergene_id):
     ''', (data['nome'], data.get('icona', ''), data.get('descrizione', ''), allergene_id))
     
     conn.commit()
-    conn.close()
     
-    # Traduci e salva automaticamente nel database
-    translation_service.translate_and_save_allergen(allergene_id, data['nome'], data.get('descrizione', ''))
+    # Accoda la traduzione automatica (eseguita in background)
+    job_traduzione = translation_queue.enqueue('allergeni', allergene_id, data['nome'], data.get('descrizione', ''))
+    
+    # Aggiorna la snapshot del menu pubblico e avvisa gli ospiti
+    menu_realtime.menu(LINGUE_MENU, invalida_menu())
     
     # Emetti evento SocketIO per aggiornamento real-time
-    socketio.emit('allergene_aggiornato', {'id': allergene_id, 'data': data})
+    menu_realtime.admin('allergene_aggiornato', {'id': allergene_id, 'data': data})
     
-    return {'success': True}
+    return {'success': True, 'traduzione_job_id': job_traduzione}
 
 @app.route('/api/allergeni/<int:allergene_id>', methods=['DELETE'])
 @login_required
 def elimina_allergene(allergene_id):
-    conn = sqlite3.connect('ristorante.db')
+    conn = get_db()
     cursor = conn.cursor()
     
     # Verifica se ci sono prodotti associati a questo allergene
@@ -876,16 +917,17 @@ def elimina_allergene(allergene_id):
     prodotti_count = cursor.fetchone()[0]
     
     if prodotti_count > 0:
-        conn.close()
         return {'success': False, 'error': 'Impossibile eliminare l\'allergene: ci sono prodotti associati'}, 400
     
     # Elimina fisicamente l'allergene
     cursor.execute('DELETE FROM allergeni WHERE id = ?', (allergene_id,))
     conn.commit()
-    conn.close()
+    
+    # Aggiorna la snapshot del menu pubblico e avvisa gli ospiti
+    menu_realtime.menu(LINGUE_MENU, invalida_menu())
     
     # Emetti evento SocketIO per aggiornamento real-time
-    socketio.emit('allergene_eliminato', {'id': allergene_id})
+    menu_realtime.admin('allergene_eliminato', {'id': allergene_id})
     
     return {'success': True}
 
@@ -893,11 +935,10 @@ def elimina_allergene(allergene_id):
 @app.route('/api/ingredienti', methods=['GET'])
 @login_required
 def get_ingredienti():
-    conn = sqlite3.connect('ristorante.db')
+    conn = get_db()
     cursor = conn.cursor()
     cursor.execute('SELECT id, nome, icona, nome_en FROM ingredienti ORDER BY nome')
     ingredienti = cursor.fetchall()
-    conn.close()
     
     ingredienti_list = []
     for ing in ingredienti:
@@ -915,7 +956,7 @@ def get_ingredienti():
 def aggiungi_ingrediente():
     data = request.get_json()
     
-    conn = sqlite3.connect('ristorante.db')
+    conn = get_db()
     cursor = conn.cursor()
     cursor.execute('''
         INSERT INTO ingredienti (nome, icona, descrizione) 
@@ -924,19 +965,21 @@ def aggiungi_ingrediente():
     
     ingrediente_id = cursor.lastrowid
     conn.commit()
-    conn.close()
     
-    # Traduci e salva automaticamente nel database
-    translation_service.translate_and_save_ingredient(ingrediente_id, data['nome'], data.get('descrizione', ''))
+    # Accoda la traduzione automatica (eseguita in background)
+    job_traduzione = translation_queue.enqueue('ingredienti', ingrediente_id, data['nome'], data.get('descrizione', ''))
     
-    return {'success': True, 'id': ingrediente_id}
+    # Aggiorna la snapshot del menu pubblico
+    invalida_menu()
+    
+    return {'success': True, 'id': ingrediente_id, 'traduzione_job_id': job_traduzione}
 
 @app.route('/api/ingredienti/<int:ingrediente_id>', methods=['PUT'])
 @login_required
 def aggiorna_ingrediente(ingrediente_id):
     data = request.get_json()
     
-    conn = sqlite3.connect('ristorante.db')
+    conn = get_db()
     cursor = conn.cursor()
     cursor.execute('''
         UPDATE ingredienti 
@@ -945,20 +988,22 @@ def aggiorna_ingrediente(ingrediente_id):
         ''', (data['nome'], data.get('icona', ''), data.get('descrizione', ''), ingrediente_id))
     
     conn.commit()
-    conn.close()
     
-    # Traduci e salva automaticamente nel database
-    translation_service.translate_and_save_ingredient(ingrediente_id, data['nome'], data.get('descrizione', ''))
+    # Accoda la traduzione automatica (eseguita in background)
+    job_traduzione = translation_queue.enqueue('ingredienti', ingrediente_id, data['nome'], data.get('descrizione', ''))
+    
+    # Aggiorna la snapshot del menu pubblico e avvisa gli ospiti
+    menu_realtime.menu(LINGUE_MENU, invalida_menu())
     
     # Emetti evento SocketIO per aggiornamento real-time
-    socketio.emit('ingrediente_aggiornato', {'id': ingrediente_id, 'data': data})
+    menu_realtime.admin('ingrediente_aggiornato', {'id': ingrediente_id, 'data': data})
     
-    return {'success': True}
+    return {'success': True, 'traduzione_job_id': job_traduzione}
 
 @app.route('/api/ingredienti/<int:ingrediente_id>', methods=['DELETE'])
 @login_required
 def elimina_ingrediente(ingrediente_id):
-    conn = sqlite3.connect('ristorante.db')
+    conn = get_db()
     cursor = conn.cursor()
     
     # Verifica se ci sono prodotti associati a questo ingrediente
@@ -966,33 +1011,33 @@ def elimina_ingrediente(ingrediente_id):
     prodotti_count = cursor.fetchone()[0]
     
     if prodotti_count > 0:
-        conn.close()
         return {'success': False, 'error': 'Impossibile eliminare l\'ingrediente: ci sono prodotti associati'}, 400
     
     # Elimina fisicamente l'ingrediente
     cursor.execute('DELETE FROM ingredienti WHERE id = ?', (ingrediente_id,))
     conn.commit()
-    conn.close()
+    
+    # Aggiorna la snapshot del menu pubblico e avvisa gli ospiti
+    menu_realtime.menu(LINGUE_MENU, invalida_menu())
     
     # Emetti evento SocketIO per aggiornamento real-time
-    socketio.emit('ingrediente_eliminato', {'id': ingrediente_id})
+    menu_realtime.admin('ingrediente_eliminato', {'id': ingrediente_id})
     
     return {'success': True}
 
-# API per ottenere tutti i prodotti
-@app.route('/api/prodotti', methods=['GET'])
-def get_prodotti():
-    conn = sqlite3.connect('ristorante.db')
-    cursor = conn.cursor()
-    
+# ===== PAYLOAD DEL MENU PUBBLICO =====
+# Le funzioni costruisci_* eseguono le query del menu pubblico; i risultati
+# vengono conservati nella snapshot per lingua di menu_cache.
+
+def costruisci_prodotti(cursor):
+    """Lista di tutti i prodotti attivi"""
     cursor.execute('''
-        SELECT p.id, p.nome, p.descrizione, p.prezzo, p.categoria_id, p.disponibile, 
-               p.foto, p.updated_at, c.nome as categoria_nome
-        FROM prodotti p
-        LEFT JOIN categorie c ON p.categoria_id = c.id
-        WHERE p.attivo = 1
-        ORDER BY c.nome, p.nome
-    ''')
+        SELECT prodotto_id, nome, descrizione, prezzo, categoria_id, disponibile, 
+               foto, updated_at, categoria_nome, foto_varianti, allergeni_maschera
+        FROM menu_read_model
+        WHERE lingua = ? AND attivo = 1
+        ORDER BY categoria_nome, nome
+    ''', ('it',))
     
     prodotti = []
     for row in cursor.fetchall():
@@ -1004,102 +1049,74 @@ def get_prodotti():
             'categoria_id': row[4],
             'disponibile': bool(row[5]),
             'foto': row[6],
+            'foto_varianti': json.loads(row[9]) or None if row[9] else None,
             'ultimo_aggiornamento': row[7],
-            'categoria_nome': row[8]
+            'categoria_nome': row[8],
+            'allergeni_maschera': row[10]
         })
     
-    conn.close()
-    return jsonify(prodotti)
+    return prodotti
 
-@app.route('/api/prodotti/categoria/<int:categoria_id>', methods=['GET'])
-def get_prodotti_categoria(categoria_id):
-    lingua = request.args.get('lang', 'it')  # Default italiano
-    
-    conn = sqlite3.connect('ristorante.db')
-    cursor = conn.cursor()
-    
-    # Query ottimizzata con JOIN per ottenere tutti i dati in una sola query
-    cursor.execute('''
-        SELECT p.id, p.nome, p.descrizione, p.prezzo, p.categoria_id, p.disponibile, 
-               p.foto, p.updated_at, c.nome as categoria_nome, c.parent_id,
-               CASE 
-                   WHEN c.parent_id IS NOT NULL THEN parent.nome
-                   ELSE NULL
-               END as categoria_genitore_nome,
-               GROUP_CONCAT(DISTINCT a.id || '|' || COALESCE(CASE WHEN ? = 'en' THEN a.nome_en ELSE a.nome END, a.nome) || '|' || COALESCE(a.icona, '')) as allergeni_data,
-               GROUP_CONCAT(DISTINCT i.id || '|' || COALESCE(CASE WHEN ? = 'en' THEN i.nome_en ELSE i.nome END, i.nome)) as ingredienti_data,
-               COALESCE(CASE WHEN ? = 'en' THEN p.nome_en ELSE p.nome END, p.nome) as nome_tradotto,
-               COALESCE(CASE WHEN ? = 'en' THEN p.descrizione_en ELSE p.descrizione END, p.descrizione) as descrizione_tradotta,
-               COALESCE(CASE WHEN ? = 'en' THEN c.nome_en ELSE c.nome END, c.nome) as categoria_nome_tradotta
-        FROM prodotti p
-        LEFT JOIN categorie c ON p.categoria_id = c.id
-        LEFT JOIN categorie parent ON c.parent_id = parent.id
-        LEFT JOIN prodotti_allergeni pa ON p.id = pa.prodotto_id
-        LEFT JOIN allergeni a ON pa.allergene_id = a.id
-        LEFT JOIN prodotti_ingredienti pi ON p.id = pi.prodotto_id
-        LEFT JOIN ingredienti i ON pi.ingrediente_id = i.id
-        WHERE p.attivo = 1 AND p.disponibile = 1
-        AND (p.categoria_id = ? OR c.parent_id = ?)
-        GROUP BY p.id, p.nome, p.descrizione, p.prezzo, p.categoria_id, p.disponibile, 
-                 p.foto, p.updated_at, c.nome, c.parent_id, categoria_genitore_nome
-        ORDER BY c.nome, p.nome
-    ''', (lingua, lingua, lingua, lingua, lingua, categoria_id, categoria_id))
+_COLONNE_PRODOTTO_MENU = '''
+    prodotto_id, nome, descrizione, prezzo, categoria_id, disponibile,
+    foto, updated_at, categoria_nome, categoria_parent_id,
+    categoria_genitore_nome, allergeni_json, ingredienti_json, foto_varianti,
+    allergeni_maschera
+'''
+
+def prodotto_menu(row):
+    """Payload pubblico di un prodotto da una riga di menu_read_model (_COLONNE_PRODOTTO_MENU)"""
+    return {
+        'id': row[0],
+        'nome': row[1],
+        'descrizione': row[2],
+        'prezzo': row[3],
+        'categoria_id': row[4],
+        'disponibile': bool(row[5]),
+        'foto': row[6],
+        # '{}' = elaborata senza varianti: come NULL si usa l'originale
+        'foto_varianti': json.loads(row[13]) or None if row[13] else None,
+        'ultimo_aggiornamento': row[7],
+        'categoria_nome': row[8],
+        'categoria_genitore_nome': row[10],
+        'allergeni': json.loads(row[11]),
+        # Bit (1 << id) degli allergeni: i client possono filtrare come exclude_allergeni
+        'allergeni_maschera': row[14],
+        'ingredienti': json.loads(row[12])
+    }
+
+def costruisci_prodotti_categoria(cursor, categoria_id, lingua):
+    """Prodotti disponibili di una categoria e delle sue sottocategorie"""
+    # Una sola query indicizzata sul modello di lettura (allergeni e ingredienti già in JSON)
+    cursor.execute(f'''
+        SELECT {_COLONNE_PRODOTTO_MENU}
+        FROM menu_read_model
+        WHERE lingua = ? AND attivo = 1 AND disponibile = 1
+        AND (categoria_id = ? OR categoria_parent_id = ?)
+        ORDER BY categoria_nome, nome
+    ''', (lingua_read_model(lingua), categoria_id, categoria_id))
+    righe = cursor.fetchall()
     
+    # Ottieni informazioni sulla categoria genitore con traduzione
+    cursor.execute('SELECT nome, descrizione, nome_en FROM categorie WHERE id = ?', (categoria_id,))
+    return payload_categoria(categoria_id, cursor.fetchone(), righe, lingua)
+
+def payload_categoria(categoria_id, categoria_info, righe, lingua):
+    """
+    Payload di /api/prodotti/categoria/<id> dalle righe del modello di lettura
+    (_COLONNE_PRODOTTO_MENU) e da (nome, descrizione, nome_en) della categoria
+    """
     prodotti = []
-    categorie_figlie = set()
+    categorie_figlie = []
     
-    for row in cursor.fetchall():
-        prodotto_id = row[0]
-        nome_tradotto = row[13]  # nome_tradotto dalla query
-        descrizione_tradotta = row[14]  # descrizione_tradotta dalla query
-        categoria_nome_tradotta = row[15]  # categoria_nome_tradotta dalla query
+    for row in righe:
+        categoria_nome_tradotta = row[8]
         
-        # Parse allergeni dalla stringa concatenata
-        allergeni_list = []
-        if row[11]:  # allergeni_data
-            for allergene_str in row[11].split(','):
-                parts = allergene_str.split('|')
-                if len(parts) >= 3:
-                    allergene_id, nome_allergene, icona = parts[0], parts[1], parts[2]
-                    
-                    allergeni_list.append({
-                        'nome': nome_allergene,
-                        'icona': icona or '',
-                        'colore': '#6c757d'
-                    })
-        
-        # Parse ingredienti dalla stringa concatenata
-        ingredienti_list = []
-        if row[12]:  # ingredienti_data
-            for ingrediente_str in row[12].split(','):
-                parts = ingrediente_str.split('|')
-                if len(parts) >= 2:
-                    ingrediente_id, nome_ingrediente = parts[0], parts[1]
-                    
-                    ingredienti_list.append(nome_ingrediente)
-        
-        prodotti.append({
-            'id': prodotto_id,
-            'nome': nome_tradotto,
-            'descrizione': descrizione_tradotta,
-            'prezzo': row[3],
-            'categoria_id': row[4],
-            'disponibile': bool(row[5]),
-            'foto': row[6],
-            'ultimo_aggiornamento': row[7],
-            'categoria_nome': categoria_nome_tradotta,
-            'categoria_genitore_nome': row[10],
-            'allergeni': allergeni_list,
-            'ingredienti': ingredienti_list
-        })
+        prodotti.append(prodotto_menu(row))
         
         # Se il prodotto appartiene a una categoria figlia, aggiungi la categoria alla lista
-        if row[9] == categoria_id:  # parent_id == categoria_id
-            categorie_figlie.add(categoria_nome_tradotta)  # categoria_nome_tradotta
-    
-    # Ottieni informazioni sulla categoria genitore con traduzione
-    cursor.execute('SELECT nome, descrizione, nome_en FROM categorie WHERE id = ?', (categoria_id,))
-    categoria_info = cursor.fetchone()
+        if row[9] == categoria_id and categoria_nome_tradotta not in categorie_figlie:  # parent_id == categoria_id
+            categorie_figlie.append(categoria_nome_tradotta)  # categoria_nome_tradotta
     
     # Usa la traduzione se disponibile e richiesta
     if categoria_info:
@@ -1112,46 +1129,39 @@ def get_prodotti_categoria(categoria_id):
         categoria_nome = ''
         categoria_descrizione = ''
     
-    conn.close()
-    
-    return jsonify({
+    return {
         'categoria': {
             'id': categoria_id,
             'nome': categoria_nome,
             'descrizione': categoria_descrizione
         },
-        'categorie_figlie': list(categorie_figlie),
+        'categorie_figlie': categorie_figlie,
         'prodotti': prodotti,
         'totale_prodotti': len(prodotti)
-    })
+    }
 
-# API per ottenere categorie con conteggio prodotti (ottimizzata)
-@app.route('/api/categorie-menu', methods=['GET'])
-def get_categorie_menu():
-    lingua = request.args.get('lang', 'it')  # Default italiano
-    
-    conn = sqlite3.connect('ristorante.db')
-    cursor = conn.cursor()
-    
+def costruisci_categorie_menu(cursor, lingua):
+    """Categorie principali con conteggio dei prodotti disponibili"""
     # Prima eseguiamo la query senza filtro per debug
     cursor.execute('''
         SELECT c.id, 
                COALESCE(CASE WHEN ? = 'en' THEN c.nome_en ELSE c.nome END, c.nome) as nome_tradotto,
                COALESCE(CASE WHEN ? = 'en' THEN c.descrizione_en ELSE c.descrizione END, c.descrizione) as descrizione_tradotta,
-               COALESCE(COUNT(DISTINCT p.id), 0) as prodotti_count
+               COALESCE(m.prodotti_count, 0) as prodotti_count
         FROM categorie c
-        LEFT JOIN categorie c_figlio ON c_figlio.parent_id = c.id
-        LEFT JOIN prodotti p ON (p.categoria_id = c.id OR p.categoria_id = c_figlio.id)
-                               AND p.disponibile = 1 AND p.attivo = 1
+        LEFT JOIN (
+            SELECT COALESCE(categoria_parent_id, categoria_id) as radice_id, COUNT(*) as prodotti_count
+            FROM menu_read_model
+            WHERE lingua = ? AND disponibile = 1 AND attivo = 1
+            GROUP BY radice_id
+        ) m ON m.radice_id = c.id
         WHERE c.parent_id IS NULL 
         AND c.attiva = 1
-        GROUP BY c.id, c.nome, c.descrizione
         ORDER BY c.nome
-    ''', (lingua, lingua))
+    ''', (lingua, lingua, lingua_read_model(lingua)))
     
     categorie = []
     all_rows = cursor.fetchall()
-    print(f"DEBUG: Query ha restituito {len(all_rows)} righe totali")
     
     for row in all_rows:
         categoria_id = row[0]
@@ -1159,39 +1169,368 @@ def get_categorie_menu():
         descrizione_tradotta = row[2]
         prodotti_count = row[3]
         
-        print(f"DEBUG: Categoria {nome_tradotto}, prodotti_count: {prodotti_count}")
-        
         # Applico il filtro manualmente in Python
         if prodotti_count > 0:
-            print(f"DEBUG: Aggiungendo categoria {nome_tradotto} con {prodotti_count} prodotti")
             categorie.append({
                 'id': categoria_id,
                 'nome': nome_tradotto,
                 'descrizione': descrizione_tradotta,
                 'prodotti_count': prodotti_count
             })
-        else:
-            print(f"DEBUG: Saltando categoria {nome_tradotto} con {prodotti_count} prodotti")
     
-    print(f"DEBUG: Restituendo {len(categorie)} categorie filtrate")
-    conn.close()
-    return jsonify(categorie)
+    # Percorso caldo: il messaggio è campionato (LOG_SAMPLE_RATE)
+    logger.debug("Categorie menu (%s): %d restituite su %d", lingua, len(categorie), len(all_rows),
+                 extra=CAMPIONATO)
+    return categorie
+
+def costruisci_allergeni_menu(cursor, lingua):
+    """Allergeni con nome tradotto, per legenda e filtri del menu"""
+    cursor.execute('''
+        SELECT id, COALESCE(CASE WHEN ? = 'en' THEN nome_en END, nome), COALESCE(icona, '')
+        FROM allergeni
+        ORDER BY nome
+    ''', (lingua,))
+    return [{'id': row[0], 'nome': row[1], 'icona': row[2]} for row in cursor.fetchall()]
+
+def costruisci_ingredienti_menu(cursor, lingua):
+    """Ingredienti con nome tradotto"""
+    cursor.execute('''
+        SELECT id, COALESCE(CASE WHEN ? = 'en' THEN nome_en END, nome)
+        FROM ingredienti
+        ORDER BY nome
+    ''', (lingua,))
+    return [{'id': row[0], 'nome': row[1]} for row in cursor.fetchall()]
+
+# Risultati massimi della ricerca (il client può chiederne meno con limit)
+MENU_RICERCA_MAX_RISULTATI = int(os.environ.get('MENU_RICERCA_MAX_RISULTATI', '50'))
+
+def costruisci_ricerca(cursor, testo, lingua, limite, esclusi=0):
+    """Prodotti disponibili che corrispondono alla ricerca, dal più rilevante (senza gli allergeni esclusi)"""
+    espressione = espressione_ricerca(testo)
+    if espressione is None:
+        return []
+    # L'indice contiene solo i prodotti visibili: il LIMIT si applica prima del join
+    cursor.execute(f'''
+        SELECT {', '.join('m.' + c.strip() for c in _COLONNE_PRODOTTO_MENU.split(','))}
+        FROM (
+            SELECT rowid AS prodotto_id, {ordinamento_bm25(lingua_read_model(lingua))} AS punteggio
+            FROM menu_ricerca
+            WHERE menu_ricerca MATCH ? AND (allergeni_maschera & ?) = 0
+            ORDER BY punteggio
+            LIMIT ?
+        ) r
+        JOIN menu_read_model m ON m.prodotto_id = r.prodotto_id AND m.lingua = ?
+        ORDER BY r.punteggio
+    ''', (espressione, esclusi, limite, lingua_read_model(lingua)))
+    return [prodotto_menu(row) for row in cursor.fetchall()]
+
+def costruisci_snapshot_menu(lingua):
+    """
+    Precalcola la snapshot di una lingua: categorie del menu, prodotti di
+    ogni categoria principale e il documento di /api/menu/bootstrap, cioè
+    tutto quello che serve ad aprire il menu. Le query sono sempre cinque,
+    qualunque sia il numero delle categorie.
+    """
+    # Letta prima dei dati: al più il documento contiene modifiche più recenti
+    # della sua versione, e il delta corrispondente viene riapplicato senza effetti
+    versione = menu_cache.versione(lingua)
+    cursor = get_db().cursor()
+    categorie_menu = costruisci_categorie_menu(cursor, lingua)
+    
+    cursor.execute('SELECT id, nome, descrizione, nome_en FROM categorie')
+    info_categorie = {row[0]: row[1:] for row in cursor.fetchall()}
+    
+    # Tutti i prodotti visibili della lingua, raggruppati per categoria principale
+    cursor.execute(f'''
+        SELECT {_COLONNE_PRODOTTO_MENU}
+        FROM menu_read_model
+        WHERE lingua = ? AND attivo = 1 AND disponibile = 1
+        ORDER BY categoria_nome, nome
+    ''', (lingua_read_model(lingua),))
+    righe_per_radice = {}
+    for row in cursor.fetchall():
+        righe_per_radice.setdefault(row[9] or row[4], []).append(row)  # categoria_parent_id o categoria_id
+    
+    snapshot = {'categorie_menu': categorie_menu}
+    prodotti_categoria = {}
+    for categoria in categorie_menu:
+        payload = payload_categoria(categoria['id'], info_categorie.get(categoria['id']),
+                                    righe_per_radice.get(categoria['id'], []), lingua)
+        snapshot[('prodotti_categoria', categoria['id'])] = payload
+        prodotti_categoria[str(categoria['id'])] = payload
+    
+    # Stessi oggetti delle altre voci: il documento non duplica la memoria
+    snapshot['bootstrap'] = {
+        'versione': versione,
+        'lingua': lingua,
+        'categorie': categorie_menu,
+        'prodotti_categoria': prodotti_categoria,
+        'allergeni': costruisci_allergeni_menu(cursor, lingua),
+        'ingredienti': costruisci_ingredienti_menu(cursor, lingua)
+    }
+    return snapshot
+
+# Filtri per allergene sui payload in snapshot (maschera dei bit da escludere)
+
+def senza_allergeni(prodotti, esclusi):
+    return [p for p in prodotti if not p['allergeni_maschera'] & esclusi]
+
+def filtra_categoria(payload, esclusi):
+    """Payload di /api/prodotti/categoria/<id> senza i prodotti con gli allergeni esclusi"""
+    prodotti = senza_allergeni(payload['prodotti'], esclusi)
+    categoria_id = payload['categoria']['id']
+    categorie_figlie = []
+    for prodotto in prodotti:
+        if prodotto['categoria_id'] != categoria_id and prodotto['categoria_nome'] not in categorie_figlie:
+            categorie_figlie.append(prodotto['categoria_nome'])
+    return dict(payload, prodotti=prodotti, categorie_figlie=categorie_figlie, totale_prodotti=len(prodotti))
+
+def filtra_bootstrap(documento, esclusi):
+    """Documento di /api/menu/bootstrap con prodotti e conteggi delle categorie filtrati"""
+    prodotti_categoria = {chiave: filtra_categoria(payload, esclusi)
+                          for chiave, payload in documento['prodotti_categoria'].items()}
+    categorie = []
+    for categoria in documento['categorie']:
+        payload = prodotti_categoria.get(str(categoria['id']))
+        conteggio = payload['totale_prodotti'] if payload else 0
+        if conteggio > 0:
+            categorie.append(dict(categoria, prodotti_count=conteggio))
+    return dict(documento, categorie=categorie, prodotti_categoria=prodotti_categoria)
+
+def allergeni_esclusi():
+    """Maschera di ?exclude_allergeni=1,2,... (0 se assente); ValueError se non valida"""
+    valore = request.args.get('exclude_allergeni', '')
+    return maschera_allergeni(parte for parte in valore.split(',') if parte.strip())
+
+def leggi_versione_menu():
+    """Versione persistita del menu, letta anche fuori da una richiesta (worker in background)"""
+    if has_app_context():
+        return versione_menu(get_db())
+    with db_pool.connection() as conn:
+        return versione_menu(conn)
+
+menu_cache.set_prebuilder(costruisci_snapshot_menu)
+# La versione del menu sta nel database: le modifiche fatte da altri worker invalidano anche questa cache
+menu_cache.set_version_source(leggi_versione_menu)
+menu_realtime.set_version_source(leggi_versione_menu)
+
+def invalida_menu():
+    """
+    Da chiamare dopo ogni commit che modifica dati visibili nel menu pubblico.
+    Restituisce la nuova versione del menu, da inviare con i delta Socket.IO.
+    """
+    return menu_cache.invalidate()
+
+def radice_prodotto(cursor, prodotto_id):
+    """Categoria principale sotto cui il prodotto compare nel menu (None se non visibile)"""
+    cursor.execute('''
+        SELECT COALESCE(categoria_parent_id, categoria_id)
+        FROM menu_read_model
+        WHERE lingua = ? AND prodotto_id = ? AND attivo = 1 AND disponibile = 1
+    ''', ('it', prodotto_id))
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+def costruisci_prodotto(cursor, prodotto_id, lingua):
+    """(categoria principale, payload pubblico) di un prodotto, (None, None) se non visibile"""
+    cursor.execute(f'''
+        SELECT {_COLONNE_PRODOTTO_MENU}
+        FROM menu_read_model
+        WHERE lingua = ? AND prodotto_id = ? AND attivo = 1 AND disponibile = 1
+    ''', (lingua_read_model(lingua), prodotto_id))
+    row = cursor.fetchone()
+    if row is None:
+        return None, None
+    return (row[9] or row[4]), prodotto_menu(row)
+
+def notifica_prodotto(cursor, prodotto_id, radice_precedente, versione, lingue=None):
+    """
+    Invia agli ospiti il delta di un prodotto modificato, per ogni lingua.
+    Se il prodotto è comparso, sparito o cambiato categoria principale
+    cambiano anche i conteggi: segue l'elenco aggiornato delle categorie.
+    """
+    for lingua in (lingue or LINGUE_MENU):
+        radice, prodotto = costruisci_prodotto(cursor, prodotto_id, lingua)
+        menu_realtime.prodotto(lingua, versione, prodotto_id, radice, prodotto, radice_precedente)
+        if radice != radice_precedente:
+            categorie = menu_cache.get(lingua, 'categorie_menu', lambda: costruisci_categorie_menu(cursor, lingua))
+            menu_realtime.categorie(lingua, versione, categorie)
+
+def traduzione_completata(job, traduzioni):
+    """Chiamata dal worker della coda quando nome_en/descrizione_en sono stati salvati"""
+    versione = invalida_menu()
+    menu_realtime.admin('traduzione_completata', {
+        'job_id': job['id'],
+        'tabella': job['tabella'],
+        'id': job['elemento_id'],
+        'nome_en': traduzioni.get('nome_en'),
+        'descrizione_en': traduzioni.get('descrizione_en')
+    })
+    if job['tabella'] == 'prodotti':
+        # Fuori da una richiesta: connessione presa direttamente dal pool
+        with app.app_context():
+            cursor = get_db().cursor()
+            radice = radice_prodotto(cursor, job['elemento_id'])
+            notifica_prodotto(cursor, job['elemento_id'], radice, versione, lingue=['en'])
+    else:
+        menu_realtime.menu(['en'], versione)
+
+def immagine_elaborata(tabella, elemento_id, varianti):
+    """Chiamata dalla pipeline delle immagini quando le varianti sono salvate"""
+    menu_realtime.admin('immagine_elaborata', {'tabella': tabella, 'id': elemento_id, 'varianti': varianti})
+    if tabella != 'prodotti':
+        return
+    versione = invalida_menu()
+    with app.app_context():
+        cursor = get_db().cursor()
+        radice = radice_prodotto(cursor, elemento_id)
+        notifica_prodotto(cursor, elemento_id, radice, versione)
+
+def risposta_menu(lingua, chiave, builder, in_cache=True, filtro=None):
+    """
+    Risposta JSON condizionale per le API pubbliche del menu.
+    ETag e Last-Modified derivano dalla versione del menu della lingua, quindi
+    un client (o un proxy) con la versione corrente riceve un 304 senza che
+    il payload venga nemmeno serializzato. Con in_cache=False (parametri
+    arbitrari, come la ricerca) il payload non entra nella snapshot.
+    filtro = (nome, funzione) serve una variante del payload in snapshot
+    (es. allergeni esclusi), di cui vengono conservati solo i byte.
+    """
+    versione = menu_cache.versione(lingua)
+    etag = f'menu-{lingua}-{versione}'
+    ultima_modifica = datetime.fromtimestamp(versione // 1000, tz=timezone.utc)
+    # Last-Modified ha la risoluzione del secondo, la versione del millisecondo:
+    # finché il secondo non è concluso un'altra modifica avrebbe la stessa data
+    secondo_concluso = versione // 1000 < int(time.time())
+    
+    # If-None-Match ha la precedenza su If-Modified-Since (RFC 7232), con
+    # confronto debole: le risposte compresse hanno l'ETag W/"..."
+    if request.if_none_match:
+        non_modificato = request.if_none_match.contains_weak(etag)
+    else:
+        non_modificato = (secondo_concluso and request.if_modified_since is not None
+                          and ultima_modifica <= request.if_modified_since)
+    
+    encoding = negozia_encoding(request.accept_encodings) if COMPRESSIONE_RISPOSTE else None
+    if non_modificato:
+        response = app.response_class(status=304)
+    elif not in_cache:
+        # Compressa, se serve, da after_request
+        encoding = None
+        response = app.json.response(builder())
+    else:
+        nome_filtro, funzione = filtro if filtro is not None else (None, None)
+        derivato = lambda formato: formato if nome_filtro is None else (nome_filtro, formato)
+        trasforma = (lambda payload: app.json.serializza(funzione(payload))) if funzione else app.json.serializza
+        # JSON già serializzato conservato nella snapshot: una volta per versione del menu
+        serializza = lambda: menu_cache.get_derivato(lingua, chiave, derivato('json'), builder, trasforma)
+        if encoding:
+            # Byte compressi ricavati dagli stessi byte JSON, anch'essi nella snapshot
+            corpo = menu_cache.get_derivato(lingua, chiave, derivato(encoding), builder,
+                                            lambda payload: compressione.comprimi(serializza(), encoding))
+        else:
+            corpo = serializza()
+        response = app.response_class(corpo, mimetype='application/json')
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+    
+    response.set_etag(etag, weak=encoding is not None)
+    response.vary.add('Accept-Encoding')
+    if secondo_concluso:
+        response.last_modified = ultima_modifica
+    response.headers['Cache-Control'] = f'public, max-age={MENU_CACHE_MAX_AGE}, must-revalidate'
+    return response
+
+# API per ottenere tutti i prodotti
+@app.route('/api/prodotti', methods=['GET'])
+def get_prodotti():
+    # L'elenco completo non dipende dalla lingua: è conservato nella snapshot di default
+    lingua = normalizza_lingua(None)
+    try:
+        esclusi = allergeni_esclusi()
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    # ?exclude_allergeni=1,7: filtro sulla maschera dei prodotti in snapshot, senza query;
+    # i byte della variante filtrata restano nella snapshot fino alla prossima versione
+    filtro = (('esclusi', esclusi), lambda prodotti: senza_allergeni(prodotti, esclusi)) if esclusi else None
+    return risposta_menu(lingua, 'prodotti', lambda: costruisci_prodotti(get_db().cursor()), filtro=filtro)
+
+@app.route('/api/prodotti/categoria/<int:categoria_id>', methods=['GET'])
+def get_prodotti_categoria(categoria_id):
+    lingua = normalizza_lingua(request.args.get('lang', 'it'))  # Default italiano
+    try:
+        esclusi = allergeni_esclusi()
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    return risposta_menu(
+        lingua,
+        ('prodotti_categoria', categoria_id),
+        lambda: costruisci_prodotti_categoria(get_db().cursor(), categoria_id, lingua),
+        filtro=(('esclusi', esclusi), lambda payload: filtra_categoria(payload, esclusi)) if esclusi else None
+    )
+
+# API per ottenere categorie con conteggio prodotti (ottimizzata)
+@app.route('/api/categorie-menu', methods=['GET'])
+def get_categorie_menu():
+    lingua = normalizza_lingua(request.args.get('lang', 'it'))  # Default italiano
+    return risposta_menu(lingua, 'categorie_menu', lambda: costruisci_categorie_menu(get_db().cursor(), lingua))
+
+# Menu completo di una lingua in una sola richiesta
+@app.route('/api/menu/bootstrap', methods=['GET'])
+def get_menu_bootstrap():
+    lingua = normalizza_lingua(request.args.get('lang', 'it'))
+    try:
+        esclusi = allergeni_esclusi()
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    return risposta_menu(lingua, 'bootstrap', lambda: costruisci_snapshot_menu(lingua)['bootstrap'],
+                         filtro=(('esclusi', esclusi), lambda documento: filtra_bootstrap(documento, esclusi))
+                         if esclusi else None)
+
+# Ricerca full-text nei prodotti del menu (nomi, descrizioni e ingredienti in tutte le lingue)
+@app.route('/api/menu/search', methods=['GET'])
+def get_menu_search():
+    lingua = normalizza_lingua(request.args.get('lang', 'it'))
+    testo = request.args.get('q', '').strip()
+    limite = max(1, min(request.args.get('limit', MENU_RICERCA_MAX_RISULTATI, type=int), MENU_RICERCA_MAX_RISULTATI))
+    try:
+        esclusi = allergeni_esclusi()
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    return risposta_menu(lingua, ('ricerca', testo, limite, esclusi),
+                         lambda: costruisci_ricerca(get_db().cursor(), testo, lingua, limite, esclusi),
+                         in_cache=False)
 
 # Route per il logout
 @app.route('/logout')
 @login_required
 def logout():
+    user_cache.clear_session()
     logout_user()
     return redirect(url_for('login'))
 
 # Eventi SocketIO per aggiornamenti in tempo reale
 @socketio.on('connect')
 def handle_connect():
-    print('Client connesso')
+    logger.debug("Client connesso: %s", request.sid, extra=CAMPIONATO)
+    # Gli eventi con i payload dell'amministrazione arrivano solo agli utenti autenticati
+    if current_user.is_authenticated:
+        menu_realtime.entra_admin()
+
+@socketio.on('menu_entra')
+def handle_menu_entra(dati):
+    """Il menu pubblico indica lingua e categoria visualizzata: riceverà solo i delta pertinenti"""
+    dati = dati if isinstance(dati, dict) else {}
+    try:
+        categoria_id = int(dati['categoria_id']) if dati.get('categoria_id') else None
+    except (TypeError, ValueError):
+        categoria_id = None
+    lingua = menu_realtime.entra(dati.get('lingua'), categoria_id)
+    return {'lingua': lingua, 'versione': menu_cache.versione(lingua)}
 
 @socketio.on('disconnect')
 def handle_disconnect():
-    print('Client disconnesso')
+    logger.debug("Client disconnesso: %s", request.sid, extra=CAMPIONATO)
 
 # ===== API GESTIONE PRODOTTI =====
 
@@ -1231,7 +1570,7 @@ def crea_prodotto():
             ingredienti = data.get('ingredienti', '')
             foto_path = None
 
-        conn = sqlite3.connect('ristorante.db')
+        conn = get_db()
         cursor = conn.cursor()
         
         cursor.execute('''
@@ -1241,7 +1580,9 @@ def crea_prodotto():
         
         prodotto_id = cursor.lastrowid
         conn.commit()
-        conn.close()
+        
+        versione = invalida_menu()
+        notifica_prodotto(cursor, prodotto_id, None, versione)
         
         return jsonify({'success': True, 'id': prodotto_id, 'message': 'Prodotto creato con successo'})
         
@@ -1284,8 +1625,9 @@ def aggiorna_prodotto(prodotto_id):
             ingredienti = data.get('ingredienti', '')
             foto_path = None
 
-        conn = sqlite3.connect('ristorante.db')
+        conn = get_db()
         cursor = conn.cursor()
+        radice = radice_prodotto(cursor, prodotto_id)
         
         # Se c'è una nuova foto, aggiorna anche il campo foto_path
         if foto_path:
@@ -1302,7 +1644,10 @@ def aggiorna_prodotto(prodotto_id):
             ''', (nome, descrizione, prezzo, categoria_id, disponibile, allergeni, ingredienti, prodotto_id))
         
         conn.commit()
-        conn.close()
+        
+        versione = invalida_menu()
+        menu_realtime.admin('prodotto_aggiornato', {'id': prodotto_id, 'disponibile': bool(disponibile)})
+        notifica_prodotto(cursor, prodotto_id, radice, versione)
         
         return jsonify({'success': True, 'message': 'Prodotto aggiornato con successo'})
         
@@ -1314,18 +1659,21 @@ def aggiorna_prodotto(prodotto_id):
 @login_required
 def elimina_prodotto_gestione(prodotto_id):
     try:
-        conn = sqlite3.connect('ristorante.db')
+        conn = get_db()
         cursor = conn.cursor()
         
+        radice = radice_prodotto(cursor, prodotto_id)
+        
         # Soft delete - imposta attivo = 0
         cursor.execute('UPDATE prodotti SET attivo = 0 WHERE id = ?', (prodotto_id,))
         
         if cursor.rowcount == 0:
-            conn.close()
             return jsonify({'success': False, 'message': 'Prodotto non trovato'}), 404
         
         conn.commit()
-        conn.close()
+        
+        versione = invalida_menu()
+        notifica_prodotto(cursor, prodotto_id, radice, versione)
         
         return jsonify({'success': True, 'message': 'Prodotto eliminato con successo'})
         
@@ -1335,10 +1683,101 @@ def elimina_prodotto_gestione(prodotto_id):
 # API per ottenere il timestamp dell'ultimo aggiornamento
 @app.route('/api/menu/last-update')
 def get_last_update():
-    global ultimo_aggiornamento
-    return jsonify({'timestamp': ultimo_aggiornamento})
+    # Versione persistita: uguale su tutti i worker
+    versione_nota = request.args.get('attendi', type=int)
+    if versione_nota is None:
+        return jsonify({'timestamp': menu_cache.versione()})
+
+    # Long-poll per i client senza Socket.IO: la risposta parte appena la
+    # versione supera quella del client, o allo scadere del timeout
+    timeout = request.args.get('timeout', MENU_ATTESA_MAX_S, type=float)
+    versione = menu_realtime.attendi_versione(versione_nota, timeout)
+    if versione is None:
+        versione = versione_nota
+    response = jsonify({'timestamp': versione, 'aggiornato': versione > versione_nota})
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+# API per lo stato della coda di traduzione
+@app.route('/api/traduzioni/stato')
+@login_required
+def get_stato_traduzioni():
+    return jsonify({
+        'coda': translation_queue.stats(),
+        'lavori_recenti': translation_queue.recent_jobs()
+    })
+
+@app.route('/api/traduzioni/<int:job_id>')
+@login_required
+def get_lavoro_traduzione(job_id):
+    job = translation_queue.get_job(job_id)
+    if not job:
+        return jsonify({'success': False, 'error': 'Lavoro di traduzione non trovato'}), 404
+    return jsonify(job)
+
+# API per le statistiche di prestazione del server
+@app.route('/api/statistiche/prestazioni')
+@login_required
+def get_statistiche_prestazioni():
+    return jsonify({
+        'db_pool': db_pool.stats(),
+        'menu_cache': menu_cache.stats(),
+        'traduzioni_cache': translation_service.cache.stats(),
+        'traduzioni_coda': translation_queue.stats(),
+        'traduzioni_http': translation_service.http.stats(),
+        'utenti_cache': user_cache.stats(),
+        'menu_realtime': menu_realtime.stats(),
+        'immagini': image_pipeline.stats(),
+        'static': static_assets.stats(),
+        'compressione': compressione.stats(),
+        'json': {'encoder': app.json.encoder},
+        'socketio': socketio_backend.stats(),
+        'log': logging_stats()
+    })
+
+# Metriche in formato Prometheus
+@app.route('/metrics')
+def metrics():
+    if not metrics_authorized():
+        # Senza credenziali l'endpoint non viene rivelato
+        if not request.headers.get('Authorization'):
+            return app.response_class('Non trovato\n', status=404, mimetype='text/plain')
+        return app.response_class('Non autorizzato\n', status=401, mimetype='text/plain')
+    
+    pool = db_pool.stats()
+    cache = menu_cache.stats()
+    traduzioni = translation_service.http.stats()['provider']
+    utenti = user_cache.stats()
+    parti = [
+        request_metrics.render_prometheus(),
+        prometheus_metric('ristorante_db_pool_connessioni', 'Connessioni del pool SQLite',
+                          {'aperte': pool['connessioni_aperte'], 'libere': pool['connessioni_libere']}, 'stato'),
+        prometheus_metric('ristorante_db_pool_attese_totali', 'Checkout che hanno atteso una connessione',
+                          pool['attese'], tipo='counter'),
+        prometheus_metric('ristorante_db_pool_timeout_totali', 'Checkout falliti per timeout',
+                          pool['timeout'], tipo='counter'),
+        prometheus_metric('ristorante_menu_cache_accessi_totali', 'Accessi alla snapshot del menu',
+                          {'hit': cache['hit'], 'miss': cache['miss']}, 'esito', tipo='counter'),
+        prometheus_metric('ristorante_utenti_cache_caricamenti_totali', 'Caricamenti utente di Flask-Login',
+                          {'sessione': utenti['hit_sessione'], 'cache': utenti['hit_cache'], 'database': utenti['miss']},
+                          'origine', tipo='counter'),
+        prometheus_metric('ristorante_traduzioni_chiamate_totali', 'Chiamate HTTP ai provider di traduzione',
+                          {nome: s['chiamate'] for nome, s in traduzioni.items()}, 'provider', tipo='counter'),
+        prometheus_metric('ristorante_traduzioni_errori_totali', 'Chiamate fallite ai provider di traduzione',
+                          {nome: s['errori'] for nome, s in traduzioni.items()}, 'provider', tipo='counter'),
+        prometheus_metric('ristorante_log_scartati_totali', 'Messaggi di log scartati a coda piena',
+                          logging_stats()['scartati'], tipo='counter'),
+    ]
+    return app.response_class(''.join(parti), mimetype='text/plain; version=0.0.4')
 
 if __name__ == '__main__':
     init_db()
-    # Configurazione per produzione senza debug
-    socketio.run(app, debug=False, host='0.0.0.0', port=5001, allow_unsafe_werkzeug=True)
\ No newline at end of file
+    start_checkpoint_task(socketio)
+    translation_queue.start(socketio, on_complete=traduzione_completata)
+    image_pipeline.start(socketio, on_complete=immagine_elaborata)
+    static_assets.precomprimi()
+    # Configurazione per produzione senza debug.
+    # Più worker: un processo per porta (PORT=5001, 5002, ...) con lo stesso
+    # SOCKETIO_MESSAGE_QUEUE, dietro un proxy con sessioni sticky (deploy/nginx.conf)
+    socketio.run(app, debug=False, host=os.environ.get('HOST', '0.0.0.0'), port=int(os.environ.get('PORT', '5001')),
+                 allow_unsafe_werkzeug=True)
\ No newline at end of file
@@ -0,0 +1,147 @@
+"""
+Benchmark della serializzazione JSON delle API del menu pubblico.
+
+Per ogni endpoint costruisce il payload su un catalogo sintetico e misura il
+costo di trasformarlo nel corpo della risposta:
+  - stdlib: json della libreria standard (il jsonify di Flask);
+  - orjson: FastJSONProvider con orjson, se installato;
+  - byte in cache: i byte già serializzati letti dalla snapshot del menu,
+    cioè quello che fa risposta_menu dalla seconda richiesta in poi.
+Riporta µs per operazione (p50 e media) e la dimensione del corpo.
+
+Uso:
+    python benchmarks/bench_json.py                  # 50, 500 e 5000 prodotti
+    python benchmarks/bench_json.py --prodotti 500 --ripetizioni 500
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+DATA_DIR = os.path.join(BENCH_DIR, 'data')
+
+DIMENSIONI = [50, 500, 5000]
+
+
+def misura(funzione, ripetizioni):
+    """(p50 µs, media µs) di ripetizioni chiamate, dopo un riscaldamento"""
+    for _ in range(min(10, ripetizioni)):
+        funzione()
+    tempi = []
+    for _ in range(ripetizioni):
+        t0 = time.perf_counter()
+        funzione()
+        tempi.append((time.perf_counter() - t0) * 1e6)
+    return round(statistics.median(tempi), 1), round(statistics.fmean(tempi), 1)
+
+
+def endpoint(applicazione, ids):
+    """(nome, lingua, chiave della snapshot, builder) come in app.py"""
+    cursor = lambda: applicazione.get_db().cursor()
+    categoria = ids['categorie_principali'][0]
+    return [
+        ('prodotti', 'it', 'prodotti', lambda: applicazione.costruisci_prodotti(cursor())),
+        ('prodotti_categoria_it', 'it', ('prodotti_categoria', categoria),
+         lambda: applicazione.costruisci_prodotti_categoria(cursor(), categoria, 'it')),
+        ('prodotti_categoria_en', 'en', ('prodotti_categoria', categoria),
+         lambda: applicazione.costruisci_prodotti_categoria(cursor(), categoria, 'en')),
+        ('categorie_menu', 'it', 'categorie_menu',
+         lambda: applicazione.costruisci_categorie_menu(cursor(), 'it')),
+        ('bootstrap', 'it', 'bootstrap', lambda: applicazione.costruisci_snapshot_menu('it')['bootstrap']),
+    ]
+
+
+def esegui_dimensione(prodotti, ripetizioni):
+    """Eseguito in un processo dedicato: DATABASE_PATH va impostato prima di importare app"""
+    os.makedirs(DATA_DIR, exist_ok=True)
+    db_path = os.path.join(DATA_DIR, f'catalogo_json_{prodotti}.db')
+    for suffisso in ('', '-wal', '-shm'):
+        if os.path.exists(db_path + suffisso):
+            os.remove(db_path + suffisso)
+    os.environ['DATABASE_PATH'] = db_path
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+    sys.path.insert(0, ROOT_DIR)
+    sys.path.insert(0, BENCH_DIR)
+    os.chdir(ROOT_DIR)
+
+    from catalogo import genera_catalogo
+    from flask.json.provider import DefaultJSONProvider
+    import json_provider
+    import app as applicazione
+
+    applicazione.init_db()
+    with applicazione.db_pool.connection() as conn:
+        ids = genera_catalogo(conn, prodotti)
+    applicazione.menu_cache.invalidate()
+
+    flask_app = applicazione.app
+    encoder = {'stdlib': DefaultJSONProvider(flask_app)}
+    if json_provider.orjson is not None:
+        encoder['orjson'] = json_provider.FastJSONProvider(flask_app, encoder='orjson')
+    cache = applicazione.menu_cache
+
+    risultati = {}
+    with flask_app.app_context():
+        for nome, lingua, chiave, builder in endpoint(applicazione, ids):
+            payload = cache.get(lingua, chiave, builder)
+            risultati[nome] = {}
+            for nome_encoder, provider in encoder.items():
+                corpo = provider.response(payload).get_data()
+                p50, media = misura(lambda: provider.response(payload).get_data(), ripetizioni)
+                risultati[nome][nome_encoder] = {'p50_us': p50, 'media_us': media, 'byte': len(corpo)}
+            corpo = cache.get_derivato(lingua, chiave, 'json', builder, flask_app.json.serializza)
+            p50, media = misura(lambda: cache.get_derivato(lingua, chiave, 'json', builder,
+                                                           flask_app.json.serializza), ripetizioni)
+            risultati[nome]['byte_in_cache'] = {'p50_us': p50, 'media_us': media, 'byte': len(corpo)}
+    return {'prodotti': prodotti, 'encoder_app': flask_app.json.encoder, 'endpoint': risultati}
+
+
+def stampa_risultato(risultato):
+    print(f"\n=== Catalogo da {risultato['prodotti']} prodotti (encoder dell'app: {risultato['encoder_app']}) ===")
+    print(f"{'endpoint':<24}{'metodo':<15}{'p50 µs':>10}{'media µs':>11}{'byte':>10}{'vs stdlib':>11}")
+    for nome, metodi in risultato['endpoint'].items():
+        riferimento = metodi['stdlib']['p50_us']
+        for metodo, s in metodi.items():
+            rapporto = f"{riferimento / s['p50_us']:.1f}x" if s['p50_us'] else '-'
+            print(f"{nome:<24}{metodo:<15}{s['p50_us']:>10}{s['media_us']:>11}{s['byte']:>10}{rapporto:>11}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark della serializzazione JSON del menu')
+    parser.add_argument('--prodotti', type=int, action='append',
+                        help='Dimensione del catalogo (ripetibile, default 50/500/5000)')
+    parser.add_argument('--ripetizioni', type=int, default=200, help='Serializzazioni misurate per metodo')
+    parser.add_argument('--json', help='Scrive i risultati in questo file')
+    parser.add_argument('--_worker', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    dimensioni = args.prodotti or DIMENSIONI
+
+    if args._worker:
+        print(json.dumps(esegui_dimensione(dimensioni[0], args.ripetizioni)))
+        return 0
+
+    # Un processo per dimensione: il pool del database è legato a DATABASE_PATH all'import
+    risultati = []
+    for prodotti in dimensioni:
+        comando = [sys.executable, os.path.abspath(__file__), '--_worker', '--prodotti', str(prodotti),
+                   '--ripetizioni', str(args.ripetizioni)]
+        uscita = subprocess.run(comando, check=True, stdout=subprocess.PIPE, text=True).stdout
+        risultato = json.loads(uscita.strip().splitlines()[-1])
+        stampa_risultato(risultato)
+        risultati.append(risultato)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'data': time.strftime('%Y-%m-%d %H:%M:%S'), 'risultati': risultati}, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
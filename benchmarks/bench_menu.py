@@ -0,0 +1,294 @@
+"""
+Benchmark delle API del menu pubblico.
+
+Per ogni dimensione di catalogo genera un database sintetico e misura
+/api/prodotti, /api/prodotti/categoria/<id>, /api/categorie-menu e /menu:
+  - con il test client di Flask, a cache calda e a cache fredda (snapshot
+    invalidata prima di ogni richiesta, cioè il costo delle query);
+  - con un carico HTTP concorrente su un server locale.
+Riporta p50/p95/p99 in ms e req/s, e può salvare o confrontare una baseline.
+
+Uso:
+    python benchmarks/bench_menu.py                       # 50, 500 e 5000 prodotti
+    python benchmarks/bench_menu.py --prodotti 500
+    python benchmarks/bench_menu.py --salva-baseline
+    python benchmarks/bench_menu.py --confronta --soglia 0.25
+"""
+import argparse
+import json
+import os
+import platform
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+DATA_DIR = os.path.join(BENCH_DIR, 'data')
+BASELINE_PATH = os.path.join(BENCH_DIR, 'baseline.json')
+
+DIMENSIONI = [50, 500, 5000]
+
+
+def percentile(valori, p):
+    """Percentile nearest-rank su una lista di valori"""
+    if not valori:
+        return None
+    ordinati = sorted(valori)
+    indice = max(0, min(len(ordinati) - 1, int(round(p / 100 * len(ordinati) + 0.5)) - 1))
+    return ordinati[indice]
+
+
+def riepilogo(latenze_s, durata_s, errori=0):
+    latenze_ms = [l * 1000 for l in latenze_s]
+    return {
+        'richieste': len(latenze_ms),
+        'errori': errori,
+        'p50_ms': round(percentile(latenze_ms, 50), 3) if latenze_ms else None,
+        'p95_ms': round(percentile(latenze_ms, 95), 3) if latenze_ms else None,
+        'p99_ms': round(percentile(latenze_ms, 99), 3) if latenze_ms else None,
+        'req_s': round(len(latenze_ms) / durata_s, 1) if durata_s > 0 else None
+    }
+
+
+def scenari(ids):
+    """(nome, lista di URL usati a rotazione)"""
+    categorie = ids['categorie_principali']
+    return [
+        ('prodotti', ['/api/prodotti']),
+        ('prodotti_categoria_it', [f'/api/prodotti/categoria/{c}?lang=it' for c in categorie]),
+        ('prodotti_categoria_en', [f'/api/prodotti/categoria/{c}?lang=en' for c in categorie]),
+        ('categorie_menu', ['/api/categorie-menu?lang=it', '/api/categorie-menu?lang=en']),
+        ('pagina_menu', ['/menu']),
+    ]
+
+
+def bench_test_client(applicazione, elenco_scenari, richieste):
+    client = applicazione.app.test_client()
+    risultati = {}
+    for nome, urls in elenco_scenari:
+        risultati[nome] = {}
+        for modo in ('caldo', 'freddo'):
+            # Riscaldamento
+            for url in urls:
+                client.get(url)
+            latenze = []
+            errori = 0
+            inizio = time.perf_counter()
+            for i in range(richieste):
+                if modo == 'freddo':
+                    applicazione.menu_cache.invalidate()
+                t0 = time.perf_counter()
+                risposta = client.get(urls[i % len(urls)])
+                latenze.append(time.perf_counter() - t0)
+                if risposta.status_code != 200:
+                    errori += 1
+            risultati[nome][modo] = riepilogo(latenze, time.perf_counter() - inizio, errori)
+    return risultati
+
+
+def bench_http(applicazione, elenco_scenari, concorrenza, durata):
+    import logging
+    import requests
+    from werkzeug.serving import make_server
+
+    # Il log di ogni richiesta falserebbe le misure
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    server = make_server('127.0.0.1', 0, applicazione.app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    base = f'http://127.0.0.1:{server.server_port}'
+
+    # Mix di richieste di un ospite che apre il menu
+    urls = [url for _, elenco in elenco_scenari for url in elenco]
+
+    def worker(indice):
+        session = requests.Session()
+        latenze = []
+        errori = 0
+        fine = time.perf_counter() + durata
+        i = indice
+        while time.perf_counter() < fine:
+            t0 = time.perf_counter()
+            try:
+                risposta = session.get(base + urls[i % len(urls)], timeout=30)
+                if risposta.status_code != 200:
+                    errori += 1
+            except requests.RequestException:
+                errori += 1
+            latenze.append(time.perf_counter() - t0)
+            i += 1
+        return latenze, errori
+
+    try:
+        inizio = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concorrenza) as executor:
+            risultati = list(executor.map(worker, range(concorrenza)))
+        durata_effettiva = time.perf_counter() - inizio
+    finally:
+        server.shutdown()
+
+    latenze = [l for parziali, _ in risultati for l in parziali]
+    errori = sum(e for _, e in risultati)
+    stats = riepilogo(latenze, durata_effettiva, errori)
+    stats['concorrenza'] = concorrenza
+    return {'mix_menu': stats}
+
+
+def esegui_dimensione(prodotti, args):
+    """Eseguito in un processo dedicato: DATABASE_PATH va impostato prima di importare app"""
+    os.makedirs(DATA_DIR, exist_ok=True)
+    db_path = os.path.join(DATA_DIR, f'catalogo_{prodotti}.db')
+    for suffisso in ('', '-wal', '-shm'):
+        if os.path.exists(db_path + suffisso):
+            os.remove(db_path + suffisso)
+    os.environ['DATABASE_PATH'] = db_path
+    os.environ['MENU_CACHE_MAX_AGE'] = '0'
+
+    sys.path.insert(0, ROOT_DIR)
+    sys.path.insert(0, BENCH_DIR)
+    os.chdir(ROOT_DIR)
+
+    from catalogo import genera_catalogo
+
+    # I log dell'applicazione vanno su stderr: solo gli avvisi, per non falsare le misure
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    import app as applicazione
+    applicazione.init_db()
+    with applicazione.db_pool.connection() as conn:
+        inizio = time.perf_counter()
+        ids = genera_catalogo(conn, prodotti)
+        generazione_s = time.perf_counter() - inizio
+    applicazione.menu_cache.invalidate()
+
+    elenco_scenari = scenari(ids)
+    risultato = {
+        'prodotti': prodotti,
+        'generazione_catalogo_s': round(generazione_s, 3),
+        'test_client': bench_test_client(applicazione, elenco_scenari, args.richieste)
+    }
+    if not args.senza_http:
+        risultato['http'] = bench_http(applicazione, elenco_scenari, args.concorrenza, args.durata)
+    return risultato
+
+
+def stampa_risultato(risultato):
+    print(f"\n=== Catalogo da {risultato['prodotti']} prodotti "
+          f"(generato in {risultato['generazione_catalogo_s']}s) ===")
+    print(f"{'scenario':<24}{'modo':<8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'req/s':>10}{'errori':>8}")
+    for nome, modi in risultato['test_client'].items():
+        for modo, s in modi.items():
+            print(f"{nome:<24}{modo:<8}{s['p50_ms']:>10}{s['p95_ms']:>10}{s['p99_ms']:>10}"
+                  f"{s['req_s']:>10}{s['errori']:>8}")
+    for nome, s in risultato.get('http', {}).items():
+        print(f"{'http ' + nome:<24}{'c=' + str(s['concorrenza']):<8}{s['p50_ms']:>10}{s['p95_ms']:>10}"
+              f"{s['p99_ms']:>10}{s['req_s']:>10}{s['errori']:>8}")
+
+
+def _metriche(risultati):
+    """Appiattisce i risultati in {(prodotti, percorso): stats}"""
+    metriche = {}
+    for risultato in risultati:
+        n = str(risultato['prodotti'])
+        for nome, modi in risultato['test_client'].items():
+            for modo, s in modi.items():
+                metriche[(n, f'test_client/{nome}/{modo}')] = s
+        for nome, s in risultato.get('http', {}).items():
+            metriche[(n, f'http/{nome}')] = s
+    return metriche
+
+
+def confronta(risultati, baseline, soglia):
+    """Stampa le variazioni rispetto alla baseline; True se c'è una regressione oltre soglia"""
+    attuali = _metriche(risultati)
+    precedenti = _metriche(baseline['risultati'])
+    regressioni = []
+    print(f"\n=== Confronto con la baseline del {baseline.get('data', '?')} (soglia {soglia:.0%}) ===")
+    for chiave in sorted(attuali):
+        if chiave not in precedenti:
+            continue
+        ora, prima = attuali[chiave], precedenti[chiave]
+        delta_p95 = (ora['p95_ms'] - prima['p95_ms']) / prima['p95_ms'] if prima['p95_ms'] else 0.0
+        delta_rps = (ora['req_s'] - prima['req_s']) / prima['req_s'] if prima['req_s'] else 0.0
+        peggiorato = delta_p95 > soglia or delta_rps < -soglia
+        if peggiorato:
+            regressioni.append(chiave)
+        print(f"{chiave[0]:>6} {chiave[1]:<46} p95 {delta_p95:+7.1%}  req/s {delta_rps:+7.1%}"
+              f"{'  <-- REGRESSIONE' if peggiorato else ''}")
+    return bool(regressioni)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark delle API del menu pubblico')
+    parser.add_argument('--prodotti', type=int, action='append',
+                        help='Dimensione del catalogo (ripetibile, default 50/500/5000)')
+    parser.add_argument('--richieste', type=int, default=200, help='Richieste per scenario col test client')
+    parser.add_argument('--concorrenza', type=int, default=8, help='Client HTTP concorrenti')
+    parser.add_argument('--durata', type=float, default=5.0, help='Durata del carico HTTP in secondi')
+    parser.add_argument('--senza-http', action='store_true', help='Salta il carico HTTP')
+    parser.add_argument('--salva-baseline', action='store_true', help=f'Scrive {BASELINE_PATH}')
+    parser.add_argument('--confronta', action='store_true', help='Confronta con la baseline salvata')
+    parser.add_argument('--soglia', type=float, default=0.25, help='Regressione tollerata (0.25 = 25%%)')
+    parser.add_argument('--json', help='Scrive i risultati in questo file')
+    parser.add_argument('--_worker', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    dimensioni = args.prodotti or DIMENSIONI
+
+    if args._worker:
+        print(json.dumps(esegui_dimensione(dimensioni[0], args)))
+        return 0
+
+    # Un processo per dimensione: il pool del database è legato a DATABASE_PATH all'import
+    risultati = []
+    for prodotti in dimensioni:
+        comando = [sys.executable, os.path.abspath(__file__), '--_worker', '--prodotti', str(prodotti),
+                   '--richieste', str(args.richieste), '--concorrenza', str(args.concorrenza),
+                   '--durata', str(args.durata)]
+        if args.senza_http:
+            comando.append('--senza-http')
+        uscita = subprocess.run(comando, check=True, stdout=subprocess.PIPE, text=True).stdout
+        risultato = json.loads(uscita.strip().splitlines()[-1])
+        stampa_risultato(risultato)
+        risultati.append(risultato)
+
+    documento = {
+        'data': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'ambiente': {
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'piattaforma': platform.platform(),
+            'cpu': os.cpu_count()
+        },
+        'parametri': {'richieste': args.richieste, 'concorrenza': args.concorrenza, 'durata': args.durata},
+        'risultati': risultati
+    }
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(documento, f, indent=2)
+
+    esito = 0
+    if args.confronta:
+        if not os.path.exists(BASELINE_PATH):
+            print(f"\nNessuna baseline in {BASELINE_PATH}: eseguire prima con --salva-baseline")
+            esito = 2
+        else:
+            with open(BASELINE_PATH, encoding='utf-8') as f:
+                baseline = json.load(f)
+            if confronta(risultati, baseline, args.soglia):
+                esito = 1
+
+    if args.salva_baseline:
+        with open(BASELINE_PATH, 'w', encoding='utf-8') as f:
+            json.dump(documento, f, indent=2)
+        print(f"\nBaseline salvata in {BASELINE_PATH}")
+
+    return esito
+
+
+if __name__ == '__main__':
+    sys.exit(main())
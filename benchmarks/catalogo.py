@@ -0,0 +1,84 @@
+"""
+Generatore di cataloghi sintetici per i benchmark del menu pubblico.
+Crea categorie su due livelli, allergeni, ingredienti e prodotti con un
+numero realistico di allergeni/ingredienti per piatto, più le traduzioni
+inglesi come se la coda traduzioni avesse già lavorato.
+"""
+import random
+
+from menu_read_model import ID_ALLERGENE_LIBERO
+
+CATEGORIE_PRINCIPALI = ['Antipasti', 'Primi Piatti', 'Secondi Piatti', 'Pizze', 'Contorni',
+                        'Dolci', 'Bevande', 'Vini']
+SOTTOCATEGORIE = ['Carne', 'Pesce', 'Vegetariani', 'Della casa']
+
+# I 14 allergeni del Reg. UE 1169/2011
+ALLERGENI = ['Glutine', 'Crostacei', 'Uova', 'Pesce', 'Arachidi', 'Soia', 'Lattosio',
+             'Frutta a guscio', 'Sedano', 'Senape', 'Sesamo', 'Solfiti', 'Lupini', 'Molluschi']
+
+NUM_INGREDIENTI = 120
+
+
+def _nome_prodotto(rng, i):
+    # Alcuni nomi contengono virgole e '|' come nei menu reali
+    base = rng.choice(['Tagliata', 'Risotto', 'Gnocchi', 'Frittura', 'Tartare', 'Crostata',
+                       'Zuppa', 'Insalata', 'Filetto', 'Lasagna'])
+    suffisso = rng.choice(['', ' con funghi, salsiccia', ' al pomodoro', ' | versione vegana', ' della casa'])
+    return f'{base}{suffisso} #{i}'
+
+
+def genera_catalogo(conn, prodotti: int, seed: int = 42) -> dict:
+    """
+    Sostituisce il contenuto del menu con un catalogo sintetico di `prodotti`
+    piatti. Il modello di lettura viene mantenuto dai trigger durante gli insert.
+    Restituisce gli id utili ai benchmark.
+    """
+    rng = random.Random(seed)
+    cursor = conn.cursor()
+    for tabella in ('prodotti_allergeni', 'prodotti_ingredienti', 'prodotti', 'categorie',
+                    'allergeni', 'ingredienti'):
+        cursor.execute(f'DELETE FROM {tabella}')
+
+    categorie_principali = []
+    categorie_foglia = []
+    for ordine, nome in enumerate(CATEGORIE_PRINCIPALI, 1):
+        cursor.execute('INSERT INTO categorie (nome, nome_en, descrizione, ordine) VALUES (?, ?, ?, ?)',
+                       (nome, f'{nome} EN', f'Descrizione {nome}', ordine))
+        parent_id = cursor.lastrowid
+        categorie_principali.append(parent_id)
+        categorie_foglia.append(parent_id)
+        for ordine_figlia, figlia in enumerate(SOTTOCATEGORIE, 1):
+            cursor.execute('INSERT INTO categorie (nome, nome_en, parent_id, descrizione, ordine) '
+                           'VALUES (?, ?, ?, ?, ?)',
+                           (figlia, f'{figlia} EN', parent_id, f'{figlia} - {nome}', ordine_figlia))
+            categorie_foglia.append(cursor.lastrowid)
+
+    allergeni = []
+    for nome in ALLERGENI:
+        cursor.execute(f'INSERT INTO allergeni (id, nome, nome_en, icona) SELECT {ID_ALLERGENE_LIBERO}, ?, ?, ?',
+                       (nome, f'{nome} EN', '!'))
+        allergeni.append(cursor.lastrowid)
+
+    ingredienti = []
+    for i in range(NUM_INGREDIENTI):
+        cursor.execute('INSERT INTO ingredienti (nome, nome_en, icona) VALUES (?, ?, ?)',
+                       (f'Ingrediente {i}', f'Ingredient {i}', ''))
+        ingredienti.append(cursor.lastrowid)
+
+    for i in range(prodotti):
+        nome = _nome_prodotto(rng, i)
+        cursor.execute('''
+            INSERT INTO prodotti (nome, nome_en, descrizione, descrizione_en, prezzo, categoria_id,
+                                  disponibile, attivo)
+            VALUES (?, ?, ?, ?, ?, ?, ?, 1)
+        ''', (nome, f'{nome} EN', f'Descrizione del piatto {i}', f'Dish description {i}',
+              round(rng.uniform(4, 35), 2), rng.choice(categorie_foglia), 1 if rng.random() < 0.9 else 0))
+        prodotto_id = cursor.lastrowid
+        cursor.executemany('INSERT INTO prodotti_allergeni (prodotto_id, allergene_id) VALUES (?, ?)',
+                           [(prodotto_id, a) for a in rng.sample(allergeni, rng.randint(0, 4))])
+        cursor.executemany('INSERT INTO prodotti_ingredienti (prodotto_id, ingrediente_id) VALUES (?, ?)',
+                           [(prodotto_id, ing) for ing in rng.sample(ingredienti, rng.randint(3, 8))])
+
+    conn.commit()
+    cursor.execute('ANALYZE')
+    return {'categorie_principali': categorie_principali, 'categorie_foglia': categorie_foglia}
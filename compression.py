@@ -0,0 +1,130 @@
+"""
+Negoziazione e compressione delle risposte: gzip sempre, brotli se il
+pacchetto 'brotli' (o 'brotlicffi') è installato.
+
+init_app comprime le risposte dinamiche testuali (JSON, HTML) secondo
+Accept-Encoding. Le API del menu arrivano già compresse dalla snapshot
+(Content-Encoding impostato) e i file statici sono precompressi: entrambi
+vengono lasciati come sono.
+"""
+import os
+import gzip
+import threading
+from typing import Dict, Iterable, Optional
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:
+    try:
+        import brotlicffi as brotli
+    except ImportError:
+        brotli = None
+
+# In ordine di preferenza a parità di qualità richiesta dal client
+ENCODING_SUPPORTATI = ('br', 'gzip') if brotli is not None else ('gzip',)
+
+# Suffisso dei file precompressi accanto all'originale
+ESTENSIONI = {'br': '.br', 'gzip': '.gz'}
+
+# Disattivabile se la compressione è già fatta dal proxy
+COMPRESSIONE_RISPOSTE = os.getenv('COMPRESSIONE_RISPOSTE', '1') == '1'
+# Sotto questa dimensione la compressione non ripaga
+COMPRESSIONE_MIN_BYTE = int(os.getenv('COMPRESSIONE_MIN_BYTE', '1024'))
+
+MIMETYPE_COMPRIMIBILI = {
+    'application/json', 'text/html', 'text/plain', 'text/css',
+    'text/javascript', 'application/javascript', 'image/svg+xml'
+}
+
+
+def negozia_encoding(accept_encodings, disponibili: Iterable[str] = ENCODING_SUPPORTATI) -> Optional[str]:
+    """
+    Encoding migliore tra quelli disponibili per l'header Accept-Encoding
+    (request.accept_encodings), None se il client non ne accetta nessuno.
+    """
+    migliore, qualita_migliore = None, 0
+    for encoding in disponibili:
+        qualita = accept_encodings[encoding]
+        if qualita > qualita_migliore:
+            migliore, qualita_migliore = encoding, qualita
+    return migliore
+
+
+def comprimi(dati: bytes, encoding: str, massima: bool = False) -> bytes:
+    """
+    Comprime con l'encoding indicato. massima=True per i file compressi una
+    volta sola (statici all'avvio), altrimenti un livello adatto alle risposte.
+    """
+    if encoding == 'gzip':
+        # mtime=0: stesso input, stessi byte (ETag stabili tra i worker)
+        return gzip.compress(dati, compresslevel=9 if massima else 6, mtime=0)
+    if encoding == 'br' and brotli is not None:
+        return brotli.compress(dati, quality=11 if massima else 5)
+    raise ValueError(f"Encoding non supportato: {encoding}")
+
+
+class CompressioneRisposte:
+    def __init__(self, min_byte: int = COMPRESSIONE_MIN_BYTE):
+        self.min_byte = min_byte
+        self._lock = threading.Lock()
+        self._stats = {
+            'compresse': 0,
+            'byte_originali': 0,
+            'byte_compressi': 0
+        }
+
+    def init_app(self, app) -> None:
+        if COMPRESSIONE_RISPOSTE:
+            app.after_request(self.comprimi_risposta)
+
+    def comprimi(self, dati: bytes, encoding: str) -> bytes:
+        """Comprime un corpo di risposta aggiornando le statistiche"""
+        compressi = comprimi(dati, encoding)
+        with self._lock:
+            self._stats['compresse'] += 1
+            self._stats['byte_originali'] += len(dati)
+            self._stats['byte_compressi'] += len(compressi)
+        return compressi
+
+    def comprimi_risposta(self, response):
+        # File (direct_passthrough), stream e risposte già codificate restano invariati
+        if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+                or 'Content-Encoding' in response.headers
+                or response.mimetype not in MIMETYPE_COMPRIMIBILI):
+            return response
+        response.vary.add('Accept-Encoding')
+        encoding = negozia_encoding(request.accept_encodings)
+        if encoding is None:
+            return response
+        dati = response.get_data()
+        if len(dati) < self.min_byte:
+            return response
+
+        response.set_data(self.comprimi(dati, encoding))
+        response.headers['Content-Encoding'] = encoding
+        marca_etag_debole(response)
+        return response
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            stats = dict(self._stats)
+        stats['rapporto'] = (stats['byte_compressi'] / stats['byte_originali']) if stats['byte_originali'] else None
+        stats['encoding'] = list(ENCODING_SUPPORTATI)
+        stats['attiva'] = COMPRESSIONE_RISPOSTE
+        return stats
+
+
+def marca_etag_debole(response) -> None:
+    """
+    Una rappresentazione compressa non è identica byte per byte a quella
+    originale: l'ETag forte diventa debole (If-None-Match usa il confronto debole)
+    """
+    etag, debole = response.get_etag()
+    if etag and not debole:
+        response.set_etag(etag, weak=True)
+
+
+# Istanza globale della compressione delle risposte
+compressione = CompressioneRisposte()
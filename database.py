@@ -0,0 +1,291 @@
+import os
+import time
+import sqlite3
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Dict, Optional, Tuple
+
+from flask import g, has_app_context
+
+from instrumentation import connection_factory
+
+logger = logging.getLogger(__name__)
+
+DATABASE_PATH = os.getenv('DATABASE_PATH', 'ristorante.db')
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '10'))
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', '10'))
+DB_CHECKPOINT_INTERVAL = int(os.getenv('DB_CHECKPOINT_INTERVAL', '300'))
+
+# Profilo applicato ad ogni connessione aperta dal pool.
+# WAL permette alle letture del menu pubblico di non attendere le scritture admin.
+DB_PROFILE = {
+    'journal_mode': os.getenv('DB_JOURNAL_MODE', 'WAL').upper(),
+    'synchronous': os.getenv('DB_SYNCHRONOUS', 'NORMAL').upper(),
+    'busy_timeout': int(os.getenv('DB_BUSY_TIMEOUT_MS', '5000')),
+    'cache_size': int(os.getenv('DB_CACHE_SIZE', '-16000')),  # negativo = KiB
+    'mmap_size': int(os.getenv('DB_MMAP_SIZE', str(128 * 1024 * 1024))),
+    'temp_store': os.getenv('DB_TEMP_STORE', 'MEMORY').upper()
+}
+
+_JOURNAL_MODES = {'DELETE', 'TRUNCATE', 'PERSIST', 'MEMORY', 'WAL', 'OFF'}
+_SYNCHRONOUS_MODES = {'OFF', 'NORMAL', 'FULL', 'EXTRA'}
+_TEMP_STORE_MODES = {'DEFAULT', 'FILE', 'MEMORY'}
+_CHECKPOINT_MODES = {'PASSIVE', 'FULL', 'RESTART', 'TRUNCATE'}
+
+
+class PoolTimeoutError(Exception):
+    """Nessuna connessione libera nel pool entro il timeout configurato"""
+
+
+def apply_profile(conn: sqlite3.Connection, profile: Dict) -> None:
+    """Applica i PRAGMA del profilo ad una connessione appena aperta"""
+    if profile['journal_mode'] not in _JOURNAL_MODES:
+        raise ValueError(f"journal_mode non valido: {profile['journal_mode']}")
+    if profile['synchronous'] not in _SYNCHRONOUS_MODES:
+        raise ValueError(f"synchronous non valido: {profile['synchronous']}")
+    if profile['temp_store'] not in _TEMP_STORE_MODES:
+        raise ValueError(f"temp_store non valido: {profile['temp_store']}")
+
+    conn.execute(f"PRAGMA busy_timeout = {int(profile['busy_timeout'])}")
+    try:
+        # journal_mode è persistente nel file: serve solo alla prima apertura
+        conn.execute(f"PRAGMA journal_mode = {profile['journal_mode']}")
+    except sqlite3.OperationalError as e:
+        logger.warning(f"Impossibile impostare journal_mode={profile['journal_mode']}: {e}")
+    conn.execute(f"PRAGMA synchronous = {profile['synchronous']}")
+    conn.execute(f"PRAGMA cache_size = {int(profile['cache_size'])}")
+    conn.execute(f"PRAGMA mmap_size = {int(profile['mmap_size'])}")
+    conn.execute(f"PRAGMA temp_store = {profile['temp_store']}")
+
+
+def open_connection(db_path: str = DATABASE_PATH, profile: Optional[Dict] = None) -> sqlite3.Connection:
+    """
+    Apre una connessione con il profilo del pool. Usata dal pool e dai
+    componenti che tengono una connessione dedicata (es. la cache traduzioni).
+    """
+    profile = profile or DB_PROFILE
+    conn = sqlite3.connect(
+        db_path,
+        timeout=profile['busy_timeout'] / 1000,
+        check_same_thread=False,
+        factory=connection_factory()
+    )
+    try:
+        apply_profile(conn, profile)
+    except Exception:
+        conn.close()
+        raise
+    return conn
+
+
+class ConnectionPool:
+    """
+    Pool di connessioni SQLite condiviso per processo (worker).
+    Le connessioni vengono aperte al primo utilizzo, riutilizzate tra le richieste
+    e mai chiuse durante la vita del worker, evitando il costo di apertura e il
+    parsing dello schema ad ogni richiesta.
+    Sotto eventlet con monkey patching il Condition è cooperativo, quindi
+    l'attesa di una connessione libera non blocca gli altri greenlet.
+    """
+
+    def __init__(self, db_path: str, pool_size: int = 10, timeout: float = 10.0,
+                 profile: Optional[Dict] = None):
+        self.db_path = db_path
+        self.pool_size = max(1, pool_size)
+        self.timeout = timeout
+        self.profile = dict(profile or DB_PROFILE)
+        self._idle = []
+        self._created = 0
+        self._cond = threading.Condition()
+        self._stats = {
+            'checkouts': 0,
+            'attese': 0,
+            'timeout': 0,
+            'connessioni_create': 0,
+            'connessioni_scartate': 0,
+            'tempo_attesa_totale_ms': 0.0,
+            'tempo_attesa_max_ms': 0.0,
+            'checkpoint': 0,
+            'checkpoint_pagine': 0,
+            'checkpoint_occupati': 0
+        }
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = open_connection(self.db_path, self.profile)
+        with self._cond:
+            self._stats['connessioni_create'] += 1
+        return conn
+
+    def acquire(self) -> sqlite3.Connection:
+        """Preleva una connessione dal pool, aprendone una nuova se c'è spazio"""
+        start = time.perf_counter()
+        deadline = start + self.timeout
+        conn = None
+        waited = False
+
+        with self._cond:
+            while True:
+                if self._idle:
+                    conn = self._idle.pop()
+                    break
+                if self._created < self.pool_size:
+                    self._created += 1
+                    break
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    self._stats['timeout'] += 1
+                    raise PoolTimeoutError(
+                        f"Nessuna connessione disponibile dopo {self.timeout}s (pool_size={self.pool_size})"
+                    )
+                waited = True
+                self._cond.wait(remaining)
+
+        if conn is None:
+            try:
+                conn = self._connect()
+            except Exception:
+                with self._cond:
+                    self._created -= 1
+                    self._cond.notify()
+                raise
+
+        wait_ms = (time.perf_counter() - start) * 1000
+        with self._cond:
+            self._stats['checkouts'] += 1
+            if waited:
+                self._stats['attese'] += 1
+            self._stats['tempo_attesa_totale_ms'] += wait_ms
+            if wait_ms > self._stats['tempo_attesa_max_ms']:
+                self._stats['tempo_attesa_max_ms'] = wait_ms
+
+        return conn
+
+    def release(self, conn: sqlite3.Connection) -> None:
+        """Restituisce una connessione al pool annullando eventuali transazioni aperte"""
+        try:
+            conn.rollback()
+        except sqlite3.Error as e:
+            logger.warning(f"Connessione scartata dal pool: {e}")
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+            with self._cond:
+                self._created -= 1
+                self._stats['connessioni_scartate'] += 1
+                self._cond.notify()
+            return
+
+        with self._cond:
+            self._idle.append(conn)
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self):
+        """Context manager per l'uso di una connessione fuori dal ciclo di richiesta"""
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def checkpoint(self, mode: str = 'PASSIVE') -> Tuple[int, int, int]:
+        """
+        Esegue un checkpoint del WAL riportando le pagine nel file principale.
+        PASSIVE non attende lettori o scrittori, quindi è sicuro durante il servizio.
+        """
+        mode = mode.upper()
+        if mode not in _CHECKPOINT_MODES:
+            raise ValueError(f"Modalità checkpoint non valida: {mode}")
+
+        with self.connection() as conn:
+            busy, log_pages, checkpointed = conn.execute(f'PRAGMA wal_checkpoint({mode})').fetchone()
+
+        with self._cond:
+            self._stats['checkpoint'] += 1
+            self._stats['checkpoint_pagine'] += max(checkpointed, 0)
+            if busy:
+                self._stats['checkpoint_occupati'] += 1
+        return busy, log_pages, checkpointed
+
+    def close_all(self) -> None:
+        """Chiude le connessioni inattive (es. alla chiusura del worker)"""
+        with self._cond:
+            while self._idle:
+                conn = self._idle.pop()
+                self._created -= 1
+                try:
+                    conn.close()
+                except sqlite3.Error:
+                    pass
+
+    def stats(self) -> Dict[str, float]:
+        with self._cond:
+            stats = dict(self._stats)
+            stats['pool_size'] = self.pool_size
+            stats['journal_mode'] = self.profile['journal_mode']
+            stats['connessioni_aperte'] = self._created
+            stats['connessioni_libere'] = len(self._idle)
+        checkouts = stats['checkouts']
+        stats['tempo_attesa_medio_ms'] = stats['tempo_attesa_totale_ms'] / checkouts if checkouts else 0.0
+        return stats
+
+
+# Pool globale del worker
+db_pool = ConnectionPool(DATABASE_PATH, pool_size=DB_POOL_SIZE, timeout=DB_POOL_TIMEOUT)
+
+
+def get_db() -> sqlite3.Connection:
+    """
+    Restituisce la connessione assegnata alla richiesta corrente.
+    La connessione viene prelevata dal pool al primo utilizzo e rilasciata
+    automaticamente alla chiusura dell'app context.
+    """
+    if 'db' not in g:
+        g.db = db_pool.acquire()
+    return g.db
+
+
+def close_db(exception: Optional[BaseException] = None) -> None:
+    conn = g.pop('db', None)
+    if conn is not None:
+        db_pool.release(conn)
+
+
+@contextmanager
+def db_connection():
+    """
+    Connessione per il codice condiviso (es. translation_service): dentro una
+    richiesta riusa quella della richiesta, altrimenti ne preleva una dal pool.
+    """
+    if has_app_context():
+        yield get_db()
+    else:
+        with db_pool.connection() as conn:
+            yield conn
+
+
+def start_checkpoint_task(socketio, interval: int = DB_CHECKPOINT_INTERVAL):
+    """
+    Avvia il checkpoint periodico del WAL come task in background di Socket.IO
+    (greenlet sotto eventlet, thread altrimenti).
+    """
+    if interval <= 0 or db_pool.profile['journal_mode'] != 'WAL':
+        return None
+
+    def _checkpoint_loop():
+        while True:
+            socketio.sleep(interval)
+            try:
+                busy, log_pages, checkpointed = db_pool.checkpoint('PASSIVE')
+                logger.debug(f"Checkpoint WAL: {checkpointed}/{log_pages} pagine (occupato={busy})")
+            except Exception as e:
+                logger.warning(f"Errore durante il checkpoint WAL: {e}")
+
+    return socketio.start_background_task(_checkpoint_loop)
+
+
+def init_app(app) -> None:
+    """Registra il rilascio delle connessioni a fine richiesta"""
+    app.teardown_appcontext(close_db)
@@ -0,0 +1,271 @@
+"""
+Varianti delle immagini caricate (foto dei prodotti e logo).
+
+L'upload salva l'originale e risponde subito; un pool di worker genera in
+background le versioni ridimensionate in WebP e JPEG (senza metadati EXIF,
+quindi anche senza la posizione GPS degli scatti dal telefono) e le registra
+nella colonna *_varianti della riga, in JSON:
+
+    {"thumb": {"larghezza": 160, "altezza": 120,
+               "webp": "uploads/<nome>-thumb.webp", "jpeg": "uploads/<nome>-thumb.jpg"},
+     "medium": {...}, "large": {...}}
+
+Pillow è opzionale: senza, le colonne restano NULL e il menu usa l'originale.
+"""
+import os
+import json
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from database import db_connection
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = None
+    ImageOps = None
+
+logger = logging.getLogger(__name__)
+
+# nome=larghezza massima in px, dalla più piccola alla più grande
+IMMAGINI_VARIANTI = os.getenv('IMMAGINI_VARIANTI', 'thumb=160,medium=480,large=1024')
+IMMAGINI_QUALITA_WEBP = int(os.getenv('IMMAGINI_QUALITA_WEBP', '80'))
+IMMAGINI_QUALITA_JPEG = int(os.getenv('IMMAGINI_QUALITA_JPEG', '82'))
+IMMAGINI_WORKER = int(os.getenv('IMMAGINI_WORKER', '2'))
+
+# tabella -> (colonna dell'originale, colonna delle varianti)
+COLONNE_IMMAGINI = {
+    'prodotti': ('foto', 'foto_varianti'),
+    'azienda': ('logo', 'logo_varianti'),
+}
+
+
+def parse_varianti(spec: str) -> List[Tuple[str, int]]:
+    """'thumb=160,medium=480' -> [('thumb', 160), ('medium', 480)] ordinate per larghezza"""
+    varianti = []
+    for parte in spec.split(','):
+        if '=' not in parte:
+            continue
+        nome, larghezza = parte.split('=', 1)
+        varianti.append((nome.strip(), int(larghezza)))
+    return sorted(varianti, key=lambda v: v[1])
+
+
+def _rgb(img: 'Image.Image') -> 'Image.Image':
+    """JPEG non ha trasparenza: le immagini con alpha vanno su sfondo bianco"""
+    if img.mode in ('RGBA', 'LA') or (img.mode == 'P' and 'transparency' in img.info):
+        img = img.convert('RGBA')
+        sfondo = Image.new('RGB', img.size, (255, 255, 255))
+        sfondo.paste(img, mask=img.getchannel('A'))
+        return sfondo
+    return img.convert('RGB')
+
+
+def genera_varianti(percorso: str, cartella_static: str = 'static',
+                    varianti: Optional[List[Tuple[str, int]]] = None) -> Dict[str, Dict[str, Any]]:
+    """
+    Genera le varianti dell'immagine static/<percorso> accanto all'originale.
+    Non ingrandisce: le varianti più larghe dell'originale sono sostituite da
+    una sola copia alla dimensione originale.
+    """
+    if Image is None:
+        raise RuntimeError("Pillow non installato")
+    varianti = varianti or parse_varianti(IMMAGINI_VARIANTI)
+    base, _ = os.path.splitext(percorso)
+
+    with Image.open(os.path.join(cartella_static, percorso)) as originale:
+        # Con i JPEG grandi il decoder può già ridurre di 1/2, 1/4, 1/8
+        massima = varianti[-1][1]
+        originale.draft('RGB', (massima, massima))
+        img = ImageOps.exif_transpose(originale)
+        img.load()
+    icc_profile = img.info.get('icc_profile')
+    trasparente = img.mode in ('RGBA', 'LA') or (img.mode == 'P' and 'transparency' in img.info)
+    img = img.convert('RGBA' if trasparente else 'RGB')
+
+    risultato = {}
+    # Dalla più grande alla più piccola, riducendo ogni volta la precedente
+    corrente = img
+    for nome, larghezza in reversed(varianti):
+        if larghezza < corrente.width:
+            altezza = max(1, round(corrente.height * larghezza / corrente.width))
+            corrente = corrente.resize((larghezza, altezza), Image.Resampling.LANCZOS, reducing_gap=3.0)
+        elif any(v['larghezza'] == corrente.width for v in risultato.values()):
+            # Originale più piccolo anche della variante precedente: già generata
+            continue
+
+        webp = f'{base}-{nome}.webp'
+        jpeg = f'{base}-{nome}.jpg'
+        # Nessun exif/xmp: vengono salvati solo i pixel (e il profilo colore)
+        corrente.save(os.path.join(cartella_static, webp), 'WEBP', quality=IMMAGINI_QUALITA_WEBP,
+                      method=4, icc_profile=icc_profile)
+        _rgb(corrente).save(os.path.join(cartella_static, jpeg), 'JPEG', quality=IMMAGINI_QUALITA_JPEG,
+                            optimize=True, progressive=True, icc_profile=icc_profile)
+        risultato[nome] = {
+            'larghezza': corrente.width,
+            'altezza': corrente.height,
+            'webp': webp,
+            'jpeg': jpeg
+        }
+
+    # Ordine dalla più piccola, come in IMMAGINI_VARIANTI
+    return dict(reversed(list(risultato.items())))
+
+
+def elimina_varianti(varianti_json: Optional[str], cartella_static: str = 'static') -> None:
+    """Elimina dal filesystem i file elencati in una colonna *_varianti"""
+    if not varianti_json:
+        return
+    try:
+        varianti = json.loads(varianti_json)
+    except ValueError:
+        return
+    for variante in varianti.values():
+        for formato in ('webp', 'jpeg'):
+            percorso = os.path.join(cartella_static, variante[formato])
+            try:
+                os.remove(percorso)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning("Errore nell'eliminazione della variante %s: %s", percorso, e)
+
+
+class ImagePipeline:
+    """
+    Pool di worker che genera le varianti delle immagini caricate. Ridimensionare
+    e codificare è lavoro di CPU: con eventlet va nel threadpool nativo (tpool),
+    max_workers alla volta, altrimenti in un ThreadPoolExecutor (Pillow rilascia
+    il GIL durante la codifica, quindi i worker lavorano in parallelo).
+    """
+
+    def __init__(self, cartella_static: str = 'static', max_workers: int = IMMAGINI_WORKER):
+        self.cartella_static = cartella_static
+        self.max_workers = max_workers
+        self.varianti = parse_varianti(IMMAGINI_VARIANTI)
+        self._socketio = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        # Con eventlet: al più max_workers elaborazioni contemporanee nel tpool
+        self._semaforo = None
+        self._on_complete: Optional[Callable[[str, int, Dict], None]] = None
+        self._lock = threading.Lock()
+        self._stats = {
+            'accodate': 0,
+            'completate': 0,
+            'fallite': 0,
+            'scartate': 0,
+            'tempo_totale_ms': 0.0
+        }
+
+    @property
+    def disponibile(self) -> bool:
+        return Image is not None
+
+    def _conta(self, chiave: str, valore: float = 1) -> None:
+        with self._lock:
+            self._stats[chiave] += valore
+
+    def _run_blocking(self, func, *args):
+        if self._socketio is not None and self._socketio.async_mode == 'eventlet':
+            from eventlet import tpool
+            return tpool.execute(func, *args)
+        return func(*args)
+
+    def accoda(self, tabella: str, elemento_id: int, percorso: Optional[str]) -> bool:
+        """
+        Accoda la generazione delle varianti per l'immagine appena salvata
+        nella riga indicata. False se Pillow non è disponibile.
+        """
+        if tabella not in COLONNE_IMMAGINI:
+            raise ValueError(f"Tabella senza immagini: {tabella}")
+        if not percorso or not self.disponibile:
+            return False
+
+        self._conta('accodate')
+        if self._socketio is not None and self._socketio.async_mode == 'eventlet':
+            # Il greenlet costa poco: attende il semaforo senza occupare un thread del tpool
+            self._socketio.start_background_task(self._elabora_limitato, tabella, elemento_id, percorso)
+        else:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                        thread_name_prefix='immagini')
+            self._executor.submit(self._elabora, tabella, elemento_id, percorso)
+        return True
+
+    def _elabora_limitato(self, tabella: str, elemento_id: int, percorso: str) -> None:
+        with self._semaforo:
+            self._elabora(tabella, elemento_id, percorso)
+
+    def _elabora(self, tabella: str, elemento_id: int, percorso: str) -> None:
+        colonna, colonna_varianti = COLONNE_IMMAGINI[tabella]
+        inizio = time.perf_counter()
+        try:
+            varianti = self._run_blocking(genera_varianti, percorso, self.cartella_static, self.varianti)
+        except Exception as e:
+            logger.warning("Varianti non generate per %s %s (%s): %s", tabella, elemento_id, percorso, e)
+            self._conta('fallite')
+            # '{}' = elaborata senza varianti: il menu usa l'originale e non si riprova all'avvio
+            varianti = {}
+        else:
+            self._conta('completate')
+            self._conta('tempo_totale_ms', (time.perf_counter() - inizio) * 1000)
+
+        varianti_json = json.dumps(varianti)
+        with db_connection() as conn:
+            # Solo se nel frattempo l'immagine non è stata sostituita o eliminata
+            cursor = conn.execute(f'''
+                UPDATE {tabella} SET {colonna_varianti} = ?
+                WHERE id = ? AND {colonna} = ?
+            ''', (varianti_json, elemento_id, percorso))
+            conn.commit()
+        if cursor.rowcount == 0:
+            self._conta('scartate')
+            elimina_varianti(varianti_json, self.cartella_static)
+            return
+
+        logger.info("Varianti generate per %s %s: %s", tabella, elemento_id, ', '.join(varianti) or 'nessuna',
+                    extra={'tabella': tabella, 'elemento_id': elemento_id})
+        if self._on_complete:
+            try:
+                self._on_complete(tabella, elemento_id, varianti)
+            except Exception as e:
+                logger.error("Errore nella notifica delle varianti di %s %s: %s", tabella, elemento_id, e)
+
+    def _accoda_mancanti(self) -> None:
+        """Immagini caricate prima della pipeline o rimaste in coda ad un riavvio"""
+        for tabella, (colonna, colonna_varianti) in COLONNE_IMMAGINI.items():
+            with db_connection() as conn:
+                righe = conn.execute(f'''
+                    SELECT id, {colonna} FROM {tabella}
+                    WHERE {colonna} IS NOT NULL AND {colonna} != '' AND {colonna_varianti} IS NULL
+                ''').fetchall()
+            for elemento_id, percorso in righe:
+                self.accoda(tabella, elemento_id, percorso)
+
+    def start(self, socketio, on_complete: Optional[Callable[[str, int, Dict], None]] = None) -> None:
+        """Collega la pipeline a Socket.IO e accoda le immagini ancora senza varianti"""
+        self._socketio = socketio
+        self._on_complete = on_complete
+        if socketio.async_mode == 'eventlet':
+            # Semaforo di eventlet anche senza monkey patching: non blocca l'hub
+            from eventlet.semaphore import Semaphore
+            self._semaforo = Semaphore(self.max_workers)
+        if not self.disponibile:
+            logger.warning("Pillow non installato: le immagini vengono servite senza varianti")
+            return
+        socketio.start_background_task(self._accoda_mancanti)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+        stats['pillow'] = self.disponibile
+        stats['varianti'] = dict(self.varianti)
+        return stats
+
+
+# Istanza globale della pipeline delle immagini
+image_pipeline = ImagePipeline()
@@ -0,0 +1,250 @@
+import os
+import hmac
+import time
+import sqlite3
+import logging
+import threading
+import ipaddress
+from typing import Dict, Iterable, List, Tuple, Union
+
+from flask import g, has_app_context, has_request_context, request
+
+logger = logging.getLogger(__name__)
+
+# Query più lente di questa soglia vengono registrate con il loro piano di esecuzione
+SLOW_QUERY_MS = float(os.getenv('SLOW_QUERY_MS', '100'))
+DB_INSTRUMENTATION = os.getenv('DB_INSTRUMENTATION', 'true').lower() in ('1', 'true', 'yes')
+# Se impostato, /metrics richiede "Authorization: Bearer <token>";
+# altrimenti risponde solo alle richieste locali non inoltrate dal proxy
+METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+
+# Limiti superiori (secondi) dei bucket delle durate delle richieste
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+_ROUTE_FUORI_RICHIESTA = '<background>'
+
+
+class RequestMetrics:
+    """
+    Aggregati per route: numero di richieste per stato, istogramma delle
+    durate, query SQL eseguite e tempo speso nel database. Le query eseguite
+    fuori da una richiesta (task in background) finiscono sotto '<background>'.
+    """
+
+    def __init__(self, buckets: Iterable[float] = REQUEST_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._richieste: Dict[Tuple[str, str, str], int] = {}
+        self._durate: Dict[str, List] = {}
+        self._sql: Dict[str, List] = {}
+        self._query_lente = 0
+
+    def record_request(self, route: str, metodo: str, stato: int, durata_s: float,
+                       query: int, sql_s: float) -> None:
+        with self._lock:
+            chiave = (route, metodo, str(stato))
+            self._richieste[chiave] = self._richieste.get(chiave, 0) + 1
+
+            istogramma = self._durate.setdefault(route, [[0] * (len(self.buckets) + 1), 0.0, 0])
+            indice = len(self.buckets)
+            for i, limite in enumerate(self.buckets):
+                if durata_s <= limite:
+                    indice = i
+                    break
+            istogramma[0][indice] += 1
+            istogramma[1] += durata_s
+            istogramma[2] += 1
+
+            sql = self._sql.setdefault(route, [0, 0.0])
+            sql[0] += query
+            sql[1] += sql_s
+
+    def record_background_query(self, sql_s: float) -> None:
+        with self._lock:
+            sql = self._sql.setdefault(_ROUTE_FUORI_RICHIESTA, [0, 0.0])
+            sql[0] += 1
+            sql[1] += sql_s
+
+    def record_slow_query(self) -> None:
+        with self._lock:
+            self._query_lente += 1
+
+    def render_prometheus(self) -> str:
+        """Aggregati nel formato testuale di Prometheus"""
+        righe = []
+        with self._lock:
+            righe.append('# HELP ristorante_richieste_totali Richieste HTTP servite')
+            righe.append('# TYPE ristorante_richieste_totali counter')
+            for (route, metodo, stato), conteggio in sorted(self._richieste.items()):
+                righe.append(f'ristorante_richieste_totali{{route="{_escape(route)}",metodo="{metodo}",'
+                             f'stato="{stato}"}} {conteggio}')
+
+            righe.append('# HELP ristorante_durata_richiesta_secondi Durata delle richieste HTTP')
+            righe.append('# TYPE ristorante_durata_richiesta_secondi histogram')
+            for route, (conteggi, somma, totale) in sorted(self._durate.items()):
+                etichetta = f'route="{_escape(route)}"'
+                cumulativo = 0
+                for limite, conteggio in zip(list(self.buckets) + ['+Inf'], conteggi):
+                    cumulativo += conteggio
+                    righe.append(f'ristorante_durata_richiesta_secondi_bucket{{{etichetta},le="{limite}"}} {cumulativo}')
+                righe.append(f'ristorante_durata_richiesta_secondi_sum{{{etichetta}}} {somma:.6f}')
+                righe.append(f'ristorante_durata_richiesta_secondi_count{{{etichetta}}} {totale}')
+
+            righe.append('# HELP ristorante_query_sql_totali Statement SQL eseguiti')
+            righe.append('# TYPE ristorante_query_sql_totali counter')
+            for route, (query, _) in sorted(self._sql.items()):
+                righe.append(f'ristorante_query_sql_totali{{route="{_escape(route)}"}} {query}')
+
+            righe.append('# HELP ristorante_durata_sql_secondi_totale Tempo speso nel database')
+            righe.append('# TYPE ristorante_durata_sql_secondi_totale counter')
+            for route, (_, secondi) in sorted(self._sql.items()):
+                righe.append(f'ristorante_durata_sql_secondi_totale{{route="{_escape(route)}"}} {secondi:.6f}')
+
+            righe.append(f'# HELP ristorante_query_lente_totali Query oltre {SLOW_QUERY_MS} ms')
+            righe.append('# TYPE ristorante_query_lente_totali counter')
+            righe.append(f'ristorante_query_lente_totali {self._query_lente}')
+        return '\n'.join(righe) + '\n'
+
+
+def _escape(valore: str) -> str:
+    return str(valore).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def prometheus_metric(nome: str, descrizione: str, valori: Union[float, Dict[str, float]],
+                      etichetta: str = None, tipo: str = 'gauge') -> str:
+    """Metrica Prometheus semplice: un valore, oppure un valore per etichetta"""
+    righe = [f'# HELP {nome} {descrizione}', f'# TYPE {nome} {tipo}']
+    if isinstance(valori, dict):
+        for chiave, valore in valori.items():
+            righe.append(f'{nome}{{{etichetta}="{_escape(chiave)}"}} {valore}')
+    else:
+        righe.append(f'{nome} {valori}')
+    return '\n'.join(righe) + '\n'
+
+
+# Aggregati globali del worker
+request_metrics = RequestMetrics()
+
+
+def _piano_esecuzione(conn: sqlite3.Connection, sql: str, params) -> str:
+    try:
+        # Cursore base: l'EXPLAIN non deve essere a sua volta misurato
+        cursor = sqlite3.Cursor(conn)
+        righe = cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params).fetchall()
+        return ' | '.join(str(riga[-1]) for riga in righe)
+    except sqlite3.Error as e:
+        return f'non disponibile ({e})'
+
+
+def _registra_query(conn: sqlite3.Connection, sql: str, params, secondi: float, piano: bool = True) -> None:
+    if has_app_context():
+        g._sql_query = g.get('_sql_query', 0) + 1
+        g._sql_secondi = g.get('_sql_secondi', 0.0) + secondi
+    else:
+        request_metrics.record_background_query(secondi)
+
+    millisecondi = secondi * 1000
+    if millisecondi >= SLOW_QUERY_MS:
+        request_metrics.record_slow_query()
+        testo = ' '.join(sql.split())
+        dettaglio = ''
+        if piano and testo.split(' ', 1)[0].upper() in ('SELECT', 'WITH', 'UPDATE', 'DELETE', 'INSERT'):
+            dettaglio = f' | piano: {_piano_esecuzione(conn, sql, params)}'
+        route = request.path if has_request_context() else _ROUTE_FUORI_RICHIESTA
+        logger.warning(f"Query lenta ({millisecondi:.1f} ms) su {route}: {testo[:500]}{dettaglio}")
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """Cursore che misura ogni statement eseguito"""
+
+    def execute(self, sql, parameters=()):
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            _registra_query(self.connection, sql, parameters, time.perf_counter() - start)
+
+    def executemany(self, sql, seq_of_parameters):
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            _registra_query(self.connection, sql, (), time.perf_counter() - start, piano=False)
+
+    def executescript(self, sql_script):
+        start = time.perf_counter()
+        try:
+            return super().executescript(sql_script)
+        finally:
+            _registra_query(self.connection, sql_script, (), time.perf_counter() - start, piano=False)
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    """
+    Connessione usata dal pool: tutti i cursori (anche quelli creati da
+    conn.execute) sono InstrumentedCursor.
+    """
+
+    def cursor(self, factory=None):
+        return super().cursor(factory or InstrumentedCursor)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def executescript(self, sql_script):
+        return self.cursor().executescript(sql_script)
+
+
+def connection_factory() -> type:
+    """Classe di connessione da passare a sqlite3.connect"""
+    return InstrumentedConnection if DB_INSTRUMENTATION else sqlite3.Connection
+
+
+def _inizio_richiesta() -> None:
+    g._inizio_richiesta = time.perf_counter()
+    g._sql_query = 0
+    g._sql_secondi = 0.0
+
+
+def _fine_richiesta(response):
+    inizio = g.get('_inizio_richiesta')
+    if inizio is None:
+        return response
+    durata = time.perf_counter() - inizio
+    query = g.get('_sql_query', 0)
+    sql_secondi = g.get('_sql_secondi', 0.0)
+    route = request.url_rule.rule if request.url_rule else '<non_trovata>'
+
+    request_metrics.record_request(route, request.method, response.status_code, durata, query, sql_secondi)
+    # Visibile negli strumenti di sviluppo del browser (scheda Timing)
+    response.headers['Server-Timing'] = (f'app;dur={durata * 1000:.1f}, '
+                                         f'db;dur={sql_secondi * 1000:.1f};desc="{query} query"')
+    return response
+
+
+def _richiesta_locale() -> bool:
+    """Connessione diretta da loopback: dietro nginx il client reale è in X-Forwarded-For"""
+    if 'X-Forwarded-For' in request.headers:
+        return False
+    try:
+        return ipaddress.ip_address(request.remote_addr or '').is_loopback
+    except ValueError:
+        return False
+
+
+def metrics_authorized() -> bool:
+    if METRICS_TOKEN:
+        # Confronto in byte: compare_digest rifiuta le str non ASCII (Werkzeug decodifica in latin-1)
+        ricevuto = request.headers.get('Authorization', '').encode('latin-1', errors='replace')
+        atteso = f'Bearer {METRICS_TOKEN}'.encode('utf-8')
+        return hmac.compare_digest(ricevuto, atteso)
+    return _richiesta_locale()
+
+
+def init_app(app) -> None:
+    """Registra la misurazione di tempo e query SQL per ogni richiesta"""
+    app.before_request(_inizio_richiesta)
+    app.after_request(_fine_richiesta)
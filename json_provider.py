@@ -0,0 +1,72 @@
+"""
+Serializzazione JSON delle risposte.
+
+FastJSONProvider sostituisce il provider di Flask (jsonify, app.json): usa
+orjson se è installato, altrimenti il json della libreria standard con le
+stesse opzioni di Flask. Le differenze con orjson sono solo di forma: i
+caratteri non ASCII sono scritti in UTF-8 invece che come \\uXXXX.
+
+serializza() restituisce il corpo della risposta già in byte: le API del
+menu lo conservano nella snapshot e lo restituiscono senza riserializzare.
+"""
+import os
+import logging
+from typing import Any
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+# auto: orjson se installato; stdlib: sempre la libreria standard
+JSON_ENCODER = os.getenv('JSON_ENCODER', 'auto').strip().lower()
+
+if orjson is not None:
+    # Chiavi ordinate e non stringa come il provider di Flask; le date passano
+    # da default per restare nel formato HTTP di Flask (non ISO 8601)
+    _OPZIONI_ORJSON = orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    def __init__(self, app, encoder: str = JSON_ENCODER):
+        super().__init__(app)
+        self.encoder = 'orjson' if orjson is not None and encoder != 'stdlib' else 'stdlib'
+
+    def _indentato(self) -> bool:
+        return (self.compact is None and self._app.debug) or self.compact is False
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        # Con argomenti specifici di json.dumps (es. la sessione) resta la libreria standard
+        if self.encoder == 'orjson' and not kwargs:
+            return orjson.dumps(obj, default=self.default, option=_OPZIONI_ORJSON).decode('utf-8')
+        return super().dumps(obj, **kwargs)
+
+    def loads(self, s, **kwargs: Any) -> Any:
+        if self.encoder == 'orjson' and not kwargs:
+            return orjson.loads(s)
+        return super().loads(s, **kwargs)
+
+    def serializza(self, obj: Any) -> bytes:
+        """Corpo della risposta JSON in byte, identico a quello di jsonify(obj)"""
+        if self.encoder == 'orjson':
+            opzioni = _OPZIONI_ORJSON | orjson.OPT_APPEND_NEWLINE
+            if self._indentato():
+                opzioni |= orjson.OPT_INDENT_2
+            return orjson.dumps(obj, default=self.default, option=opzioni)
+        dump_args = {'indent': 2} if self._indentato() else {'separators': (',', ':')}
+        return f"{super().dumps(obj, **dump_args)}\n".encode('utf-8')
+
+    def response(self, *args: Any, **kwargs: Any):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(self.serializza(obj), mimetype=self.mimetype)
+
+
+def init_app(app) -> None:
+    app.json = FastJSONProvider(app)
+    if JSON_ENCODER == 'orjson' and orjson is None:
+        logger.warning("JSON_ENCODER=orjson ma orjson non è installato: uso la libreria standard")
+    logger.info("Encoder JSON delle risposte: %s", app.json.encoder)
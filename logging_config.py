@@ -0,0 +1,198 @@
+import os
+import sys
+import json
+import time
+import uuid
+import queue
+import atexit
+import random
+import logging
+import threading
+import logging.handlers
+from typing import Dict, Optional
+
+from flask import g, has_request_context, request
+
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+# Livelli per modulo, es. "app=DEBUG,translation_service=WARNING,werkzeug=WARNING"
+LOG_LEVELS = os.getenv('LOG_LEVELS', '')
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'json').lower()
+# Frazione dei messaggi campionati (debug del percorso caldo) effettivamente scritti
+LOG_SAMPLE_RATE = float(os.getenv('LOG_SAMPLE_RATE', '0.01'))
+LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', '10000'))
+
+# Da passare come extra ai messaggi ad alta frequenza: logger.debug(..., extra=CAMPIONATO)
+CAMPIONATO = {'campionato': True}
+
+_CAMPI_STANDARD = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+class JsonFormatter(logging.Formatter):
+    """Una riga JSON per messaggio; i campi passati con extra vengono inclusi"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        voce = {
+            'ts': time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(record.created)) + f'.{int(record.msecs):03d}Z',
+            'livello': record.levelname,
+            'logger': record.name,
+            'messaggio': record.getMessage(),
+            'request_id': getattr(record, 'request_id', None)
+        }
+        for chiave, valore in record.__dict__.items():
+            if chiave not in _CAMPI_STANDARD and chiave not in voce and chiave != 'campionato':
+                voce[chiave] = valore
+        if record.exc_info:
+            voce['eccezione'] = self.formatException(record.exc_info)
+        return json.dumps(voce, ensure_ascii=False, default=str)
+
+
+class RequestIdFilter(logging.Filter):
+    """Aggiunge l'id della richiesta HTTP corrente (se c'è) ad ogni messaggio"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not hasattr(record, 'request_id'):
+            record.request_id = g.get('request_id') if has_request_context() else None
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Lascia passare solo una frazione dei messaggi marcati con CAMPIONATO"""
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if getattr(record, 'campionato', False):
+            return random.random() < self.rate
+        return True
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """
+    Il thread che logga fa solo un put_nowait sulla coda: la scrittura su
+    stderr avviene nel thread del QueueListener. Se la coda è piena il
+    messaggio viene scartato invece di bloccare la richiesta.
+    """
+
+    def __init__(self, log_queue: queue.Queue, coda_piena=queue.Full):
+        super().__init__(log_queue)
+        self.coda_piena = coda_piena
+        self.scartati = 0
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except self.coda_piena:
+            self.scartati += 1
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # request_id va letto qui, nel thread della richiesta, non nel listener
+        RequestIdFilter().filter(record)
+        return super().prepare(record)
+
+
+class OSThreadQueueListener(logging.handlers.QueueListener):
+    """
+    QueueListener il cui thread è creato dal modulo threading indicato: sotto
+    eventlet quello originale, così le scritture su stderr avvengono in un vero
+    thread del sistema operativo e non in un greenlet che bloccherebbe l'hub.
+    """
+
+    def __init__(self, log_queue, *handlers, modulo_threading=threading, respect_handler_level: bool = False):
+        super().__init__(log_queue, *handlers, respect_handler_level=respect_handler_level)
+        self.modulo_threading = modulo_threading
+
+    def start(self) -> None:
+        self._thread = self.modulo_threading.Thread(target=self._monitor, name='log-listener', daemon=True)
+        self._thread.start()
+
+
+def moduli_listener():
+    """
+    (threading, queue) per il listener dei log. Con il monkey patching di
+    eventlet sono i moduli originali, come fa eventlet.tpool: la coda deve
+    usare lock reali perché è condivisa tra i greenlet e il thread del listener.
+    """
+    try:
+        from eventlet import patcher
+    except ImportError:
+        return threading, queue
+    if patcher.is_monkey_patched('thread'):
+        return patcher.original('threading'), patcher.original('queue')
+    return threading, queue
+
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_queue_handler: Optional[NonBlockingQueueHandler] = None
+
+
+def _livelli_per_modulo(specifica: str) -> Dict[str, str]:
+    livelli = {}
+    for voce in specifica.split(','):
+        if '=' in voce:
+            modulo, livello = voce.split('=', 1)
+            livelli[modulo.strip()] = livello.strip().upper()
+    return livelli
+
+
+def setup_logging() -> None:
+    """Configura il logging del processo (idempotente)"""
+    global _listener, _queue_handler
+    if _listener is not None:
+        return
+
+    stream = logging.StreamHandler(sys.stderr)
+    if LOG_FORMAT == 'json':
+        stream.setFormatter(JsonFormatter())
+    else:
+        stream.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s'))
+
+    modulo_threading, modulo_queue = moduli_listener()
+    _queue_handler = NonBlockingQueueHandler(modulo_queue.Queue(maxsize=LOG_QUEUE_SIZE), modulo_queue.Full)
+    _queue_handler.addFilter(SamplingFilter(LOG_SAMPLE_RATE))
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(_queue_handler)
+    root.setLevel(LOG_LEVEL)
+
+    for modulo, livello in _livelli_per_modulo(LOG_LEVELS).items():
+        logging.getLogger(modulo).setLevel(livello)
+
+    _listener = OSThreadQueueListener(_queue_handler.queue, stream, modulo_threading=modulo_threading,
+                                      respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+
+
+def stop_logging() -> None:
+    """Svuota la coda e ferma il listener (alla chiusura del processo)"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def logging_stats() -> Dict[str, int]:
+    if _queue_handler is None:
+        return {'in_coda': 0, 'scartati': 0}
+    return {'in_coda': _queue_handler.queue.qsize(), 'scartati': _queue_handler.scartati}
+
+
+def _assegna_request_id() -> None:
+    # Riusa l'id di un proxy a monte se presente, così i log sono correlabili
+    g.request_id = request.headers.get('X-Request-ID') or uuid.uuid4().hex[:16]
+
+
+def _esponi_request_id(response):
+    if 'request_id' in g:
+        response.headers['X-Request-ID'] = g.request_id
+    return response
+
+
+def init_app(app) -> None:
+    """Assegna un id ad ogni richiesta, incluso nei log e nell'header X-Request-ID"""
+    app.before_request(_assegna_request_id)
+    app.after_request(_esponi_request_id)
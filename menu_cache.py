@@ -0,0 +1,202 @@
+import os
+import time
+import logging
+import threading
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Lingue servite dal menu pubblico: la prima è quella di default
+LINGUE_MENU = [l.strip() for l in os.getenv('MENU_LINGUE', 'it,en').split(',') if l.strip()]
+MENU_CACHE_MAX_VOCI = int(os.getenv('MENU_CACHE_MAX_VOCI', '1000'))
+# Ogni quanti ms un worker rilegge la versione persistita del menu (modifiche fatte da altri processi)
+MENU_VERSIONE_CONTROLLO_MS = int(os.getenv('MENU_VERSIONE_CONTROLLO_MS', '100'))
+
+
+def normalizza_lingua(lingua: Optional[str]) -> str:
+    """Riconduce il parametro lang ad una delle lingue servite dal menu"""
+    if lingua in LINGUE_MENU:
+        return lingua
+    return LINGUE_MENU[0]
+
+
+class MenuSnapshotCache:
+    """
+    Snapshot in memoria del menu pubblico, una per lingua.
+    Ogni snapshot contiene i payload già costruiti delle API pubbliche
+    (categorie, prodotti per categoria, ...) e viene scartato in blocco
+    quando l'admin modifica il menu. Alla prima richiesta successiva il
+    prebuilder ricostruisce l'intera snapshot della lingua in un colpo solo.
+
+    La versione del menu (timestamp in ms, sempre crescente, usata per ETag
+    e Last-Modified) viene dalla sorgente impostata con set_version_source,
+    cioè dal database: è la stessa per tutti i worker. Quando cambia, per
+    una modifica fatta da questo o da un altro processo, tutte le snapshot
+    vengono scartate. La sorgente è interrogata al più ogni
+    `controllo_ms` millisecondi, e sempre dopo un'invalidazione locale.
+    """
+
+    def __init__(self, max_voci: int = 1000, controllo_ms: int = 100):
+        self.max_voci = max_voci
+        self.controllo_s = controllo_ms / 1000
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        self._snapshots: Dict[str, Dict[Hashable, Any]] = {}
+        self._generazione = 0
+        self._versione: Optional[int] = None
+        self._ultimo_controllo = 0.0
+        self._version_source: Optional[Callable[[], int]] = None
+        self._prebuilder: Optional[Callable[[str], Dict[Hashable, Any]]] = None
+        self._stats = {
+            'hit': 0,
+            'miss': 0,
+            'ricostruzioni': 0,
+            'invalidazioni': 0,
+            'invalidazioni_esterne': 0,
+            'tempo_costruzione_totale_ms': 0.0,
+            'tempo_costruzione_max_ms': 0.0,
+            'ultima_costruzione_ms': 0.0
+        }
+
+    def set_prebuilder(self, prebuilder: Callable[[str], Dict[Hashable, Any]]) -> None:
+        """Funzione che precalcola i payload principali di una lingua"""
+        self._prebuilder = prebuilder
+
+    def set_version_source(self, source: Callable[[], int]) -> None:
+        """Funzione che legge la versione persistita del menu"""
+        self._version_source = source
+        self._ultimo_controllo = 0.0
+
+    def _sincronizza(self, forza: bool = False) -> int:
+        """Allinea le snapshot alla versione persistita e la restituisce"""
+        if self._version_source is None:
+            if self._versione is None:
+                self._versione = int(time.time() * 1000)
+            return self._versione
+
+        adesso = time.monotonic()
+        if not forza and self._versione is not None and adesso - self._ultimo_controllo < self.controllo_s:
+            return self._versione
+
+        versione = self._version_source()
+        with self._lock:
+            self._ultimo_controllo = adesso
+            if versione != self._versione:
+                if self._versione is not None and not forza:
+                    self._stats['invalidazioni_esterne'] += 1
+                self._versione = versione
+                self._snapshots = {}
+                self._generazione += 1
+        return versione
+
+    def get(self, lingua: str, chiave: Hashable, builder: Callable[[], Any]) -> Any:
+        """
+        Restituisce il payload in cache per (lingua, chiave), costruendolo con
+        builder() se manca. Le costruzioni sono serializzate per evitare che
+        molti client ricostruiscano contemporaneamente lo stesso menu.
+        """
+        return self._get(lingua, chiave, builder)[0]
+
+    def get_derivato(self, lingua: str, chiave: Hashable, derivato: Hashable,
+                     builder: Callable[[], Any], trasforma: Callable[[Any], Any]) -> Any:
+        """
+        Valore ricavato dal payload di (lingua, chiave), ad esempio i byte
+        compressi, conservato nella stessa snapshot: viene calcolato una volta
+        per versione del menu e scartato insieme al payload.
+        """
+        chiave_derivata = (chiave, derivato)
+        self._sincronizza()
+        with self._lock:
+            snapshot = self._snapshots.get(lingua)
+            if snapshot is not None and chiave_derivata in snapshot:
+                self._stats['hit'] += 1
+                return snapshot[chiave_derivata]
+
+        payload, generazione = self._get(lingua, chiave, builder)
+        valore = trasforma(payload)
+        with self._lock:
+            # Solo se la snapshot da cui viene il payload è ancora quella corrente
+            snapshot = self._snapshots.get(lingua)
+            if generazione == self._generazione and snapshot is not None and len(snapshot) < self.max_voci:
+                snapshot[chiave_derivata] = valore
+        return valore
+
+    def _get(self, lingua: str, chiave: Hashable, builder: Callable[[], Any]) -> Tuple[Any, int]:
+        """(payload, generazione della snapshot da cui proviene)"""
+        self._sincronizza()
+        with self._lock:
+            generazione = self._generazione
+            snapshot = self._snapshots.get(lingua)
+            if snapshot is not None and chiave in snapshot:
+                self._stats['hit'] += 1
+                return snapshot[chiave], generazione
+
+        with self._build_lock:
+            with self._lock:
+                generazione = self._generazione
+                snapshot = self._snapshots.get(lingua)
+                if snapshot is not None and chiave in snapshot:
+                    self._stats['hit'] += 1
+                    return snapshot[chiave], generazione
+                self._stats['miss'] += 1
+                if snapshot is None:
+                    self._stats['ricostruzioni'] += 1
+
+            start = time.perf_counter()
+
+            if snapshot is None:
+                snapshot = dict(self._prebuilder(lingua)) if self._prebuilder else {}
+
+            if chiave in snapshot:
+                payload = snapshot[chiave]
+            else:
+                payload = builder()
+                if len(snapshot) < self.max_voci:
+                    snapshot[chiave] = payload
+
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            with self._lock:
+                # Se nel frattempo il menu è stato invalidato la snapshot è già vecchia
+                if generazione == self._generazione:
+                    self._snapshots[lingua] = snapshot
+                self._stats['tempo_costruzione_totale_ms'] += elapsed_ms
+                self._stats['ultima_costruzione_ms'] = elapsed_ms
+                if elapsed_ms > self._stats['tempo_costruzione_max_ms']:
+                    self._stats['tempo_costruzione_max_ms'] = elapsed_ms
+
+            return payload, generazione
+
+    def versione(self, lingua: Optional[str] = None) -> int:
+        """Versione corrente del menu (la stessa per tutte le lingue)"""
+        return self._sincronizza()
+
+    def invalidate(self) -> int:
+        """
+        Scarta tutte le snapshot dopo una modifica al menu fatta da questo
+        processo (già committata: i trigger hanno aggiornato la versione
+        persistita) e restituisce la nuova versione.
+        """
+        with self._lock:
+            self._snapshots = {}
+            self._generazione += 1
+            self._stats['invalidazioni'] += 1
+            if self._version_source is None:
+                self._versione = max(int(time.time() * 1000), (self._versione or 0) + 1)
+        nuova_versione = self._sincronizza(forza=True)
+        logger.debug(f"Snapshot menu invalidate (generazione {self._generazione}, versione {nuova_versione})")
+        return nuova_versione
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats['generazione'] = self._generazione
+            stats['lingue_in_cache'] = sorted(self._snapshots.keys())
+            stats['versione'] = self._versione
+            stats['voci_in_cache'] = sum(len(s) for s in self._snapshots.values())
+        richieste = stats['hit'] + stats['miss']
+        stats['hit_ratio'] = stats['hit'] / richieste if richieste else 0.0
+        return stats
+
+
+# Istanza globale della cache
+menu_cache = MenuSnapshotCache(max_voci=MENU_CACHE_MAX_VOCI, controllo_ms=MENU_VERSIONE_CONTROLLO_MS)
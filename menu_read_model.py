@@ -0,0 +1,200 @@
+import logging
+import sqlite3
+from typing import Iterable
+
+logger = logging.getLogger(__name__)
+
+# Lingue materializzate: le tabelle hanno solo le colonne *_en,
+# qualsiasi altra lingua viene servita con i testi italiani
+READ_MODEL_LINGUE = ('it', 'en')
+
+# Maschera degli allergeni di un prodotto: bit (1 << id) per ogni allergene.
+# Gli id oltre 62 non entrano in un intero SQLite con segno: i nuovi allergeni
+# riusano il primo id libero (ID_ALLERGENE_LIBERO) e la migrazione 0006
+# rifiuta gli inserimenti oltre il limite
+MAX_ID_ALLERGENE = 62
+MASCHERA_ALLERGENI = f'''(SELECT COALESCE(SUM(DISTINCT 1 << pa.allergene_id), 0)
+            FROM prodotti_allergeni pa
+            JOIN allergeni a ON a.id = pa.allergene_id
+            WHERE pa.prodotto_id = p.id AND pa.allergene_id BETWEEN 1 AND {MAX_ID_ALLERGENE})'''
+
+# Primo id libero tra 1 e MAX_ID_ALLERGENE (NULL se sono tutti occupati)
+ID_ALLERGENE_LIBERO = f'''(WITH RECURSIVE n(id) AS (
+                SELECT 1 UNION ALL SELECT id + 1 FROM n WHERE id < {MAX_ID_ALLERGENE})
+            SELECT MIN(id) FROM n WHERE id NOT IN (SELECT id FROM allergeni))'''
+
+_COLONNE_MODELLO = '''prodotto_id, lingua, categoria_id, categoria_parent_id, nome, descrizione,
+    prezzo, disponibile, attivo, foto, updated_at, categoria_nome, categoria_genitore_nome,
+    allergeni_json, ingredienti_json, foto_varianti, allergeni_maschera'''
+
+# Una riga per prodotto e lingua, con allergeni e ingredienti già serializzati in JSON
+_SELECT_MODELLO = '''
+    SELECT p.id, l.lingua, p.categoria_id, c.parent_id,
+           COALESCE(CASE WHEN l.lingua = 'en' THEN p.nome_en END, p.nome),
+           COALESCE(CASE WHEN l.lingua = 'en' THEN p.descrizione_en END, p.descrizione),
+           p.prezzo, p.disponibile, p.attivo, p.foto, p.updated_at,
+           COALESCE(CASE WHEN l.lingua = 'en' THEN c.nome_en END, c.nome),
+           parent.nome,
+           (SELECT json_group_array(json_object(
+                       'nome', COALESCE(CASE WHEN l.lingua = 'en' THEN a.nome_en END, a.nome),
+                       'icona', COALESCE(a.icona, ''),
+                       'colore', '#6c757d'))
+            FROM prodotti_allergeni pa
+            JOIN allergeni a ON a.id = pa.allergene_id
+            WHERE pa.prodotto_id = p.id),
+           (SELECT json_group_array(COALESCE(CASE WHEN l.lingua = 'en' THEN i.nome_en END, i.nome))
+            FROM prodotti_ingredienti pi
+            JOIN ingredienti i ON i.id = pi.ingrediente_id
+            WHERE pi.prodotto_id = p.id),
+           p.foto_varianti,
+           {maschera}
+    FROM prodotti p
+    CROSS JOIN ({lingue}) l
+    LEFT JOIN categorie c ON p.categoria_id = c.id
+    LEFT JOIN categorie parent ON c.parent_id = parent.id
+    WHERE {condizione}
+'''
+
+
+def lingua_read_model(lingua: str) -> str:
+    """Lingua materializzata da usare per una lingua del menu"""
+    return lingua if lingua in READ_MODEL_LINGUE else READ_MODEL_LINGUE[0]
+
+
+def _aggiorna(condizione: str) -> str:
+    """Statement che rimaterializza i prodotti selezionati da `condizione` (alias p)"""
+    lingue = ' UNION ALL '.join(f"SELECT '{l}' AS lingua" for l in READ_MODEL_LINGUE)
+    select = _SELECT_MODELLO.format(lingue=lingue, condizione=condizione, maschera=MASCHERA_ALLERGENI)
+    return f'INSERT OR REPLACE INTO menu_read_model ({_COLONNE_MODELLO}) {select};'
+
+
+_PRODOTTI_CON_ALLERGENE = 'p.id IN (SELECT prodotto_id FROM prodotti_allergeni WHERE allergene_id = {}.id)'
+_PRODOTTI_CON_INGREDIENTE = 'p.id IN (SELECT prodotto_id FROM prodotti_ingredienti WHERE ingrediente_id = {}.id)'
+_PRODOTTI_DELLA_CATEGORIA = ('(p.categoria_id = {0}.id OR p.categoria_id IN '
+                             '(SELECT id FROM categorie WHERE parent_id = {0}.id))')
+
+# (nome, evento, corpo) dei trigger che tengono allineato il modello
+TRIGGERS = [
+    ('mrm_prodotti_ins', 'AFTER INSERT ON prodotti', _aggiorna('p.id = NEW.id')),
+    ('mrm_prodotti_upd', 'AFTER UPDATE ON prodotti',
+     'DELETE FROM menu_read_model WHERE prodotto_id = OLD.id;' + _aggiorna('p.id = NEW.id')),
+    ('mrm_prodotti_del', 'AFTER DELETE ON prodotti',
+     'DELETE FROM menu_read_model WHERE prodotto_id = OLD.id;'),
+
+    ('mrm_prodotti_allergeni_ins', 'AFTER INSERT ON prodotti_allergeni', _aggiorna('p.id = NEW.prodotto_id')),
+    ('mrm_prodotti_allergeni_upd', 'AFTER UPDATE ON prodotti_allergeni',
+     _aggiorna('p.id IN (OLD.prodotto_id, NEW.prodotto_id)')),
+    ('mrm_prodotti_allergeni_del', 'AFTER DELETE ON prodotti_allergeni', _aggiorna('p.id = OLD.prodotto_id')),
+
+    ('mrm_prodotti_ingredienti_ins', 'AFTER INSERT ON prodotti_ingredienti', _aggiorna('p.id = NEW.prodotto_id')),
+    ('mrm_prodotti_ingredienti_upd', 'AFTER UPDATE ON prodotti_ingredienti',
+     _aggiorna('p.id IN (OLD.prodotto_id, NEW.prodotto_id)')),
+    ('mrm_prodotti_ingredienti_del', 'AFTER DELETE ON prodotti_ingredienti', _aggiorna('p.id = OLD.prodotto_id')),
+
+    ('mrm_allergeni_upd', 'AFTER UPDATE OF nome, nome_en, icona ON allergeni',
+     _aggiorna(_PRODOTTI_CON_ALLERGENE.format('NEW'))),
+    ('mrm_allergeni_del', 'AFTER DELETE ON allergeni', _aggiorna(_PRODOTTI_CON_ALLERGENE.format('OLD'))),
+
+    ('mrm_ingredienti_upd', 'AFTER UPDATE OF nome, nome_en ON ingredienti',
+     _aggiorna(_PRODOTTI_CON_INGREDIENTE.format('NEW'))),
+    ('mrm_ingredienti_del', 'AFTER DELETE ON ingredienti', _aggiorna(_PRODOTTI_CON_INGREDIENTE.format('OLD'))),
+
+    # Il nome della categoria compare nei suoi prodotti, quello del genitore nei prodotti delle figlie
+    ('mrm_categorie_upd', 'AFTER UPDATE OF nome, nome_en, parent_id ON categorie',
+     _aggiorna(_PRODOTTI_DELLA_CATEGORIA.format('NEW'))),
+    ('mrm_categorie_del', 'AFTER DELETE ON categorie', _aggiorna(_PRODOTTI_DELLA_CATEGORIA.format('OLD'))),
+]
+
+
+def init_read_model(conn: sqlite3.Connection) -> None:
+    """
+    Crea la tabella menu_read_model e i trigger che la mantengono, poi la
+    ricostruisce da zero. Va chiamata dopo le migrazioni, che creano le
+    colonne *_en lette dai trigger. I trigger vengono ricreati ad ogni avvio
+    così eventuali modifiche alla loro definizione vengono applicate.
+    """
+    cursor = conn.cursor()
+    # Il modello è derivato: se mancano colonne aggiunte in seguito si ricrea
+    esistenti = {row[1] for row in cursor.execute('PRAGMA table_info(menu_read_model)')}
+    if esistenti and not {c.strip() for c in _COLONNE_MODELLO.split(',')} <= esistenti:
+        logger.info("Schema del modello di lettura cambiato: ricreo la tabella")
+        cursor.execute('DROP TABLE menu_read_model')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS menu_read_model (
+            prodotto_id INTEGER NOT NULL,
+            lingua TEXT NOT NULL,
+            categoria_id INTEGER,
+            categoria_parent_id INTEGER,
+            nome TEXT,
+            descrizione TEXT,
+            prezzo REAL,
+            disponibile BOOLEAN,
+            attivo BOOLEAN,
+            foto TEXT,
+            updated_at TIMESTAMP,
+            categoria_nome TEXT,
+            categoria_genitore_nome TEXT,
+            allergeni_json TEXT NOT NULL DEFAULT '[]',
+            ingredienti_json TEXT NOT NULL DEFAULT '[]',
+            foto_varianti TEXT,
+            allergeni_maschera INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (lingua, prodotto_id)
+        )
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_menu_read_model_categoria
+        ON menu_read_model (lingua, categoria_id)
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_menu_read_model_parent
+        ON menu_read_model (lingua, categoria_parent_id)
+    ''')
+
+    for nome, evento, corpo in TRIGGERS:
+        cursor.execute(f'DROP TRIGGER IF EXISTS {nome}')
+        cursor.execute(f'CREATE TRIGGER {nome} {evento} BEGIN {corpo} END')
+
+    fuori_maschera = cursor.execute('SELECT COUNT(*) FROM allergeni WHERE id > ?',
+                                    (MAX_ID_ALLERGENE,)).fetchone()[0]
+    if fuori_maschera:
+        logger.warning(f"{fuori_maschera} allergeni con id oltre {MAX_ID_ALLERGENE}: "
+                       f"non sono considerati da exclude_allergeni, vanno ricreati")
+
+    rebuild_read_model(conn)
+
+
+def rebuild_read_model(conn: sqlite3.Connection) -> int:
+    """Rimaterializza l'intero menu (es. all'avvio o dopo import massivi)"""
+    cursor = conn.cursor()
+    cursor.execute('DELETE FROM menu_read_model')
+    cursor.execute(_aggiorna('1 = 1'))
+    conn.commit()
+    righe = cursor.execute('SELECT COUNT(*) FROM menu_read_model').fetchone()[0]
+    logger.info(f"Modello di lettura del menu ricostruito: {righe} righe")
+    return righe
+
+
+def versione_menu(conn: sqlite3.Connection) -> int:
+    """
+    Versione persistita del menu (tabella menu_versione, aggiornata dai
+    trigger della migrazione 0003): uguale per tutti i processi.
+    """
+    row = conn.execute('SELECT versione FROM menu_versione WHERE id = 1').fetchone()
+    return row[0] if row else 0
+
+
+def maschera_allergeni(ids: Iterable) -> int:
+    """
+    Maschera degli id di allergeni indicati (es. ['1', '7'] -> 0b10000010).
+    ValueError se un id non è un intero tra 1 e MAX_ID_ALLERGENE.
+    """
+    maschera = 0
+    for valore in ids:
+        try:
+            allergene_id = int(valore)
+        except (TypeError, ValueError):
+            raise ValueError(f"Id allergene non valido: {valore!r}")
+        if not 1 <= allergene_id <= MAX_ID_ALLERGENE:
+            raise ValueError(f"Id allergene fuori intervallo (1-{MAX_ID_ALLERGENE}): {allergene_id}")
+        maschera |= 1 << allergene_id
+    return maschera
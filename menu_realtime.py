@@ -0,0 +1,236 @@
+import os
+import time
+import logging
+import threading
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from flask_socketio import join_room, leave_room, rooms
+
+from menu_cache import normalizza_lingua
+
+logger = logging.getLogger(__name__)
+
+# Long-poll di /api/menu/last-update: attesa massima (sotto i timeout dei proxy)
+# e intervallo di rilettura della versione persistita mentre ci sono client in attesa
+MENU_ATTESA_MAX_S = float(os.getenv('MENU_ATTESA_MAX_S', '25'))
+MENU_ATTESA_CONTROLLO_MS = int(os.getenv('MENU_ATTESA_CONTROLLO_MS', '250'))
+
+# Stanza dei client autenticati (pagine di amministrazione)
+STANZA_ADMIN = 'admin'
+_PREFISSO_MENU = 'menu:'
+
+
+def stanza_lingua(lingua: str) -> str:
+    return f'{_PREFISSO_MENU}{lingua}'
+
+
+def stanza_categoria(lingua: str, categoria_id: int) -> str:
+    return f'{_PREFISSO_MENU}{lingua}:categoria:{categoria_id}'
+
+
+class MenuRealtime:
+    """
+    Notifiche Socket.IO del menu pubblico.
+
+    Gli ospiti entrano nella stanza della propria lingua e in quella della
+    categoria principale che stanno guardando. Dopo una modifica il server
+    invia un solo evento 'menu_delta' per stanza, già tradotto e nello
+    stesso formato delle API pubbliche, con la versione del menu della
+    lingua: il client scarta i delta più vecchi dei dati che ha già e non
+    deve rifare le richieste del menu.
+
+    Gli eventi dell'amministrazione (payload grezzi) vanno solo alla stanza
+    'admin'.
+
+    I client senza Socket.IO usano il long-poll (attendi_versione): un solo
+    task per worker rilegge la versione persistita e sveglia tutte le
+    richieste in attesa, con l'evento e lo sleep dell'async mode di
+    Socket.IO (cooperativi sotto eventlet).
+    """
+
+    def __init__(self, controllo_ms: int = MENU_ATTESA_CONTROLLO_MS):
+        self.socketio = None
+        self.controllo_s = controllo_ms / 1000.0
+        self._lock = threading.Lock()
+        self._version_source: Optional[Callable[[], int]] = None
+        self._versione: Optional[int] = None
+        self._evento = None
+        self._in_attesa = 0
+        self._controllo_avviato = False
+        self._stats = {
+            'delta_prodotto': 0,
+            'delta_categorie': 0,
+            'delta_menu': 0,
+            'eventi_admin': 0,
+            'attese': 0,
+            'attese_risvegliate': 0
+        }
+
+    def init_app(self, socketio) -> None:
+        self.socketio = socketio
+        self._evento = self._crea_evento()
+
+    def set_version_source(self, version_source: Callable[[], int]) -> None:
+        """Funzione che legge la versione persistita fuori da una richiesta"""
+        self._version_source = version_source
+
+    def _crea_evento(self):
+        if self.socketio is not None and self.socketio.server is not None:
+            return self.socketio.server.eio.create_event()
+        return threading.Event()
+
+    def _sleep(self, secondi: float) -> None:
+        if self.socketio is not None:
+            self.socketio.sleep(secondi)
+        else:
+            time.sleep(secondi)
+
+    def _nuova_versione(self, versione: int) -> None:
+        """Registra la versione e sveglia i client in long-poll se è aumentata"""
+        with self._lock:
+            if self._versione is not None and versione <= self._versione:
+                return
+            self._versione = versione
+            evento, self._evento = self._evento, self._crea_evento()
+        if evento is not None:
+            evento.set()
+
+    def _controlla_versione(self) -> None:
+        while True:
+            if self._in_attesa:
+                try:
+                    self._nuova_versione(self._version_source())
+                except Exception:
+                    logger.exception("Errore nella lettura della versione del menu")
+            self._sleep(self.controllo_s)
+
+    def _avvia_controllo(self) -> None:
+        with self._lock:
+            if self._controllo_avviato or self._version_source is None:
+                return
+            self._controllo_avviato = True
+        if self.socketio is not None:
+            self.socketio.start_background_task(self._controlla_versione)
+        else:
+            threading.Thread(target=self._controlla_versione, daemon=True).start()
+
+    def attendi_versione(self, versione_nota: int, timeout: float = MENU_ATTESA_MAX_S) -> Optional[int]:
+        """
+        Long-poll: attende che la versione del menu superi versione_nota o che
+        scada il timeout, e restituisce l'ultima versione nota al worker. Non
+        usa connessioni del database nel thread della richiesta.
+        """
+        self._avvia_controllo()
+        timeout = max(0.0, min(timeout, MENU_ATTESA_MAX_S))
+        scadenza = time.monotonic() + timeout
+        with self._lock:
+            self._in_attesa += 1
+            self._stats['attese'] += 1
+        try:
+            while True:
+                # L'evento va preso prima di confrontare la versione, altrimenti
+                # un aggiornamento tra il confronto e l'attesa andrebbe perso
+                with self._lock:
+                    evento, versione = self._evento, self._versione
+                if versione is not None and versione > versione_nota:
+                    with self._lock:
+                        self._stats['attese_risvegliate'] += 1
+                    return versione
+                rimanente = scadenza - time.monotonic()
+                if rimanente <= 0:
+                    return versione
+                evento.wait(rimanente)
+        finally:
+            with self._lock:
+                self._in_attesa -= 1
+
+    def _conta(self, chiave: str) -> None:
+        with self._lock:
+            self._stats[chiave] += 1
+
+    def entra(self, lingua: Optional[str], categoria_id: Optional[int] = None) -> str:
+        """
+        Da chiamare in un handler Socket.IO: sposta il client corrente nelle
+        stanze della lingua e (opzionalmente) della categoria indicate.
+        """
+        lingua = normalizza_lingua(lingua)
+        for stanza in rooms():
+            if stanza.startswith(_PREFISSO_MENU):
+                leave_room(stanza)
+        join_room(stanza_lingua(lingua))
+        if categoria_id:
+            join_room(stanza_categoria(lingua, categoria_id))
+        return lingua
+
+    def entra_admin(self) -> None:
+        join_room(STANZA_ADMIN)
+
+    def admin(self, evento: str, dati: Dict[str, Any]) -> None:
+        """Evento per le pagine di amministrazione"""
+        if self.socketio is None:
+            return
+        self.socketio.emit(evento, dati, to=STANZA_ADMIN)
+        self._conta('eventi_admin')
+
+    def prodotto(self, lingua: str, versione: int, prodotto_id: int, radice_id: Optional[int],
+                 prodotto: Optional[Dict[str, Any]], radice_precedente: Optional[int] = None) -> None:
+        """
+        Delta di un prodotto per chi guarda la sua categoria principale (e
+        quella precedente, se è stato spostato). prodotto=None o una
+        radice_id diversa da quella visualizzata significano "rimuovilo".
+        """
+        self._nuova_versione(versione)
+        if self.socketio is None:
+            return
+        stanze = [stanza_categoria(lingua, r) for r in {radice_id, radice_precedente} if r is not None]
+        if not stanze:
+            return
+        self.socketio.emit('menu_delta', {
+            'tipo': 'prodotto',
+            'lingua': lingua,
+            'versione': versione,
+            'id': prodotto_id,
+            'categoria_radice_id': radice_id,
+            'prodotto': prodotto
+        }, to=stanze)
+        self._conta('delta_prodotto')
+
+    def categorie(self, lingua: str, versione: int, categorie: List[Dict[str, Any]]) -> None:
+        """Nuovo elenco delle categorie del menu (cambiano i conteggi o la visibilità)"""
+        self._nuova_versione(versione)
+        if self.socketio is None:
+            return
+        self.socketio.emit('menu_delta', {
+            'tipo': 'categorie',
+            'lingua': lingua,
+            'versione': versione,
+            'categorie': categorie
+        }, to=stanza_lingua(lingua))
+        self._conta('delta_categorie')
+
+    def menu(self, lingue: Iterable[str], versione: int) -> None:
+        """
+        Modifiche che toccano molti prodotti (categorie, allergeni,
+        ingredienti): i client ricaricano la vista corrente, con ETag.
+        """
+        self._nuova_versione(versione)
+        if self.socketio is None:
+            return
+        for lingua in lingue:
+            self.socketio.emit('menu_delta', {
+                'tipo': 'menu',
+                'lingua': lingua,
+                'versione': versione
+            }, to=stanza_lingua(lingua))
+            self._conta('delta_menu')
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats['in_attesa'] = self._in_attesa
+            stats['versione'] = self._versione
+            return stats
+
+
+# Istanza globale delle notifiche del menu
+menu_realtime = MenuRealtime()
@@ -0,0 +1,145 @@
+"""
+Ricerca full-text dei prodotti del menu pubblico (SQLite FTS5).
+
+La tabella virtuale menu_ricerca ha una riga per prodotto (rowid = id) con
+nome e descrizione in italiano e in inglese e i nomi degli ingredienti nelle
+due lingue: un ospite trova "pomodoro" e "tomato" qualunque lingua stia
+usando. Contiene solo i prodotti visibili nel menu (attivi e disponibili),
+così classifica e LIMIT si applicano senza consultare il modello di lettura.
+È mantenuta dai trigger come menu_read_model e ricostruita all'avvio.
+
+I termini cercati diventano prefissi ("marg" trova "Margherita"), gli accenti
+sono ignorati e i risultati sono ordinati con bm25, pesando di più il nome e
+la lingua richiesta. La colonna non indicizzata allergeni_maschera permette
+di escludere gli allergeni prima del LIMIT.
+"""
+import re
+import logging
+import sqlite3
+from typing import Optional
+
+from menu_read_model import MASCHERA_ALLERGENI
+
+logger = logging.getLogger(__name__)
+
+# Termini oltre questo numero vengono ignorati
+MAX_TERMINI = 8
+
+_COLONNE_TESTO = 'nome, descrizione, nome_en, descrizione_en, ingredienti, ingredienti_en'
+_COLONNE_RICERCA = _COLONNE_TESTO + ', allergeni_maschera'
+
+_SELECT_RICERCA = '''
+    SELECT p.id, p.nome, p.descrizione, p.nome_en, p.descrizione_en,
+           (SELECT group_concat(i.nome, ' ')
+            FROM prodotti_ingredienti pi JOIN ingredienti i ON i.id = pi.ingrediente_id
+            WHERE pi.prodotto_id = p.id),
+           (SELECT group_concat(i.nome_en, ' ')
+            FROM prodotti_ingredienti pi JOIN ingredienti i ON i.id = pi.ingrediente_id
+            WHERE pi.prodotto_id = p.id),
+           {maschera}
+    FROM prodotti p
+    WHERE ({condizione}) AND p.attivo = 1 AND p.disponibile = 1
+'''
+
+# Pesi bm25 nell'ordine di _COLONNE_TESTO, per lingua richiesta
+PESI_BM25 = {
+    'it': (10.0, 2.0, 5.0, 1.0, 3.0, 1.5),
+    'en': (5.0, 1.0, 10.0, 2.0, 1.5, 3.0),
+}
+
+# Come il tokenizer unicode61: lettere e cifre ('_' separa)
+_TERMINE = re.compile(r'[^\W_]+')
+
+
+def _aggiorna(condizione: str) -> str:
+    """Statement che reindicizza i prodotti selezionati da `condizione` (alias p)"""
+    select = _SELECT_RICERCA.format(condizione=condizione, maschera=MASCHERA_ALLERGENI)
+    return (f'DELETE FROM menu_ricerca WHERE rowid IN (SELECT p.id FROM prodotti p WHERE {condizione});'
+            f'INSERT INTO menu_ricerca (rowid, {_COLONNE_RICERCA}) {select};')
+
+
+_PRODOTTI_CON_ALLERGENE = 'p.id IN (SELECT prodotto_id FROM prodotti_allergeni WHERE allergene_id = {}.id)'
+_PRODOTTI_CON_INGREDIENTE = 'p.id IN (SELECT prodotto_id FROM prodotti_ingredienti WHERE ingrediente_id = {}.id)'
+
+# (nome, evento, corpo) dei trigger che tengono allineato l'indice
+TRIGGERS = [
+    ('mr_prodotti_ins', 'AFTER INSERT ON prodotti', _aggiorna('p.id = NEW.id')),
+    ('mr_prodotti_upd', 'AFTER UPDATE OF nome, descrizione, nome_en, descrizione_en, attivo, disponibile ON prodotti',
+     'DELETE FROM menu_ricerca WHERE rowid = OLD.id;' + _aggiorna('p.id = NEW.id')),
+    ('mr_prodotti_del', 'AFTER DELETE ON prodotti', 'DELETE FROM menu_ricerca WHERE rowid = OLD.id;'),
+
+    ('mr_prodotti_ingredienti_ins', 'AFTER INSERT ON prodotti_ingredienti', _aggiorna('p.id = NEW.prodotto_id')),
+    ('mr_prodotti_ingredienti_upd', 'AFTER UPDATE ON prodotti_ingredienti',
+     _aggiorna('p.id IN (OLD.prodotto_id, NEW.prodotto_id)')),
+    ('mr_prodotti_ingredienti_del', 'AFTER DELETE ON prodotti_ingredienti', _aggiorna('p.id = OLD.prodotto_id')),
+
+    ('mr_prodotti_allergeni_ins', 'AFTER INSERT ON prodotti_allergeni', _aggiorna('p.id = NEW.prodotto_id')),
+    ('mr_prodotti_allergeni_upd', 'AFTER UPDATE ON prodotti_allergeni',
+     _aggiorna('p.id IN (OLD.prodotto_id, NEW.prodotto_id)')),
+    ('mr_prodotti_allergeni_del', 'AFTER DELETE ON prodotti_allergeni', _aggiorna('p.id = OLD.prodotto_id')),
+    ('mr_allergeni_del', 'AFTER DELETE ON allergeni', _aggiorna(_PRODOTTI_CON_ALLERGENE.format('OLD'))),
+
+    ('mr_ingredienti_upd', 'AFTER UPDATE OF nome, nome_en ON ingredienti',
+     _aggiorna(_PRODOTTI_CON_INGREDIENTE.format('NEW'))),
+    ('mr_ingredienti_del', 'AFTER DELETE ON ingredienti', _aggiorna(_PRODOTTI_CON_INGREDIENTE.format('OLD'))),
+]
+
+
+def init_search_index(conn: sqlite3.Connection) -> None:
+    """
+    Crea l'indice FTS5 e i trigger che lo mantengono, poi lo ricostruisce.
+    Come per il modello di lettura va chiamata dopo le migrazioni.
+    """
+    cursor = conn.cursor()
+    # L'indice è derivato: se cambiano le colonne si ricrea
+    esistenti = {row[1] for row in cursor.execute('PRAGMA table_info(menu_ricerca)')}
+    if esistenti and esistenti != {c.strip() for c in _COLONNE_RICERCA.split(',')}:
+        logger.info("Schema dell'indice di ricerca cambiato: ricreo la tabella")
+        cursor.execute('DROP TABLE menu_ricerca')
+    # Indici dei prefissi da 2 a 4 caratteri: le ricerche mentre si digita non scorrono tutti i termini
+    cursor.execute(f'''
+        CREATE VIRTUAL TABLE IF NOT EXISTS menu_ricerca USING fts5(
+            {_COLONNE_TESTO},
+            allergeni_maschera UNINDEXED,
+            tokenize = 'unicode61 remove_diacritics 2',
+            prefix = '2 3 4'
+        )
+    ''')
+
+    for nome, evento, corpo in TRIGGERS:
+        cursor.execute(f'DROP TRIGGER IF EXISTS {nome}')
+        cursor.execute(f'CREATE TRIGGER {nome} {evento} BEGIN {corpo} END')
+
+    rebuild_search_index(conn)
+
+
+def rebuild_search_index(conn: sqlite3.Connection) -> int:
+    """Reindicizza tutti i prodotti (es. all'avvio o dopo import massivi)"""
+    cursor = conn.cursor()
+    cursor.execute('DELETE FROM menu_ricerca')
+    cursor.execute(f'INSERT INTO menu_ricerca (rowid, {_COLONNE_RICERCA}) '
+                   + _SELECT_RICERCA.format(condizione='1 = 1', maschera=MASCHERA_ALLERGENI))
+    # Un solo b-tree per l'indice: le query non devono unire i segmenti dei vari insert
+    cursor.execute("INSERT INTO menu_ricerca (menu_ricerca) VALUES ('optimize')")
+    conn.commit()
+    righe = cursor.execute('SELECT COUNT(*) FROM menu_ricerca').fetchone()[0]
+    logger.info(f"Indice di ricerca del menu ricostruito: {righe} prodotti")
+    return righe
+
+
+def espressione_ricerca(testo: str) -> Optional[str]:
+    """
+    Testo dell'ospite -> espressione MATCH di FTS5: ogni parola diventa un
+    prefisso tra virgolette (nessun operatore FTS5 passa dall'input) e devono
+    comparire tutte. None se non c'è niente da cercare.
+    """
+    termini = _TERMINE.findall((testo or '').lower())[:MAX_TERMINI]
+    if not termini:
+        return None
+    return ' '.join(f'"{termine}"*' for termine in termini)
+
+
+def ordinamento_bm25(lingua: str) -> str:
+    """Espressione ORDER BY per la lingua richiesta (le altre usano i pesi italiani)"""
+    pesi = PESI_BM25.get(lingua, PESI_BM25['it'])
+    return f"bm25(menu_ricerca, {', '.join(str(p) for p in pesi)})"
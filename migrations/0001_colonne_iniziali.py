@@ -0,0 +1,24 @@
+"""
+Baseline: colonne aggiunte nel tempo con ALTER TABLE in init_db e quelle
+di traduzione usate da translation_service. Idempotente, così i database
+creati prima del sistema di migrazioni vengono allineati senza errori.
+"""
+
+COLONNE = [
+    ('prodotti', 'attivo', 'BOOLEAN DEFAULT 1'),
+    ('prodotti', 'nome_en', 'TEXT'),
+    ('prodotti', 'descrizione_en', 'TEXT'),
+    ('categorie', 'nome_en', 'TEXT'),
+    ('categorie', 'descrizione_en', 'TEXT'),
+    ('allergeni', 'nome_en', 'TEXT'),
+    ('allergeni', 'descrizione_en', 'TEXT'),
+    ('ingredienti', 'nome_en', 'TEXT'),
+    ('ingredienti', 'descrizione_en', 'TEXT'),
+]
+
+
+def upgrade(conn):
+    for tabella, colonna, definizione in COLONNE:
+        esistenti = {row[1] for row in conn.execute(f'PRAGMA table_info({tabella})')}
+        if colonna not in esistenti:
+            conn.execute(f'ALTER TABLE {tabella} ADD COLUMN {colonna} {definizione}')
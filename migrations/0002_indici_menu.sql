@@ -0,0 +1,11 @@
+-- Indici per le query calde del menu e per i trigger del modello di lettura
+
+-- Sottocategorie di una categoria (menu, trigger su categorie)
+CREATE INDEX IF NOT EXISTS idx_categorie_parent ON categorie (parent_id, attiva);
+
+-- Prodotti visibili di una categoria
+CREATE INDEX IF NOT EXISTS idx_prodotti_categoria ON prodotti (categoria_id, attivo, disponibile);
+
+-- Chiavi inverse delle tabelle di collegamento (UNIQUE copre già prodotto_id -> x)
+CREATE INDEX IF NOT EXISTS idx_prodotti_allergeni_allergene ON prodotti_allergeni (allergene_id, prodotto_id);
+CREATE INDEX IF NOT EXISTS idx_prodotti_ingredienti_ingrediente ON prodotti_ingredienti (ingrediente_id, prodotto_id);
@@ -0,0 +1,33 @@
+"""
+Versione del menu condivisa tra i processi: una riga in menu_versione che
+i trigger aumentano ad ogni modifica delle tabelle visibili nel menu
+pubblico. Ogni worker la confronta con quella delle proprie snapshot.
+
+Il valore è un timestamp in ms forzato ad essere sempre crescente, così
+resta utilizzabile per Last-Modified e per /api/menu/last-update.
+"""
+
+TABELLE_MENU = ['prodotti', 'categorie', 'allergeni', 'ingredienti',
+                'prodotti_allergeni', 'prodotti_ingredienti']
+
+ADESSO_MS = "CAST((julianday('now') - 2440587.5) * 86400000 AS INTEGER)"
+
+
+def upgrade(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS menu_versione (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            versione INTEGER NOT NULL
+        )
+    ''')
+    conn.execute(f'INSERT OR IGNORE INTO menu_versione (id, versione) VALUES (1, {ADESSO_MS})')
+
+    for tabella in TABELLE_MENU:
+        for evento in ('INSERT', 'UPDATE', 'DELETE'):
+            conn.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS mv_{tabella}_{evento.lower()}
+                AFTER {evento} ON {tabella}
+                BEGIN
+                    UPDATE menu_versione SET versione = MAX(versione + 1, {ADESSO_MS}) WHERE id = 1;
+                END
+            ''')
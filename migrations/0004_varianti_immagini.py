@@ -0,0 +1,16 @@
+"""
+Varianti ridimensionate delle immagini (image_pipeline.py): percorsi e
+dimensioni in JSON. NULL = non ancora generate, il menu usa l'originale.
+"""
+
+COLONNE = [
+    ('prodotti', 'foto_varianti', 'TEXT'),
+    ('azienda', 'logo_varianti', 'TEXT'),
+]
+
+
+def upgrade(conn):
+    for tabella, colonna, definizione in COLONNE:
+        esistenti = {row[1] for row in conn.execute(f'PRAGMA table_info({tabella})')}
+        if colonna not in esistenti:
+            conn.execute(f'ALTER TABLE {tabella} ADD COLUMN {colonna} {definizione}')
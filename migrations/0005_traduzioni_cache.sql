@@ -0,0 +1,16 @@
+-- Tabella della cache persistente delle traduzioni (translation_service.TranslationCache)
+
+CREATE TABLE IF NOT EXISTS traduzioni_cache (
+    hash_testo TEXT NOT NULL,
+    lingua_origine TEXT NOT NULL,
+    lingua_destinazione TEXT NOT NULL,
+    provider TEXT NOT NULL,
+    testo TEXT NOT NULL,
+    traduzione TEXT NOT NULL,
+    created_at INTEGER NOT NULL,
+    ultimo_uso INTEGER NOT NULL,
+    PRIMARY KEY (hash_testo, lingua_origine, lingua_destinazione, provider)
+);
+
+-- Pulizia delle righe usate meno di recente oltre TRANSLATION_CACHE_MAX_ROWS
+CREATE INDEX IF NOT EXISTS idx_traduzioni_cache_ultimo_uso ON traduzioni_cache (ultimo_uso);
@@ -0,0 +1,19 @@
+-- Gli allergeni entrano nella maschera allergeni_maschera con il bit (1 << id):
+-- un id oltre 62 (menu_read_model.MAX_ID_ALLERGENE) resterebbe fuori dal filtro
+-- exclude_allergeni, quindi viene rifiutato. Dopo un AFTER INSERT il RAISE
+-- annulla l'inserimento; in BEFORE INSERT l'id assegnato dall'AUTOINCREMENT
+-- non è ancora noto.
+
+CREATE TRIGGER IF NOT EXISTS allergeni_limite_id_ins
+AFTER INSERT ON allergeni
+WHEN NEW.id > 62
+BEGIN
+    SELECT RAISE(ABORT, 'Id allergene oltre il limite della maschera (62)');
+END;
+
+CREATE TRIGGER IF NOT EXISTS allergeni_limite_id_upd
+AFTER UPDATE OF id ON allergeni
+WHEN NEW.id > 62
+BEGIN
+    SELECT RAISE(ABORT, 'Id allergene oltre il limite della maschera (62)');
+END;
@@ -0,0 +1,19 @@
+-- Coda dei lavori di traduzione (translation_queue.TranslationQueue)
+
+CREATE TABLE IF NOT EXISTS traduzioni_coda (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    tabella TEXT NOT NULL,
+    elemento_id INTEGER NOT NULL,
+    nome TEXT,
+    descrizione TEXT,
+    stato TEXT NOT NULL DEFAULT 'in_attesa',
+    tentativi INTEGER NOT NULL DEFAULT 0,
+    errore TEXT,
+    eseguibile_da REAL NOT NULL,
+    avviato_da REAL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Prossimo lavoro eseguibile
+CREATE INDEX IF NOT EXISTS idx_traduzioni_coda_stato ON traduzioni_coda (stato, eseguibile_da);
@@ -0,0 +1,151 @@
+import os
+import re
+import sqlite3
+import logging
+import importlib.util
+from typing import List, Tuple
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+
+# Nome file: 0001_descrizione.sql oppure 0001_descrizione.py (con funzione upgrade(conn))
+_MIGRATION_FILE = re.compile(r'^(\d{4})_(\w+)\.(sql|py)$')
+
+# Query calde e indice che EXPLAIN QUERY PLAN deve mostrare
+QUERY_INDICIZZATE = [
+    ('categorie figlie', 'SELECT id FROM categorie WHERE parent_id = ?', (1,),
+     'idx_categorie_parent'),
+    ('prodotti disponibili per categoria',
+     'SELECT id FROM prodotti WHERE categoria_id = ? AND attivo = 1 AND disponibile = 1', (1,),
+     'idx_prodotti_categoria'),
+    ('prodotti con un allergene', 'SELECT prodotto_id FROM prodotti_allergeni WHERE allergene_id = ?', (1,),
+     'idx_prodotti_allergeni_allergene'),
+    ('prodotti con un ingrediente', 'SELECT prodotto_id FROM prodotti_ingredienti WHERE ingrediente_id = ?', (1,),
+     'idx_prodotti_ingredienti_ingrediente'),
+    ('menu pubblico per categoria',
+     'SELECT prodotto_id FROM menu_read_model WHERE lingua = ? AND categoria_id = ?', ('it', 1),
+     'idx_menu_read_model_categoria'),
+]
+
+
+def _ensure_version_table(conn: sqlite3.Connection) -> None:
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS schema_version (
+            versione INTEGER PRIMARY KEY,
+            nome TEXT NOT NULL,
+            applicata_il TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.commit()
+
+
+def available_migrations(directory: str = MIGRATIONS_DIR) -> List[Tuple[int, str, str]]:
+    """Migrazioni presenti su disco come (versione, nome, percorso), in ordine"""
+    migrations = []
+    for filename in os.listdir(directory):
+        match = _MIGRATION_FILE.match(filename)
+        if match:
+            migrations.append((int(match.group(1)), match.group(2), os.path.join(directory, filename)))
+    migrations.sort()
+
+    versions = [m[0] for m in migrations]
+    if len(versions) != len(set(versions)):
+        raise RuntimeError(f"Numeri di migrazione duplicati in {directory}")
+    return migrations
+
+
+def current_version(conn: sqlite3.Connection) -> int:
+    _ensure_version_table(conn)
+    return conn.execute('SELECT COALESCE(MAX(versione), 0) FROM schema_version').fetchone()[0]
+
+
+def _apply(conn: sqlite3.Connection, versione: int, nome: str, path: str) -> None:
+    conn.execute('BEGIN')
+    try:
+        if path.endswith('.sql'):
+            with open(path, encoding='utf-8') as f:
+                script = f.read()
+            # executescript farebbe COMMIT: gli statement vengono eseguiti uno alla volta
+            for statement in _split_sql(script):
+                conn.execute(statement)
+        else:
+            spec = importlib.util.spec_from_file_location(f'migrazione_{versione:04d}', path)
+            module = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(module)
+            module.upgrade(conn)
+        conn.execute('INSERT INTO schema_version (versione, nome) VALUES (?, ?)', (versione, nome))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def _split_sql(script: str) -> List[str]:
+    statements = []
+    current = ''
+    for line in script.splitlines(keepends=True):
+        if line.strip().startswith('--'):
+            continue
+        current += line
+        if sqlite3.complete_statement(current):
+            if current.strip():
+                statements.append(current.strip())
+            current = ''
+    if current.strip():
+        statements.append(current.strip())
+    return statements
+
+
+def run_migrations(conn: sqlite3.Connection, directory: str = MIGRATIONS_DIR) -> List[int]:
+    """
+    Applica in ordine le migrazioni non ancora registrate in schema_version.
+    Ogni migrazione gira in una propria transazione: se fallisce lo schema
+    resta alla versione precedente. Restituisce le versioni applicate.
+    """
+    versione_attuale = current_version(conn)
+    applicate = []
+    for versione, nome, path in available_migrations(directory):
+        if versione <= versione_attuale:
+            continue
+        logger.info(f"Applico migrazione {versione:04d}_{nome}")
+        _apply(conn, versione, nome, path)
+        applicate.append(versione)
+
+    if applicate:
+        # Aggiorna le statistiche del planner per i nuovi indici
+        conn.execute('PRAGMA optimize')
+    return applicate
+
+
+def check_query_plans(conn: sqlite3.Connection) -> List[str]:
+    """
+    Verifica con EXPLAIN QUERY PLAN che le query calde usino gli indici.
+    Restituisce la lista dei problemi trovati (vuota se tutto è indicizzato).
+    """
+    problemi = []
+    for descrizione, query, params, indice in QUERY_INDICIZZATE:
+        try:
+            piano = ' | '.join(row[-1] for row in conn.execute(f'EXPLAIN QUERY PLAN {query}', params))
+        except sqlite3.OperationalError as e:
+            problemi.append(f"{descrizione}: {e}")
+            continue
+        if indice not in piano:
+            problemi.append(f"{descrizione}: atteso {indice}, piano '{piano}'")
+
+    for problema in problemi:
+        logger.warning(f"Query non indicizzata - {problema}")
+    return problemi
+
+
+if __name__ == '__main__':
+    from database import db_pool
+    from logging_config import setup_logging
+
+    setup_logging()
+    with db_pool.connection() as conn:
+        applicate = run_migrations(conn)
+        logger.info(f"Schema alla versione {current_version(conn)} (applicate ora: {applicate or 'nessuna'})")
+        # I problemi sono già registrati come warning da check_query_plans
+        if not check_query_plans(conn):
+            logger.info("Piani di esecuzione: OK")
@@ -0,0 +1,151 @@
+"""
+Backend dei messaggi Socket.IO condiviso tra più worker.
+
+Senza SOCKETIO_MESSAGE_QUEUE l'app gira in un solo processo: gli emit
+dell'admin raggiungono solo i client collegati a quel processo. Con un
+message queue ogni worker pubblica gli emit sul canale e li riceve dagli
+altri, quindi gli ospiti possono essere distribuiti su più processi.
+
+URL supportati:
+  memory://            coda in memoria tra i server dello stesso processo (test)
+  redis://host:6379/0  Redis o compatibili (Valkey, KeyDB, tools/redis_locale.py)
+  amqp://...           RabbitMQ e altri trasporti kombu
+  kafka://..., zmq+tcp://...
+
+Questo modulo va importato prima di ogni altro: con un message queue di
+rete e eventlet installato applica il monkey patching, senza il quale il
+client Redis bloccherebbe l'intero worker.
+"""
+import os
+
+SOCKETIO_MESSAGE_QUEUE = os.getenv('SOCKETIO_MESSAGE_QUEUE', '').strip()
+SOCKETIO_CHANNEL = os.getenv('SOCKETIO_CHANNEL', 'gestione-ristorante')
+
+
+def _richiede_monkey_patch() -> bool:
+    return bool(SOCKETIO_MESSAGE_QUEUE) and not SOCKETIO_MESSAGE_QUEUE.startswith('memory://')
+
+
+if _richiede_monkey_patch():
+    try:
+        import eventlet
+        eventlet.monkey_patch()
+    except ImportError:
+        pass
+
+import queue
+import logging
+import threading
+from typing import Any, Dict, List, Optional
+
+import socketio
+
+logger = logging.getLogger(__name__)
+
+
+class InProcessManager(socketio.PubSubManager):
+    """
+    Backend 'memory://': i messaggi passano da una coda in memoria condivisa
+    da tutti i server Socket.IO dello stesso processo sullo stesso canale.
+    Esercita lo stesso percorso di un message queue reale (serializzazione
+    JSON compresa) senza servizi esterni: utile per test e sviluppo.
+    """
+    name = 'memory'
+
+    _canali: Dict[str, List[queue.Queue]] = {}
+    _lock_canali = threading.Lock()
+
+    def __init__(self, url: str = 'memory://', channel: str = 'socketio', write_only: bool = False,
+                 logger=None, json=None):
+        super().__init__(channel=channel, write_only=write_only, logger=logger, json=json)
+        self._coda: queue.Queue = queue.Queue()
+        self._chiuso = False
+
+    def initialize(self):
+        # La coda riceve messaggi solo da quando il server avvia l'ascolto
+        if not self.write_only:
+            with self._lock_canali:
+                self._canali.setdefault(self.channel, []).append(self._coda)
+        super().initialize()
+
+    def chiudi(self) -> None:
+        """
+        Toglie la coda dal canale e termina l'ascolto (es. a fine test).
+        python-socketio registra la fine del listener come inattesa.
+        """
+        self._chiuso = True
+        with self._lock_canali:
+            code = self._canali.get(self.channel, [])
+            if self._coda in code:
+                code.remove(self._coda)
+            if not code:
+                self._canali.pop(self.channel, None)
+
+    def _publish(self, data: Dict[str, Any]) -> None:
+        messaggio = self.json.dumps(data)
+        with self._lock_canali:
+            code = list(self._canali.get(self.channel, []))
+        for coda in code:
+            coda.put(messaggio)
+
+    def _listen(self):
+        while not self._chiuso:
+            try:
+                yield self._coda.get_nowait()
+            except queue.Empty:
+                # sleep del server: non blocca l'hub con eventlet
+                self.server.sleep(0.01)
+
+
+def crea_client_manager(url: Optional[str] = None, channel: Optional[str] = None,
+                        write_only: bool = False) -> Optional[socketio.PubSubManager]:
+    """
+    Client manager per l'URL indicato (default SOCKETIO_MESSAGE_QUEUE),
+    None se non è configurato un message queue.
+    """
+    url = SOCKETIO_MESSAGE_QUEUE if url is None else url
+    channel = channel or SOCKETIO_CHANNEL
+    if not url:
+        return None
+
+    if url.startswith('memory://'):
+        return InProcessManager(url, channel=channel, write_only=write_only)
+    if url.startswith(('redis://', 'rediss://', 'redis+sentinel://', 'unix://')):
+        _verifica_modulo(url, 'redis', 'redis')
+        return socketio.RedisManager(url, channel=channel, write_only=write_only)
+    if url.startswith(('valkey://', 'valkeys://', 'valkey+sentinel://')):
+        _verifica_modulo(url, 'valkey', 'valkey')
+        return socketio.RedisManager(url, channel=channel, write_only=write_only)
+    if url.startswith('kafka://'):
+        _verifica_modulo(url, 'kafka', 'kafka-python')
+        return socketio.KafkaManager(url, channel=channel, write_only=write_only)
+    if url.startswith('zmq'):
+        _verifica_modulo(url, 'zmq', 'pyzmq')
+        return socketio.ZmqManager(url, channel=channel, write_only=write_only)
+    _verifica_modulo(url, 'kombu', 'kombu')
+    return socketio.KombuManager(url, channel=channel, write_only=write_only)
+
+
+def _verifica_modulo(url: str, modulo: str, pacchetto: str) -> None:
+    # Meglio fallire all'avvio che scoprire in produzione che gli emit non escono dal worker
+    try:
+        __import__(modulo)
+    except ImportError:
+        raise RuntimeError(f"Il message queue {url.split('://', 1)[0]}:// richiede il pacchetto "
+                           f"'{pacchetto}' (pip install {pacchetto})")
+
+
+def socketio_options() -> Dict[str, Any]:
+    """Argomenti aggiuntivi per SocketIO(app, ...)"""
+    manager = crea_client_manager()
+    if manager is None:
+        return {}
+    logger.info("Socket.IO: message queue %s sul canale '%s'", manager.name, SOCKETIO_CHANNEL)
+    return {'client_manager': manager}
+
+
+def stats() -> Dict[str, Any]:
+    return {
+        'message_queue': SOCKETIO_MESSAGE_QUEUE.split('://', 1)[0] if SOCKETIO_MESSAGE_QUEUE else None,
+        'canale': SOCKETIO_CHANNEL if SOCKETIO_MESSAGE_QUEUE else None
+    }
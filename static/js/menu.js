@@ -14,7 +14,13 @@ let categorieGenitore = [];
 let prodottiCorrente = [];
 let categorieCorrente = [];
 let categoriaGenitoreCorrente = null;
-let ultimoAggiornamento = Date.now();
+// Versione del menu vista dal long-poll (null = non ancora letta)
+let ultimoAggiornamento = null;
+
+// Versione del menu a cui si riferiscono i dati mostrati (ETag delle API o ultimo delta ricevuto)
+let versioneMenu = 0;
+// Categoria principale visualizzata (null = elenco delle categorie)
+let categoriaVisualizzata = null;
 
 // Cache per i dati delle categorie e prodotti
 let cacheCategorie = null;
@@ -168,23 +174,30 @@ async function fetchWithTimeout(url, options = {}, timeout = 10000) {
     }
 }
 
-// Funzione per controllare aggiornamenti periodicamente (solo se Socket.IO non è disponibile)
-function controllaAggiornamenti() {
-    // Solo se non abbiamo Socket.IO attivo
-    if (!socket) {
-        fetch('/api/menu/last-update')
-            .then(response => response.json())
-            .then(data => {
-                if (data.timestamp > ultimoAggiornamento) {
-                    console.log('Rilevato aggiornamento - aggiorno cache e ricarico dati');
-                    ultimoAggiornamento = data.timestamp;
-                    // Invalida cache e ricarica solo i dati necessari
-                    invalidaCacheEAggiorna();
-                }
-            })
-            .catch(error => {
-                console.log('Errore nel controllo aggiornamenti:', error);
-            });
+// Long-poll degli aggiornamenti (solo se Socket.IO non è disponibile): il server
+// tiene aperta la richiesta finché la versione del menu non cambia o scade il timeout
+async function attendiAggiornamenti() {
+    while (!socket) {
+        try {
+            // La prima richiesta legge la versione corrente senza attendere
+            const url = ultimoAggiornamento === null
+                ? '/api/menu/last-update'
+                : `/api/menu/last-update?attendi=${ultimoAggiornamento}`;
+            const response = await fetch(url, {cache: 'no-store'});
+            if (!response.ok) {
+                throw new Error(`HTTP ${response.status}`);
+            }
+            const data = await response.json();
+            if (ultimoAggiornamento !== null && data.timestamp > ultimoAggiornamento) {
+                console.log('Rilevato aggiornamento - aggiorno cache e ricarico dati');
+                invalidaCacheEAggiorna();
+            }
+            ultimoAggiornamento = data.timestamp;
+        } catch (error) {
+            console.log('Errore nel controllo aggiornamenti:', error);
+            // Server non raggiungibile: riprova tra qualche secondo
+            await new Promise(resolve => setTimeout(resolve, 5000));
+        }
     }
 }
 
@@ -193,28 +206,49 @@ function invalidaCacheEAggiorna() {
     cacheCategorie = null;
     cacheProdotti.clear();
     cacheTimestamp = 0;
+    aggiornaRicerca();
     
     // Ricarica solo le categorie se siamo nella vista principale
-    if (document.querySelector('.categories-grid')) {
+    if (categoriaVisualizzata === null) {
         caricaCategorie().then(() => {
             mostraCategorie();
         });
+        return;
     }
     
-    // Se stiamo visualizzando prodotti di una categoria, ricarica quelli
+    // Se stiamo visualizzando prodotti di una categoria, ricarica il menu e mostra quelli
     const categoriaAttiva = document.querySelector('.category-products');
-    if (categoriaAttiva) {
-        const categoriaId = categoriaAttiva.dataset.categoriaId;
-        if (categoriaId) {
-            visualizzaProdottiCategoria(parseInt(categoriaId), categoriaAttiva.dataset.nomeCategoria);
-        }
+    const nomeCategoria = categoriaAttiva ? categoriaAttiva.dataset.nomeCategoria : '';
+    const categoriaId = categoriaVisualizzata;
+    caricaCategorie()
+        .catch(() => {})
+        .then(() => visualizzaProdottiCategoria(categoriaId, nomeCategoria));
+}
+
+function linguaCorrente() {
+    return window.languageSelector ? window.languageSelector.getCurrentLanguage() : 'it';
+}
+
+// L'ETag delle API del menu termina con la versione del menu (es. "menu-it-1700000000000")
+function aggiornaVersioneDaRisposta(response) {
+    const etag = response.headers.get('ETag');
+    const match = etag && etag.match(/-(\d+)"?$/);
+    if (match) {
+        versioneMenu = Math.max(versioneMenu, parseInt(match[1]));
+    }
+    return response;
+}
+
+// Comunica al server lingua e categoria visualizzata: riceveremo solo i delta pertinenti
+function entraStanzeMenu() {
+    if (socket && socket.connected) {
+        socket.emit('menu_entra', {lingua: linguaCorrente(), categoria_id: categoriaVisualizzata});
     }
 }
 
-// Avvia il controllo periodico ogni 30 secondi (solo se Socket.IO non è disponibile)
-// Ridotto ulteriormente perché ora non ricarica tutta la pagina
+// Avvia il long-poll degli aggiornamenti (solo se Socket.IO non è disponibile)
 if (!socket) {
-    setInterval(controllaAggiornamenti, 30000);
+    attendiAggiornamenti();
 }
 
 // Funzione per mostrare notifica
@@ -232,11 +266,24 @@ function createProductCard(prodotto) {
             <div class="card h-100 shadow-sm prodotto-card">
     `;
     
-    // Aggiungi foto se presente
-    if (prodotto.foto) {
+    // Aggiungi foto se presente: varianti WebP/JPEG ridimensionate se già generate
+    if (prodotto.foto_varianti) {
+        const varianti = Object.values(prodotto.foto_varianti).sort((a, b) => a.larghezza - b.larghezza);
+        const srcset = formato => varianti.map(v => `/static/${v[formato]} ${v.larghezza}w`).join(', ');
+        // Card a due colonne da md in su, a tutta larghezza sui telefoni
+        const sizes = '(min-width: 768px) 50vw, 100vw';
         cardContent += `
                 <div class="card-img-top-container">
-                    <img src="/static/uploads/${prodotto.foto}" class="card-img-top" alt="${prodotto.nome}" loading="lazy" style="height: 200px; object-fit: cover; width: 100%;">
+                    <picture>
+                        <source type="image/webp" srcset="${srcset('webp')}" sizes="${sizes}">
+                        <img src="/static/${varianti[varianti.length - 1].jpeg}" srcset="${srcset('jpeg')}" sizes="${sizes}" class="card-img-top" alt="${prodotto.nome}" loading="lazy" style="height: 200px; object-fit: cover; width: 100%;">
+                    </picture>
+                </div>
+        `;
+    } else if (prodotto.foto) {
+        cardContent += `
+                <div class="card-img-top-container">
+                    <img src="/static/${prodotto.foto}" class="card-img-top" alt="${prodotto.nome}" loading="lazy" style="height: 200px; object-fit: cover; width: 100%;">
                 </div>
         `;
     }
@@ -346,17 +393,24 @@ function caricaCategorie() {
     }
     
     caricamentoCategorieInCorso = true;
-    const lang = window.languageSelector ? window.languageSelector.getCurrentLanguage() : 'it';
+    const lang = linguaCorrente();
     
-    return fetchWithTimeout(`/api/categorie-menu?lang=${lang}`)
+    // Un solo documento con categorie e prodotti di tutte le categorie della lingua:
+    // aprire una categoria non richiede altre chiamate al server
+    return fetchWithTimeout(`/api/menu/bootstrap?lang=${lang}`)
+        .then(aggiornaVersioneDaRisposta)
         .then(response => response.json())
         .then(data => {
-            categorie = data;
+            versioneMenu = Math.max(versioneMenu, data.versione);
+            categorie = data.categorie;
             categorieGenitore = categorie; // Assegna anche a categorieGenitore
             // Aggiorna cache
-            cacheCategorie = data;
+            cacheCategorie = data.categorie;
             cacheTimestamp = now;
-            console.log('Categorie caricate dal server:', categorie);
+            for (const [categoriaId, prodottiCategoria] of Object.entries(data.prodotti_categoria)) {
+                cacheProdotti.set(`${categoriaId}_${lang}`, {data: prodottiCategoria, timestamp: now});
+            }
+            console.log('Menu caricato dal server:', categorie);
         })
         .catch(error => {
             console.error('Errore nel caricamento delle categorie:', error);
@@ -433,6 +487,8 @@ function mostraCategorie() {
     LoadingManager.show(container, 'Preparazione categorie...', false);
     
     // Rimuovi attributi specifici della vista prodotti
+    categoriaVisualizzata = null;
+    entraStanzeMenu();
     container.removeAttribute('data-categoria-id');
     container.removeAttribute('data-nome-categoria');
     container.classList.remove('category-products');
@@ -527,106 +583,89 @@ async function inizializzaMenu() {
     }
 }
 
+// Applica il delta di un prodotto alla categoria visualizzata (e alla sua cache)
+function applicaDeltaProdotto(delta) {
+    const lang = linguaCorrente();
+    
+    // La cache di un'altra categoria toccata dal delta non è più valida
+    if (delta.categoria_radice_id && delta.categoria_radice_id !== categoriaVisualizzata) {
+        cacheProdotti.delete(`${delta.categoria_radice_id}_${lang}`);
+    }
+    if (categoriaVisualizzata === null) {
+        return;
+    }
+    
+    const indice = prodottiCorrente.findIndex(p => p.id === delta.id);
+    const visibile = delta.prodotto && delta.categoria_radice_id === categoriaVisualizzata;
+    if (indice !== -1) {
+        prodottiCorrente.splice(indice, 1);
+    }
+    if (visibile) {
+        prodottiCorrente.push(delta.prodotto);
+        prodottiCorrente.sort((a, b) =>
+            (a.categoria_nome || '').localeCompare(b.categoria_nome || '') || a.nome.localeCompare(b.nome));
+    }
+    categorieCorrente = [...new Set(prodottiCorrente
+        .filter(p => p.categoria_id !== categoriaVisualizzata)
+        .map(p => p.categoria_nome))];
+    
+    const cached = cacheProdotti.get(`${categoriaVisualizzata}_${lang}`);
+    if (cached) {
+        cached.data.prodotti = prodottiCorrente;
+        cached.data.categorie_figlie = categorieCorrente;
+        cached.data.totale_prodotti = prodottiCorrente.length;
+    }
+    
+    mostraProdottiConNavigazione();
+    if (visibile && indice === -1) {
+        showToast(`${delta.prodotto.nome} è ora disponibile!`);
+    } else if (!visibile && indice !== -1) {
+        showToast('Un prodotto non è più disponibile');
+    }
+}
+
+// Nuovo elenco delle categorie (conteggi cambiati)
+function applicaDeltaCategorie(delta) {
+    categorie = delta.categorie;
+    categorieGenitore = categorie;
+    cacheCategorie = categorie;
+    cacheTimestamp = Date.now();
+    if (categoriaVisualizzata === null) {
+        mostraCategorie();
+    }
+}
+
 // Event listeners per Socket.IO
 if (socket) {
-    socket.on('prodotto_aggiunto', function(prodotto) {
-        console.log('Nuovo prodotto aggiunto:', prodotto);
-        // Se il prodotto è disponibile, aggiorna solo i dati necessari
-        if (prodotto.disponibile) {
-            // Invalida cache e aggiorna la vista corrente
+    let primaConnessione = true;
+    
+    socket.on('connect', function() {
+        entraStanzeMenu();
+        // Dopo una riconnessione potremmo aver perso dei delta: rivalida con ETag
+        if (!primaConnessione) {
             invalidaCacheEAggiorna();
-            showToast(`Nuovo prodotto aggiunto: ${prodotto.nome}`);
         }
+        primaConnessione = false;
     });
 
-    socket.on('prodotto_aggiornato', function(prodotto) {
-        console.log('=== MENU: Ricevuto evento prodotto_aggiornato ===');
-        console.log('Prodotto:', prodotto);
-        console.log('Disponibile:', prodotto.disponibile);
-        
-        // Invalida cache per la categoria del prodotto
-        if (cacheProdotti.has(prodotto.categoria_id)) {
-            cacheProdotti.delete(prodotto.categoria_id);
+    // Delta già tradotti e pronti da mostrare, inviati alle stanze di lingua e categoria
+    socket.on('menu_delta', function(delta) {
+        if (delta.lingua !== linguaCorrente() || delta.versione < versioneMenu) {
+            return; // I dati mostrati sono già più recenti
         }
+        versioneMenu = delta.versione;
         
-        // Trova e aggiorna il prodotto nella visualizzazione corrente
-        const prodottoElement = document.querySelector(`[data-prodotto-id="${prodotto.id}"]`);
-        console.log('Elemento trovato:', prodottoElement);
-        
-        if (prodotto.disponibile) {
-            // Se il prodotto è ora disponibile e non è visibile - aggiorno vista
-            if (!prodottoElement) {
-                console.log('Prodotto disponibile ma non visibile - aggiorno vista');
-                invalidaCacheEAggiorna();
-                showToast(`${prodotto.nome} è ora disponibile!`);
-            } else {
-                // Aggiorna i dati del prodotto esistente
-                aggiornaElementoProdotto(prodottoElement, prodotto);
-                showToast(`${prodotto.nome} aggiornato!`);
-            }
+        if (delta.tipo === 'prodotto') {
+            applicaDeltaProdotto(delta);
+            aggiornaRicerca();
+        } else if (delta.tipo === 'categorie') {
+            applicaDeltaCategorie(delta);
         } else {
-            // Se il prodotto non è più disponibile e è visibile, rimuovilo o aggiornalo
-            if (prodottoElement) {
-                console.log('Prodotto non più disponibile - aggiorno vista');
-                invalidaCacheEAggiorna();
-                showToast(`${prodotto.nome} non è più disponibile`);
-            }
-        }
-    });
-
-    socket.on('prodotto_eliminato', function(data) {
-        console.log('Prodotto eliminato:', data);
-        // Rimuovi dalla cache e aggiorna la vista
-        cacheProdotti.forEach((prodotti, categoriaId) => {
-            const index = prodotti.findIndex(p => p.id === data.id);
-            if (index !== -1) {
-                prodotti.splice(index, 1);
-            }
-        });
-        
-        // Rimuovi l'elemento dalla vista se presente
-        const prodottoElement = document.querySelector(`[data-prodotto-id="${data.id}"]`);
-        if (prodottoElement) {
-            prodottoElement.remove();
+            invalidaCacheEAggiorna();
         }
-        
-        showToast('Prodotto eliminato');
     });
 }
 
-// Funzione per aggiornare un elemento prodotto esistente nella vista
-function aggiornaElementoProdotto(elemento, prodotto) {
-    // Aggiorna il nome del prodotto
-    const nomeElement = elemento.querySelector('.card-title');
-    if (nomeElement) {
-        nomeElement.textContent = prodotto.nome;
-    }
-    
-    // Aggiorna la descrizione
-    const descrizioneElement = elemento.querySelector('.card-text');
-    if (descrizioneElement) {
-        descrizioneElement.textContent = prodotto.descrizione;
-    }
-    
-    // Aggiorna il prezzo
-    const prezzoElement = elemento.querySelector('.price');
-    if (prezzoElement) {
-        prezzoElement.textContent = `€${prodotto.prezzo.toFixed(2)}`;
-    }
-    
-    // Aggiorna l'immagine se presente
-    if (prodotto.foto) {
-        const imgElement = elemento.querySelector('.card-img-top');
-        if (imgElement) {
-            imgElement.src = `/static/uploads/${prodotto.foto}`;
-        }
-    }
-    
-    // Aggiorna gli attributi data
-    elemento.setAttribute('data-prodotto-id', prodotto.id);
-    elemento.setAttribute('data-categoria-id', prodotto.categoria_id);
-}
-
 function mostraProdottiConNavigazione() {
     const container = document.getElementById('categories-boxes-container');
     
@@ -755,19 +794,87 @@ function filtraProdotti(filtro) {
     }
 }
 
+// Ricerca nei prodotti: una richiesta a /api/menu/search dopo una breve pausa nella digitazione
+let testoRicerca = '';
+let timerRicerca = null;
+let richiestaRicerca = 0;
+
+function escapeHtml(testo) {
+    const div = document.createElement('div');
+    div.textContent = testo;
+    return div.innerHTML;
+}
+
+function cercaProdotti(testo) {
+    testoRicerca = testo.trim();
+    const risultati = document.getElementById('search-results-container');
+    const categorieContainer = document.getElementById('categories-boxes-container');
+    
+    if (!testoRicerca) {
+        risultati.style.display = 'none';
+        risultati.innerHTML = '';
+        categorieContainer.style.display = 'block';
+        return;
+    }
+    
+    // Solo l'ultima richiesta aggiorna i risultati (le risposte possono arrivare in disordine)
+    const numero = ++richiestaRicerca;
+    const lang = linguaCorrente();
+    fetchWithTimeout(`/api/menu/search?q=${encodeURIComponent(testoRicerca)}&lang=${lang}`)
+        .then(response => response.json())
+        .then(prodotti => {
+            if (numero !== richiestaRicerca || !testoRicerca) {
+                return;
+            }
+            categorieContainer.style.display = 'none';
+            risultati.style.display = '';
+            const intestazione = `
+                <div class="col-12 mb-3">
+                    <h5 class="text-muted">
+                        <i class="fas fa-search me-2"></i>${prodotti.length} risultati per "${escapeHtml(testoRicerca)}"
+                    </h5>
+                </div>
+            `;
+            risultati.innerHTML = intestazione + (prodotti.length > 0
+                ? prodotti.map(createProductCard).join('')
+                : `<div class="col-12 text-center py-4 text-muted">Nessun piatto trovato</div>`);
+        })
+        .catch(error => {
+            console.error('Errore nella ricerca:', error);
+        });
+}
+
+// Dopo un aggiornamento del menu i risultati mostrati vanno ricalcolati
+function aggiornaRicerca() {
+    if (testoRicerca) {
+        cercaProdotti(testoRicerca);
+    }
+}
+
 // Inizializzazione quando il DOM è caricato
 document.addEventListener('DOMContentLoaded', function() {
     inizializzaMenu();
+    
+    const campoRicerca = document.getElementById('menu-search');
+    if (campoRicerca) {
+        campoRicerca.addEventListener('input', function() {
+            clearTimeout(timerRicerca);
+            timerRicerca = setTimeout(() => cercaProdotti(campoRicerca.value), 200);
+        });
+    }
 });
 
 // Funzione per visualizzare i prodotti di una categoria specifica con cache
 function visualizzaProdottiCategoria(categoriaId, nomeCategoria) {
     console.log(`Caricamento prodotti per categoria: ${nomeCategoria} (ID: ${categoriaId})`);
     
-    const lang = window.languageSelector ? window.languageSelector.getCurrentLanguage() : 'it';
+    const lang = linguaCorrente();
     const cacheKey = `${categoriaId}_${lang}`;
     const now = Date.now();
     
+    categoriaVisualizzata = categoriaId;
+    entraStanzeMenu();
+    
     // Controlla se abbiamo dati in cache validi per questa categoria
     if (cacheProdotti.has(cacheKey)) {
         const cachedData = cacheProdotti.get(cacheKey);
@@ -795,6 +902,7 @@ function visualizzaProdottiCategoria(categoriaId, nomeCategoria) {
     
     // Carica i prodotti della categoria dal server con timeout
     fetchWithTimeout(`/api/prodotti/categoria/${categoriaId}?lang=${lang}`)
+        .then(aggiornaVersioneDaRisposta)
         .then(response => response.json())
         .then(data => {
             prodottiCorrente = data.prodotti;
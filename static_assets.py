@@ -0,0 +1,176 @@
+"""
+File statici con impronta del contenuto e cache a lungo termine.
+
+I template usano asset_url('css/menu.css'), che produce
+/static/css/menu.1a2b3c4d5e6f.css: l'impronta cambia solo quando cambia il
+file, quindi la risposta può essere 'immutable' per un anno e i telefoni
+non rivalidano più CSS e JS ad ogni apertura del menu. Una impronta che non
+corrisponde più al file (pagina vecchia in cache) riceve il contenuto
+attuale senza cache a lungo termine.
+
+I file in uploads/ hanno nomi univoci (uuid) e non vengono mai riscritti:
+sono immutabili anche senza impronta. CSS, JS e SVG vengono precompressi
+all'avvio (.gz, .br accanto all'originale) e serviti secondo Accept-Encoding.
+"""
+import os
+import re
+import hashlib
+import logging
+import mimetypes
+import threading
+from typing import Dict, Optional, Tuple
+
+from flask import request, send_from_directory, url_for
+from werkzeug.security import safe_join
+
+from compression import ENCODING_SUPPORTATI, ESTENSIONI, comprimi, negozia_encoding
+
+logger = logging.getLogger(__name__)
+
+STATIC_MAX_AGE_IMMUTABILE = int(os.getenv('STATIC_MAX_AGE_IMMUTABILE', '31536000'))
+
+# Formati testuali che vale la pena comprimere (le immagini sono già compresse)
+ESTENSIONI_COMPRIMIBILI = ('.css', '.js', '.svg', '.json', '.txt', '.html')
+# Sotto questa dimensione la compressione non ripaga gli header in più
+PRECOMPRESSI_MIN_BYTE = 512
+
+_CON_IMPRONTA = re.compile(r'^(?P<base>.+)\.(?P<impronta>[0-9a-f]{12})(?P<ext>\.[A-Za-z0-9]+)$')
+
+
+class StaticAssets:
+    def __init__(self):
+        self.cartella: Optional[str] = None
+        self._lock = threading.Lock()
+        # filename -> (mtime_ns, dimensione, impronta)
+        self._impronte: Dict[str, Tuple[int, int, str]] = {}
+        self._stats = {
+            'immutabili': 0,
+            'impronte_scadute': 0,
+            'precompressi_serviti': 0,
+            'precompressi_generati': 0
+        }
+
+    def init_app(self, app) -> None:
+        self.cartella = app.static_folder
+        app.view_functions['static'] = self.servi
+        app.add_template_global(self.asset_url, 'asset_url')
+
+    def _conta(self, chiave: str, valore: int = 1) -> None:
+        with self._lock:
+            self._stats[chiave] += valore
+
+    def impronta(self, filename: str) -> Optional[str]:
+        """Prime 12 cifre esadecimali dello SHA-256 del file, None se non esiste"""
+        percorso = safe_join(self.cartella, filename)
+        try:
+            stat = os.stat(percorso)
+        except (OSError, TypeError):
+            return None
+        # Ricalcolata solo se il file è cambiato (utile in sviluppo)
+        cache = self._impronte.get(filename)
+        if cache and cache[0] == stat.st_mtime_ns and cache[1] == stat.st_size:
+            return cache[2]
+        with open(percorso, 'rb') as f:
+            impronta = hashlib.sha256(f.read()).hexdigest()[:12]
+        with self._lock:
+            self._impronte[filename] = (stat.st_mtime_ns, stat.st_size, impronta)
+        return impronta
+
+    def asset_url(self, filename: str) -> str:
+        """URL con impronta per i template (senza impronta se il file non esiste)"""
+        impronta = self.impronta(filename)
+        if impronta is None:
+            return url_for('static', filename=filename)
+        base, ext = os.path.splitext(filename)
+        return url_for('static', filename=f'{base}.{impronta}{ext}')
+
+    def _precompresso(self, filename: str) -> Optional[str]:
+        """Encoding del file precompresso da servire, se il client lo accetta"""
+        if not filename.endswith(ESTENSIONI_COMPRIMIBILI):
+            return None
+        percorso = safe_join(self.cartella, filename)
+        try:
+            mtime = os.stat(percorso).st_mtime_ns
+        except (OSError, TypeError):
+            return None
+        disponibili = []
+        for encoding in ENCODING_SUPPORTATI:
+            try:
+                # Un precompresso più vecchio dell'originale non va servito
+                if os.stat(percorso + ESTENSIONI[encoding]).st_mtime_ns >= mtime:
+                    disponibili.append(encoding)
+            except OSError:
+                pass
+        return negozia_encoding(request.accept_encodings, disponibili)
+
+    def servi(self, filename: str):
+        """Sostituisce la view 'static' di Flask"""
+        reale, immutabile = filename, False
+        corrispondenza = _CON_IMPRONTA.match(filename)
+        if corrispondenza and not os.path.isfile(safe_join(self.cartella, filename) or ''):
+            reale = corrispondenza['base'] + corrispondenza['ext']
+            immutabile = self.impronta(reale) == corrispondenza['impronta']
+            if not immutabile:
+                self._conta('impronte_scadute')
+        elif filename.startswith('uploads/'):
+            immutabile = True
+
+        encoding = self._precompresso(reale)
+        if encoding:
+            response = send_from_directory(self.cartella, reale + ESTENSIONI[encoding],
+                                           mimetype=mimetypes.guess_type(reale)[0])
+            response.headers['Content-Encoding'] = encoding
+            self._conta('precompressi_serviti')
+        else:
+            response = send_from_directory(self.cartella, reale)
+        if reale.endswith(ESTENSIONI_COMPRIMIBILI):
+            response.vary.add('Accept-Encoding')
+
+        if immutabile:
+            response.headers['Cache-Control'] = f'public, max-age={STATIC_MAX_AGE_IMMUTABILE}, immutable'
+            self._conta('immutabili')
+        return response
+
+    def precomprimi(self) -> int:
+        """
+        Scrive i file .gz/.br dei file statici testuali mancanti o più vecchi
+        dell'originale. Da chiamare all'avvio; restituisce i file scritti.
+        """
+        scritti = 0
+        for radice, _, files in os.walk(self.cartella):
+            for nome in files:
+                if not nome.endswith(ESTENSIONI_COMPRIMIBILI):
+                    continue
+                percorso = os.path.join(radice, nome)
+                stat = os.stat(percorso)
+                if stat.st_size < PRECOMPRESSI_MIN_BYTE:
+                    continue
+                dati = None
+                for encoding in ENCODING_SUPPORTATI:
+                    destinazione = percorso + ESTENSIONI[encoding]
+                    if os.path.exists(destinazione) and os.stat(destinazione).st_mtime_ns >= stat.st_mtime_ns:
+                        continue
+                    if dati is None:
+                        with open(percorso, 'rb') as f:
+                            dati = f.read()
+                    # Scrittura atomica: un altro worker potrebbe servirlo nel frattempo
+                    temporaneo = f'{destinazione}.{os.getpid()}.tmp'
+                    with open(temporaneo, 'wb') as f:
+                        f.write(comprimi(dati, encoding, massima=True))
+                    os.replace(temporaneo, destinazione)
+                    scritti += 1
+        if scritti:
+            self._conta('precompressi_generati', scritti)
+            logger.info("File statici precompressi: %d (%s)", scritti, ', '.join(ENCODING_SUPPORTATI))
+        return scritti
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats['impronte'] = len(self._impronte)
+        stats['encoding'] = list(ENCODING_SUPPORTATI)
+        return stats
+
+
+# Istanza globale dei file statici
+static_assets = StaticAssets()
@@ -0,0 +1,32 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# Il pool del database è legato a DATABASE_PATH all'import: va impostato prima
+# di importare i moduli dell'applicazione
+_DATA_DIR = tempfile.mkdtemp(prefix='ristorante-test-')
+os.environ['DATABASE_PATH'] = os.path.join(_DATA_DIR, 'test.db')
+os.environ.setdefault('DEFAULT_ADMIN_PASSWORD', 'test')
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+
+@pytest.fixture(scope='session')
+def applicazione():
+    """Modulo app con il database di test inizializzato"""
+    os.chdir(ROOT_DIR)
+    import app
+    app.init_db()
+    return app
+
+
+@pytest.fixture
+def admin(applicazione):
+    """Test client autenticato come amministratore"""
+    client = applicazione.app.test_client()
+    client.post('/login', data={'username': 'admin', 'password': 'test'})
+    return client
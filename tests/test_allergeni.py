@@ -0,0 +1,42 @@
+import sqlite3
+
+import pytest
+
+from menu_read_model import MAX_ID_ALLERGENE
+
+
+def _ids_allergeni(applicazione):
+    with applicazione.db_pool.connection() as conn:
+        return {row[0] for row in conn.execute('SELECT id FROM allergeni')}
+
+
+def test_nuovi_allergeni_riusano_gli_id_liberi_entro_il_limite(applicazione, admin):
+    esistenti = _ids_allergeni(applicazione)
+    creati = []
+    for i in range(MAX_ID_ALLERGENE - len(esistenti)):
+        risposta = admin.post('/api/allergeni', json={'nome': f'Allergene di prova {i}'})
+        assert risposta.status_code == 200
+        creati.append(risposta.get_json()['id'])
+    assert _ids_allergeni(applicazione) == set(range(1, MAX_ID_ALLERGENE + 1))
+
+    # Pieno: l'AUTOINCREMENT non può andare oltre la maschera
+    risposta = admin.post('/api/allergeni', json={'nome': 'Allergene in più'})
+    assert risposta.status_code == 400
+    assert risposta.get_json()['success'] is False
+
+    # Un id eliminato torna disponibile ed è filtrabile con exclude_allergeni
+    assert admin.delete(f'/api/allergeni/{creati[0]}').status_code == 200
+    risposta = admin.post('/api/allergeni', json={'nome': 'Allergene riusato'})
+    assert risposta.get_json()['id'] == creati[0]
+    assert admin.get(f'/api/prodotti?exclude_allergeni={creati[0]}').status_code == 200
+
+    for allergene_id in creati:
+        admin.delete(f'/api/allergeni/{allergene_id}')
+
+
+def test_inserimento_oltre_il_limite_rifiutato_dal_database(applicazione):
+    with applicazione.db_pool.connection() as conn:
+        with pytest.raises(sqlite3.IntegrityError):
+            conn.execute('INSERT INTO allergeni (id, nome) VALUES (?, ?)', (MAX_ID_ALLERGENE + 1, 'Fuori maschera'))
+        conn.rollback()
+        assert conn.execute('SELECT COUNT(*) FROM allergeni WHERE id > ?', (MAX_ID_ALLERGENE,)).fetchone()[0] == 0
@@ -0,0 +1,25 @@
+import threading
+
+from database import ConnectionPool, DATABASE_PATH
+
+
+def test_statistiche_del_pool_con_checkout_concorrenti():
+    pool = ConnectionPool(DATABASE_PATH, pool_size=4, timeout=5)
+    thread_count, checkout = 8, 50
+
+    def lavoro():
+        for _ in range(checkout):
+            with pool.connection() as conn:
+                conn.execute('SELECT 1').fetchone()
+
+    threads = [threading.Thread(target=lavoro) for _ in range(thread_count)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    stats = pool.stats()
+    assert stats['checkouts'] == thread_count * checkout
+    assert stats['connessioni_create'] == stats['connessioni_aperte'] <= 4
+    assert stats['connessioni_libere'] == stats['connessioni_aperte']
+    pool.close_all()
@@ -0,0 +1,42 @@
+import threading
+import time
+import types
+
+import pytest
+
+import image_pipeline
+from image_pipeline import ImagePipeline
+
+
+def test_con_eventlet_al_piu_max_workers_elaborazioni(applicazione, monkeypatch):
+    eventlet = pytest.importorskip('eventlet')
+    lock = threading.Lock()
+    attive = []
+    massimo = []
+
+    def genera_varianti(percorso, cartella_static, varianti):
+        # Eseguita nei thread del tpool
+        with lock:
+            attive.append(percorso)
+            massimo.append(len(attive))
+        time.sleep(0.05)
+        with lock:
+            attive.remove(percorso)
+        return {}
+
+    monkeypatch.setattr(image_pipeline, 'genera_varianti', genera_varianti)
+    monkeypatch.setattr(image_pipeline, 'Image', object())
+    socketio = types.SimpleNamespace(async_mode='eventlet', start_background_task=eventlet.spawn)
+
+    pipeline = ImagePipeline(max_workers=2)
+    pipeline.start(socketio)
+    for i in range(6):
+        assert pipeline.accoda('prodotti', i + 1, f'uploads/prova-{i}.jpg')
+
+    scadenza = time.time() + 10
+    while len(massimo) < 6 and time.time() < scadenza:
+        eventlet.sleep(0.01)
+    eventlet.sleep(0.1)
+
+    assert len(massimo) == 6
+    assert max(massimo) == 2
@@ -0,0 +1,63 @@
+import io
+import os
+import queue
+import logging
+import subprocess
+import sys
+import threading
+import types
+
+import pytest
+
+from logging_config import OSThreadQueueListener, NonBlockingQueueHandler, moduli_listener
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_listener_creato_dal_modulo_threading_indicato():
+    creati = []
+
+    def thread(*args, **kwargs):
+        t = threading.Thread(*args, **kwargs)
+        creati.append(t)
+        return t
+
+    stream = io.StringIO()
+    handler = NonBlockingQueueHandler(queue.Queue(maxsize=10))
+    listener = OSThreadQueueListener(handler.queue, logging.StreamHandler(stream),
+                                     modulo_threading=types.SimpleNamespace(Thread=thread))
+    listener.start()
+    handler.handle(logging.LogRecord('test', logging.INFO, __file__, 1, 'scritto dal listener', (), None))
+    listener.stop()
+
+    assert len(creati) == 1 and creati[0].daemon
+    assert 'scritto dal listener' in stream.getvalue()
+
+
+def test_moduli_standard_senza_monkey_patching():
+    if 'eventlet' in sys.modules:
+        from eventlet import patcher
+        if patcher.is_monkey_patched('thread'):
+            pytest.skip('processo con monkey patching')
+    assert moduli_listener() == (threading, queue)
+
+
+def test_listener_su_thread_del_sistema_operativo_con_eventlet():
+    pytest.importorskip('eventlet')
+    # Il monkey patching è globale: va verificato in un processo separato
+    codice = '''
+import eventlet
+eventlet.monkey_patch()
+from eventlet import patcher
+import logging, logging_config
+logging_config.setup_logging()
+logging.getLogger('prova').warning('messaggio')
+thread_originale = patcher.original('threading').Thread
+assert isinstance(logging_config._listener._thread, thread_originale), type(logging_config._listener._thread)
+assert type(logging_config._queue_handler.queue) is patcher.original('queue').Queue
+logging_config.stop_logging()
+'''
+    risultato = subprocess.run([sys.executable, '-c', codice], cwd=ROOT_DIR, capture_output=True, text=True,
+                               timeout=60)
+    assert risultato.returncode == 0, risultato.stderr
+    assert 'messaggio' in risultato.stderr
@@ -0,0 +1,58 @@
+import time
+
+import pytest
+from werkzeug.http import http_date
+
+
+@pytest.fixture
+def categoria(applicazione, admin):
+    """Aggiunge una categoria (cambia la versione del menu) e la rimuove a fine test"""
+    creati = []
+
+    def aggiungi(nome):
+        risposta = admin.post('/api/categorie', json={'nome': nome})
+        assert risposta.status_code == 200
+        creati.append(risposta.get_json()['id'])
+
+    yield aggiungi
+    for categoria_id in creati:
+        admin.delete(f'/api/categorie/{categoria_id}')
+
+
+def test_etag_304_fino_alla_modifica(applicazione, categoria):
+    client = applicazione.app.test_client()
+    prima = client.get('/api/prodotti')
+    assert prima.status_code == 200
+    etag = prima.headers['ETag']
+
+    ripetuta = client.get('/api/prodotti', headers={'If-None-Match': etag})
+    assert ripetuta.status_code == 304
+    assert ripetuta.headers['ETag'] == etag
+
+    categoria('Categoria per ETag')
+    dopo = client.get('/api/prodotti', headers={'If-None-Match': etag})
+    assert dopo.status_code == 200
+    assert dopo.headers['ETag'] != etag
+
+
+def test_if_modified_since_nello_stesso_secondo(applicazione, categoria, monkeypatch):
+    orologio = [float(int(time.time())) + 0.2]
+    monkeypatch.setattr(time, 'time', lambda: orologio[0])
+    client = applicazione.app.test_client()
+
+    categoria('Prima modifica nel secondo')
+    risposta = client.get('/api/prodotti')
+    # Il secondo della modifica non è concluso: niente Last-Modified
+    assert 'Last-Modified' not in risposta.headers
+    stessa_data = {'If-Modified-Since': http_date(int(orologio[0]))}
+
+    # Seconda modifica nello stesso secondo: la data del client non basta per il 304
+    orologio[0] += 0.5
+    categoria('Seconda modifica nel secondo')
+    assert client.get('/api/prodotti', headers=stessa_data).status_code == 200
+
+    # A secondo concluso Last-Modified torna e If-Modified-Since vale di nuovo
+    orologio[0] += 1
+    risposta = client.get('/api/prodotti')
+    assert risposta.headers['Last-Modified'] == stessa_data['If-Modified-Since']
+    assert client.get('/api/prodotti', headers=stessa_data).status_code == 304
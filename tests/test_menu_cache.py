@@ -0,0 +1,24 @@
+import threading
+
+from menu_cache import MenuSnapshotCache
+
+
+def test_contatori_coerenti_con_accessi_concorrenti():
+    cache = MenuSnapshotCache()
+    thread_count, accessi = 8, 2000
+
+    def lettore():
+        for i in range(accessi):
+            cache.get('it', i % 10, lambda: {'prodotti': []})
+            cache.get_derivato('it', i % 10, 'json', lambda: {'prodotti': []}, str)
+
+    threads = [threading.Thread(target=lettore) for _ in range(thread_count)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    stats = cache.stats()
+    # get_derivato conta un hit quando il derivato è già nella snapshot, altrimenti passa da _get
+    assert stats['hit'] + stats['miss'] == 2 * thread_count * accessi
+    assert stats['miss'] == 10
@@ -0,0 +1,141 @@
+import json
+
+import pytest
+
+from menu_read_model import rebuild_read_model
+from menu_search import rebuild_search_index
+
+
+def _righe(conn):
+    modello = conn.execute('SELECT * FROM menu_read_model ORDER BY lingua, prodotto_id').fetchall()
+    ricerca = conn.execute('SELECT rowid, * FROM menu_ricerca ORDER BY rowid').fetchall()
+    return modello, ricerca
+
+
+def assert_allineato(applicazione):
+    """Il modello mantenuto dai trigger è identico a quello ricostruito da zero"""
+    with applicazione.db_pool.connection() as conn:
+        dai_trigger = _righe(conn)
+        rebuild_read_model(conn)
+        rebuild_search_index(conn)
+        assert _righe(conn) == dai_trigger
+
+
+def _riga(applicazione, prodotto_id, lingua='it'):
+    with applicazione.db_pool.connection() as conn:
+        return conn.execute('''
+            SELECT nome, categoria_id, categoria_parent_id, categoria_nome, categoria_genitore_nome,
+                   allergeni_json, ingredienti_json, allergeni_maschera
+            FROM menu_read_model WHERE prodotto_id = ? AND lingua = ?
+        ''', (prodotto_id, lingua)).fetchone()
+
+
+def _esegui(applicazione, sql, parametri=()):
+    with applicazione.db_pool.connection() as conn:
+        conn.execute(sql, parametri)
+        conn.commit()
+
+
+@pytest.fixture
+def menu(applicazione, admin):
+    """Due categorie principali, una sottocategoria e un prodotto con allergene e ingrediente"""
+    def crea(url, dati):
+        risposta = admin.post(url, json=dati)
+        assert risposta.status_code == 200, risposta.get_data(as_text=True)
+        return risposta.get_json()['id']
+
+    dati = {
+        'primi': crea('/api/categorie', {'nome': 'Primi di prova'}),
+        'secondi': crea('/api/categorie', {'nome': 'Secondi di prova'}),
+        'allergene': crea('/api/allergeni', {'nome': 'Allergene modello', 'icona': 'A'}),
+        'ingrediente': crea('/api/ingredienti', {'nome': 'Ingrediente modello', 'icona': 'I'}),
+    }
+    dati['pasta'] = crea('/api/categorie', {'nome': 'Pasta fresca', 'parent_id': dati['primi']})
+    risposta = admin.post('/api/menu', data={
+        'nome': 'Tagliatelle al ragù', 'descrizione': 'Fatte a mano', 'prezzo': '12',
+        'categoria_id': str(dati['pasta']), 'disponibile': 'true',
+        'allergeni': json.dumps([dati['allergene']]), 'ingredienti': json.dumps([dati['ingrediente']])
+    }, content_type='multipart/form-data')
+    assert risposta.status_code == 200
+    dati['prodotto'] = risposta.get_json()['id']
+    assert_allineato(applicazione)
+    yield dati
+
+    admin.delete(f"/api/menu/{dati['prodotto']}")
+    _esegui(applicazione, 'DELETE FROM prodotti_allergeni WHERE allergene_id = ?', (dati['allergene'],))
+    _esegui(applicazione, 'DELETE FROM prodotti_ingredienti WHERE ingrediente_id = ?', (dati['ingrediente'],))
+    admin.delete(f"/api/allergeni/{dati['allergene']}")
+    admin.delete(f"/api/ingredienti/{dati['ingrediente']}")
+    for categoria in ('pasta', 'primi', 'secondi'):
+        admin.delete(f"/api/categorie/{dati[categoria]}")
+
+
+def test_aggiornamento_prodotto(applicazione, admin, menu):
+    # PUT /api/gestione-prodotti scrive colonne che prodotti non ha: aggiornamento diretto
+    _esegui(applicazione, '''
+        UPDATE prodotti SET nome = ?, descrizione = ?, prezzo = ?, categoria_id = ? WHERE id = ?
+    ''', ('Tagliatelle al ragù bianco', 'Senza pomodoro', 13, menu['secondi'], menu['prodotto']))
+    riga = _riga(applicazione, menu['prodotto'])
+    assert riga[0] == 'Tagliatelle al ragù bianco'
+    assert riga[1:5] == (menu['secondi'], None, 'Secondi di prova', None)
+    assert_allineato(applicazione)
+
+    # L'eliminazione dall'endpoint disattiva il prodotto e lo toglie dal modello
+    assert admin.delete(f"/api/menu/{menu['prodotto']}").status_code == 200
+    assert _riga(applicazione, menu['prodotto']) is None
+    assert_allineato(applicazione)
+
+
+def test_collegamenti_allergeni_e_ingredienti(applicazione, menu):
+    assert _riga(applicazione, menu['prodotto'])[7] == 1 << menu['allergene']
+
+    _esegui(applicazione, 'DELETE FROM prodotti_allergeni WHERE prodotto_id = ?', (menu['prodotto'],))
+    _esegui(applicazione, 'DELETE FROM prodotti_ingredienti WHERE prodotto_id = ?', (menu['prodotto'],))
+    riga = _riga(applicazione, menu['prodotto'])
+    assert (json.loads(riga[5]), json.loads(riga[6]), riga[7]) == ([], [], 0)
+    assert_allineato(applicazione)
+
+    _esegui(applicazione, 'INSERT INTO prodotti_allergeni (prodotto_id, allergene_id) VALUES (?, ?)',
+            (menu['prodotto'], menu['allergene']))
+    _esegui(applicazione, 'INSERT INTO prodotti_ingredienti (prodotto_id, ingrediente_id) VALUES (?, ?)',
+            (menu['prodotto'], menu['ingrediente']))
+    assert json.loads(_riga(applicazione, menu['prodotto'])[6]) == ['Ingrediente modello']
+    assert_allineato(applicazione)
+
+
+def test_rinomina_e_spostamento_categorie(applicazione, admin, menu):
+    assert admin.put(f"/api/categorie/{menu['pasta']}",
+                     json={'nome': 'Pasta all\'uovo', 'parent_id': menu['primi']}).status_code == 200
+    assert admin.put(f"/api/categorie/{menu['primi']}", json={'nome': 'Primi piatti'}).status_code == 200
+    assert _riga(applicazione, menu['prodotto'])[3:5] == ('Pasta all\'uovo', 'Primi piatti')
+    assert_allineato(applicazione)
+
+    # Spostata sotto un'altra categoria principale
+    assert admin.put(f"/api/categorie/{menu['pasta']}",
+                     json={'nome': 'Pasta all\'uovo', 'parent_id': menu['secondi']}).status_code == 200
+    assert _riga(applicazione, menu['prodotto'])[2:5] == (menu['secondi'], 'Pasta all\'uovo', 'Secondi di prova')
+    assert_allineato(applicazione)
+
+
+def test_rinomina_allergeni_e_ingredienti(applicazione, admin, menu):
+    assert admin.put(f"/api/allergeni/{menu['allergene']}",
+                     json={'nome': 'Allergene rinominato', 'icona': 'R'}).status_code == 200
+    assert admin.put(f"/api/ingredienti/{menu['ingrediente']}",
+                     json={'nome': 'Ingrediente rinominato', 'icona': 'R'}).status_code == 200
+    riga = _riga(applicazione, menu['prodotto'])
+    assert json.loads(riga[5])[0]['nome'] == 'Allergene rinominato'
+    assert json.loads(riga[6]) == ['Ingrediente rinominato']
+    assert_allineato(applicazione)
+
+
+def test_eliminazione_allergeni_e_ingredienti(applicazione, admin, menu):
+    # Gli endpoint rifiutano l'eliminazione se ci sono prodotti collegati
+    assert admin.delete(f"/api/allergeni/{menu['allergene']}").status_code == 400
+    assert admin.delete(f"/api/ingredienti/{menu['ingrediente']}").status_code == 400
+
+    # Eliminati direttamente (es. manutenzione): i collegamenti orfani non compaiono nel menu
+    _esegui(applicazione, 'DELETE FROM allergeni WHERE id = ?', (menu['allergene'],))
+    _esegui(applicazione, 'DELETE FROM ingredienti WHERE id = ?', (menu['ingrediente'],))
+    riga = _riga(applicazione, menu['prodotto'])
+    assert (json.loads(riga[5]), json.loads(riga[6]), riga[7]) == ([], [], 0)
+    assert_allineato(applicazione)
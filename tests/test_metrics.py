@@ -0,0 +1,31 @@
+import instrumentation
+
+
+def test_metrics_solo_da_loopback_senza_token(applicazione, monkeypatch):
+    monkeypatch.setattr(instrumentation, 'METRICS_TOKEN', None)
+    client = applicazione.app.test_client()
+
+    assert client.get('/metrics').status_code == 200
+    assert client.get('/metrics', environ_base={'REMOTE_ADDR': '203.0.113.7'}).status_code == 404
+    # Inoltrata da nginx: il client reale non è locale
+    assert client.get('/metrics', headers={'X-Forwarded-For': '203.0.113.7'}).status_code == 404
+
+
+def test_metrics_con_token(applicazione, monkeypatch):
+    monkeypatch.setattr(instrumentation, 'METRICS_TOKEN', 'segreto')
+    client = applicazione.app.test_client()
+    remoto = {'REMOTE_ADDR': '203.0.113.7'}
+
+    assert client.get('/metrics').status_code == 404
+    assert client.get('/metrics', headers={'Authorization': 'Bearer altro'}).status_code == 401
+    risposta = client.get('/metrics', headers={'Authorization': 'Bearer segreto'}, environ_base=remoto)
+    assert risposta.status_code == 200
+    assert b'ristorante_db_pool_connessioni' in risposta.data
+
+
+def test_metrics_header_non_ascii(applicazione, monkeypatch):
+    monkeypatch.setattr(instrumentation, 'METRICS_TOKEN', 'segreto')
+    client = applicazione.app.test_client()
+
+    risposta = client.get('/metrics', headers={'Authorization': 'Bearer s\xe9greto'})
+    assert risposta.status_code == 401
@@ -0,0 +1,20 @@
+from database import ConnectionPool
+from schema_migrations import (QUERY_INDICIZZATE, available_migrations, check_query_plans, current_version,
+                               run_migrations)
+
+
+def test_query_calde_usano_gli_indici(applicazione, tmp_path, monkeypatch):
+    # Database nuovo: tabelle di init_db, poi tutte le migrazioni da zero
+    pool = ConnectionPool(str(tmp_path / 'nuovo.db'), pool_size=1)
+    monkeypatch.setattr(applicazione, 'db_pool', pool)
+    applicazione.init_db()
+
+    with pool.connection() as conn:
+        assert current_version(conn) == available_migrations()[-1][0]
+        assert run_migrations(conn) == []
+        for descrizione, query, params, indice in QUERY_INDICIZZATE:
+            piano = ' | '.join(row[-1] for row in conn.execute(f'EXPLAIN QUERY PLAN {query}', params))
+            assert indice in piano, f"{descrizione}: {piano}"
+            assert 'SCAN' not in piano, f"{descrizione}: {piano}"
+        assert check_query_plans(conn) == []
+    pool.close_all()
@@ -0,0 +1,101 @@
+import asyncio
+import importlib.util
+import os
+import queue
+import socket
+import threading
+import time
+import uuid
+
+import pytest
+import socketio
+from werkzeug.serving import make_server
+
+from socketio_backend import InProcessManager, crea_client_manager
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _emit_tra_worker(manager_a, manager_b):
+    """
+    Due server Socket.IO come due worker separati: l'emit del primo deve
+    raggiungere un client collegato (via HTTP) solo al secondo.
+    """
+    worker_a = socketio.Server(async_mode='threading', client_manager=manager_a)
+    worker_b = socketio.Server(async_mode='threading', client_manager=manager_b)
+    http_b = make_server('127.0.0.1', 0, socketio.WSGIApp(worker_b), threaded=True)
+    threading.Thread(target=http_b.serve_forever, daemon=True).start()
+
+    ricevuti = queue.Queue()
+    ospite = socketio.Client()
+    ospite.on('menu_aggiornato', ricevuti.put)
+    try:
+        ospite.connect(f'http://127.0.0.1:{http_b.server_port}', transports=['polling'])
+        # Il listener del secondo worker può impiegare un attimo a iscriversi al canale
+        scadenza = time.monotonic() + 5
+        while time.monotonic() < scadenza:
+            worker_a.emit('menu_aggiornato', {'versione': 42})
+            try:
+                return ricevuti.get(timeout=0.3)
+            except queue.Empty:
+                pass
+        return None
+    finally:
+        ospite.disconnect()
+        http_b.shutdown()
+
+
+def test_memory_condivide_il_canale_tra_server():
+    canale = f'test-{uuid.uuid4().hex}'
+    manager_a = crea_client_manager('memory://', channel=canale)
+    manager_b = crea_client_manager('memory://', channel=canale)
+    try:
+        assert _emit_tra_worker(manager_a, manager_b) == {'versione': 42}
+    finally:
+        manager_a.chiudi()
+        manager_b.chiudi()
+    assert canale not in InProcessManager._canali
+
+
+def test_memory_registra_la_coda_solo_in_ascolto():
+    canale = f'test-{uuid.uuid4().hex}'
+    manager = InProcessManager(channel=canale)
+    # Senza un server avviato nessuna coda resta iscritta al canale
+    assert canale not in InProcessManager._canali
+    manager._publish({'method': 'emit'})
+    assert manager._coda.empty()
+    manager.chiudi()
+
+
+@pytest.fixture
+def redis_locale():
+    """Avvia tools/redis_locale.py su una porta libera in un thread"""
+    pytest.importorskip('redis')
+    spec = importlib.util.spec_from_file_location('redis_locale', os.path.join(ROOT, 'tools', 'redis_locale.py'))
+    modulo = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(modulo)
+
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        porta = sock.getsockname()[1]
+    loop = asyncio.new_event_loop()
+    pronto = threading.Event()
+
+    async def avvia():
+        listener = await asyncio.start_server(modulo.ServerPubSub().gestisci, '127.0.0.1', porta)
+        pronto.set()
+        async with listener:
+            await listener.serve_forever()
+
+    thread = threading.Thread(target=lambda: loop.run_until_complete(avvia()), daemon=True)
+    thread.start()
+    assert pronto.wait(5)
+    yield f'redis://127.0.0.1:{porta}/0'
+    loop.call_soon_threadsafe(loop.stop)
+
+
+def test_redis_locale_condivide_il_canale_tra_server(redis_locale):
+    canale = f'test-{uuid.uuid4().hex}'
+    manager_a = crea_client_manager(redis_locale, channel=canale)
+    manager_b = crea_client_manager(redis_locale, channel=canale)
+    assert _emit_tra_worker(manager_a, manager_b) == {'versione': 42}
@@ -0,0 +1,41 @@
+from database import get_db
+from translation_service import TranslationCache
+
+
+def _ultimo_uso(applicazione, testo):
+    with applicazione.db_pool.connection() as conn:
+        return conn.execute('SELECT ultimo_uso FROM traduzioni_cache WHERE testo = ?', (testo,)).fetchone()[0]
+
+
+def test_la_cache_non_committa_la_transazione_della_richiesta(applicazione):
+    TranslationCache().set('Basilico fresco', 'it', 'en', 'Fresh basil', 'gtx')
+    cache = TranslationCache()
+    with applicazione.app.app_context():
+        conn = get_db()
+        conn.execute("UPDATE ingredienti SET icona = 'X' WHERE nome = 'Basilico'")
+        assert cache.get('Basilico fresco', 'it', 'en') == 'Fresh basil'
+        conn.rollback()
+
+    with applicazione.db_pool.connection() as conn:
+        assert conn.execute("SELECT icona FROM ingredienti WHERE nome = 'Basilico'").fetchone()[0] != 'X'
+
+
+def test_ultimo_uso_scritto_a_blocchi(applicazione):
+    cache = TranslationCache()
+    cache.set('Polpo alla griglia', 'it', 'en', 'Grilled octopus', 'gtx')
+    with applicazione.db_pool.connection() as conn:
+        conn.execute("UPDATE traduzioni_cache SET ultimo_uso = 1 WHERE testo = 'Polpo alla griglia'")
+        conn.commit()
+
+    # Una nuova istanza (es. dopo un riavvio) legge dal database senza scriverci
+    cache = TranslationCache()
+    assert cache.get('Polpo alla griglia', 'it', 'en') == 'Grilled octopus'
+    assert cache.stats()['hit_db'] == 1
+    assert cache.stats()['usi_da_scrivere'] == 1
+    assert _ultimo_uso(applicazione, 'Polpo alla griglia') == 1
+
+    # La scrittura successiva porta con sé gli usi accumulati
+    cache.USAGE_FLUSH_SIZE = 1
+    cache.set('Polpo in umido', 'it', 'en', 'Stewed octopus', 'gtx')
+    assert cache.stats()['usi_da_scrivere'] == 0
+    assert _ultimo_uso(applicazione, 'Polpo alla griglia') > 1
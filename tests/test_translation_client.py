@@ -0,0 +1,154 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from translation_client import CircuitOpenError, ConcurrencyLimitError, TranslationHttpClient
+from translation_service import TranslationService
+
+
+class StubProvider(BaseHTTPRequestHandler):
+    """Risponde come l'endpoint gtx secondo la modalità impostata sul server"""
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.richieste += 1
+        if server.modalita == 'lento':
+            server.sblocca.wait(5)
+        if server.modalita == 'errore':
+            self.send_response(503)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        corpo = json.dumps([[['Stub translation', 'Testo', None, None]]]).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(corpo)))
+        self.end_headers()
+        self.wfile.write(corpo)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stub():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubProvider)
+    server.daemon_threads = True
+    server.lock = threading.Lock()
+    server.richieste = 0
+    server.modalita = 'ok'
+    server.sblocca = threading.Event()
+    server.url = f'http://127.0.0.1:{server.server_address[1]}/translate_a/single'
+    thread = threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True)
+    thread.start()
+    yield server
+    server.sblocca.set()
+    server.shutdown()
+    server.server_close()
+
+
+def _client(**kwargs):
+    opzioni = dict(timeout=2, retries=0, backoff=0, breaker_threshold=2, breaker_cooldown=0.2)
+    opzioni.update(kwargs)
+    return TranslationHttpClient(**opzioni)
+
+
+def test_errori_transitori_ritentati(stub):
+    stub.modalita = 'errore'
+    client = _client(retries=2)
+
+    assert client.get('gtx', stub.url).status_code == 503
+    # Una chiamata più due retry di urllib3, ma una sola osservazione e un solo errore
+    assert stub.richieste == 3
+    stats = client.stats()['provider']['gtx']
+    assert (stats['chiamate'], stats['errori']) == (1, 1)
+    assert stats['circuit_breaker']['errori_consecutivi'] == 1
+
+
+def test_circuit_breaker_salta_e_si_richiude(stub):
+    stub.modalita = 'errore'
+    client = _client()
+
+    client.get('gtx', stub.url)
+    assert client.stats()['provider']['gtx']['circuit_breaker']['stato'] == 'chiuso'
+    client.get('gtx', stub.url)
+    assert client.stats()['provider']['gtx']['circuit_breaker']['stato'] == 'aperto'
+    assert not client.available('gtx')
+
+    # Aperto: la chiamata viene saltata senza raggiungere il provider
+    with pytest.raises(CircuitOpenError):
+        client.get('gtx', stub.url)
+    assert stub.richieste == 2
+
+    # Trascorso il cooldown passa una prova: se fallisce il circuito si riapre
+    time.sleep(0.25)
+    assert client.stats()['provider']['gtx']['circuit_breaker']['stato'] == 'semi_aperto'
+    client.get('gtx', stub.url)
+    assert client.stats()['provider']['gtx']['circuit_breaker']['stato'] == 'aperto'
+
+    # Se la prova va a buon fine il circuito si richiude
+    time.sleep(0.25)
+    stub.modalita = 'ok'
+    assert client.get('gtx', stub.url).status_code == 200
+    breaker = client.stats()['provider']['gtx']['circuit_breaker']
+    assert (breaker['stato'], breaker['errori_consecutivi']) == ('chiuso', 0)
+    assert (breaker['aperture'], breaker['chiamate_saltate']) == (2, 1)
+    assert stub.richieste == 4
+
+
+def test_limite_di_chiamate_contemporanee(stub):
+    stub.modalita = 'lento'
+    client = _client(max_concurrency=1)
+    risposte = []
+    in_corso = threading.Thread(target=lambda: risposte.append(client.get('gtx', stub.url)))
+    in_corso.start()
+    while client.stats()['chiamate_in_corso'] == 0:
+        time.sleep(0.01)
+
+    with pytest.raises(ConcurrencyLimitError):
+        client.get('gtx', stub.url, timeout=0.1)
+
+    stub.sblocca.set()
+    in_corso.join(5)
+    assert risposte[0].status_code == 200
+    # La chiamata rifiutata non raggiunge il provider e non conta per il breaker
+    assert stub.richieste == 1
+    stats = client.stats()
+    assert stats['chiamate_in_corso'] == 0
+    assert stats['provider']['gtx']['chiamate'] == 1
+    assert stats['provider']['gtx']['circuit_breaker']['stato'] == 'chiuso'
+
+
+def test_istogramma_delle_latenze(stub):
+    client = _client()
+    for _ in range(3):
+        client.get('gtx', stub.url)
+    stub.modalita = 'errore'
+    client.get('gtx', stub.url)
+
+    stats = client.stats()['provider']['gtx']
+    assert (stats['chiamate'], stats['errori']) == (4, 1)
+    conteggi = [bucket['conteggio'] for bucket in stats['bucket']]
+    assert conteggi == sorted(conteggi)
+    assert stats['bucket'][-1] == {'le': '+Inf', 'conteggio': 4}
+    assert stats['p50_s'] is not None and stats['latenza_totale_s'] > 0
+
+
+def test_servizio_di_traduzione_usa_lo_stub(applicazione, stub):
+    service = TranslationService()
+    service.api_key = None
+    service.gtx_url = stub.url
+    service.http = _client()
+
+    assert service.translate_text('Testo per lo stub') == 'Stub translation'
+    assert stub.richieste == 1
+    # Circuito aperto: il servizio non chiama il provider e restituisce l'originale
+    stub.modalita = 'errore'
+    assert service.translate_text('Altro testo per lo stub') == 'Altro testo per lo stub'
+    assert service.translate_text('Terzo testo per lo stub') == 'Terzo testo per lo stub'
+    assert service.translate_text('Quarto testo per lo stub') == 'Quarto testo per lo stub'
+    assert stub.richieste == 3
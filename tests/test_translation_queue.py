@@ -0,0 +1,100 @@
+import types
+
+import pytest
+import requests
+
+from translation_client import TranslationHttpClient
+
+from translation_queue import TranslationQueue
+from translation_service import TranslationService
+
+
+class ProviderNonRaggiungibile:
+    """Client HTTP che fallisce ogni chiamata ai provider"""
+
+    def available(self, provider):
+        return True
+
+    def get(self, provider, url, **kwargs):
+        raise requests.ConnectionError('provider non raggiungibile')
+
+    post = get
+
+
+def _coda_con_provider_in_errore(max_attempts):
+    service = TranslationService()
+    service.api_key = None
+    service.http = ProviderNonRaggiungibile()
+    return service, TranslationQueue(service, max_attempts=max_attempts)
+
+
+def _lavoro(applicazione, job_id):
+    with applicazione.db_pool.connection() as conn:
+        return conn.execute('SELECT stato, tentativi, errore FROM traduzioni_coda WHERE id = ?',
+                            (job_id,)).fetchone()
+
+
+def test_errore_del_provider_ritenta_e_poi_fallisce(applicazione):
+    with applicazione.db_pool.connection() as conn:
+        prodotto_id = conn.execute("INSERT INTO prodotti (nome, prezzo) VALUES ('Crostata di visciole', 5)").lastrowid
+        conn.commit()
+    service, coda = _coda_con_provider_in_errore(max_attempts=2)
+
+    # Un'altra chiamata fuori dalla coda ha già memorizzato il testo originale
+    assert service.translate_text('Crostata di visciole') == 'Crostata di visciole'
+
+    job_id = coda.enqueue('prodotti', prodotto_id, 'Crostata di visciole')
+    with applicazione.db_pool.connection() as conn:
+        # Solo il lavoro di questo test (gli endpoint usati da altri test accodano traduzioni)
+        conn.execute('DELETE FROM traduzioni_coda WHERE id != ?', (job_id,))
+        conn.commit()
+    assert coda.process_pending() == 1
+    stato, tentativi, errore = _lavoro(applicazione, job_id)
+    assert (stato, tentativi) == ('in_attesa', 1)
+    assert 'Crostata di visciole' in errore
+
+    # Salta il backoff e riesegue: raggiunto max_attempts il lavoro resta in errore
+    with applicazione.db_pool.connection() as conn:
+        conn.execute('UPDATE traduzioni_coda SET eseguibile_da = 0 WHERE id = ?', (job_id,))
+        conn.commit()
+    assert coda.process_pending() == 1
+    assert _lavoro(applicazione, job_id)[:2] == ('errore', 2)
+    assert coda.process_pending() == 0
+
+    stats = coda.stats()
+    assert stats['tentativi_ripetuti'] == 1
+    assert stats['falliti'] == 1
+    assert stats['completati'] == 0
+
+    # Il testo italiano non finisce nella colonna inglese
+    with applicazione.db_pool.connection() as conn:
+        assert conn.execute('SELECT nome_en FROM prodotti WHERE id = ?', (prodotto_id,)).fetchone()[0] is None
+
+
+def test_translate_text_senza_coda_restituisce_il_testo_originale():
+    service, _ = _coda_con_provider_in_errore(max_attempts=1)
+    assert service.translate_text('Tortelli di zucca') == 'Tortelli di zucca'
+
+
+def test_solo_la_chiamata_http_passa_dall_esecutore():
+    client = TranslationHttpClient()
+    chiamate = []
+
+    def esecutore(func, *args, **kwargs):
+        chiamate.append(func)
+        return types.SimpleNamespace(status_code=200)
+
+    client.esecutore = esecutore
+    assert client.get('gtx', 'http://127.0.0.1:9/').status_code == 200
+    assert chiamate == [client.session.request]
+
+
+def test_con_eventlet_senza_monkey_patching_http_nel_tpool(applicazione):
+    eventlet = pytest.importorskip('eventlet')
+    from eventlet import tpool
+    service = TranslationService()
+    service.http = TranslationHttpClient()
+    socketio = types.SimpleNamespace(async_mode='eventlet', start_background_task=lambda *args: None)
+
+    TranslationQueue(service).start(socketio)
+    assert service.http.esecutore is tpool.execute
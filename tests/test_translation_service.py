@@ -0,0 +1,27 @@
+import database
+from database import ConnectionPool, DATABASE_PATH
+from translation_service import TranslationService
+
+
+def test_batch_translate_tables_rilascia_la_connessione(applicazione, monkeypatch):
+    # Con un pool da una connessione la traduzione deve poterne prelevare una
+    pool = ConnectionPool(DATABASE_PATH, pool_size=1, timeout=1)
+    monkeypatch.setattr(database, 'db_pool', pool)
+    with pool.connection() as conn:
+        conn.execute("UPDATE ingredienti SET nome_en = NULL WHERE nome = 'Mozzarella'")
+        conn.commit()
+
+    service = TranslationService()
+
+    def translate_batch(texts, target_lang='en'):
+        with pool.connection():
+            pass
+        return {t.strip(): t.strip().upper() for t in texts if t and t.strip()}
+
+    monkeypatch.setattr(service, 'translate_batch', translate_batch)
+    counts = service.batch_translate_tables(['ingredienti'])
+
+    assert counts['ingredienti'] >= 1
+    with pool.connection() as conn:
+        assert conn.execute("SELECT nome_en FROM ingredienti WHERE nome = 'Mozzarella'").fetchone()[0] == 'MOZZARELLA'
+    pool.close_all()
@@ -0,0 +1,119 @@
+"""
+Stand-in locale compatibile con Redis per provare il message queue di
+Socket.IO con più worker senza installare Redis.
+
+Implementa solo quello che serve al pub/sub di python-socketio (protocollo
+RESP2): PING, ECHO, SELECT, CLIENT, SUBSCRIBE, UNSUBSCRIBE, PUBLISH, QUIT.
+Nessuna persistenza, nessuna chiave: non usarlo in produzione.
+
+Uso:
+    python tools/redis_locale.py --porta 6390
+    SOCKETIO_MESSAGE_QUEUE=redis://127.0.0.1:6390/0 PORT=5001 python app.py
+    SOCKETIO_MESSAGE_QUEUE=redis://127.0.0.1:6390/0 PORT=5002 python app.py
+"""
+import argparse
+import asyncio
+import logging
+
+logger = logging.getLogger('redis_locale')
+
+
+def _bulk(valore):
+    if valore is None:
+        return b'$-1\r\n'
+    if isinstance(valore, str):
+        valore = valore.encode()
+    return b'$%d\r\n%s\r\n' % (len(valore), valore)
+
+
+def _array(elementi):
+    parti = [b'*%d\r\n' % len(elementi)]
+    for elemento in elementi:
+        parti.append(b':%d\r\n' % elemento if isinstance(elemento, int) else _bulk(elemento))
+    return b''.join(parti)
+
+
+class ServerPubSub:
+    def __init__(self):
+        # canale -> insieme di writer iscritti
+        self.iscritti = {}
+
+    async def _leggi_comando(self, reader):
+        riga = await reader.readline()
+        if not riga:
+            return None
+        if not riga.startswith(b'*'):
+            # Comando inline (es. "PING" da telnet)
+            return riga.strip().split()
+        argomenti = []
+        for _ in range(int(riga[1:])):
+            intestazione = await reader.readline()
+            lunghezza = int(intestazione[1:])
+            dato = await reader.readexactly(lunghezza + 2)
+            argomenti.append(dato[:-2])
+        return argomenti
+
+    async def gestisci(self, reader, writer):
+        canali = set()
+        try:
+            while True:
+                comando = await self._leggi_comando(reader)
+                if not comando:
+                    break
+                nome = comando[0].upper()
+                argomenti = comando[1:]
+
+                if nome == b'PING':
+                    writer.write(_bulk(argomenti[0]) if argomenti else b'+PONG\r\n')
+                elif nome == b'ECHO':
+                    writer.write(_bulk(argomenti[0]))
+                elif nome in (b'SELECT', b'CLIENT'):
+                    writer.write(b'+OK\r\n')
+                elif nome == b'SUBSCRIBE':
+                    for canale in argomenti:
+                        canali.add(canale)
+                        self.iscritti.setdefault(canale, set()).add(writer)
+                        writer.write(_array([b'subscribe', canale, len(canali)]))
+                elif nome == b'UNSUBSCRIBE':
+                    for canale in (argomenti or list(canali)):
+                        canali.discard(canale)
+                        self.iscritti.get(canale, set()).discard(writer)
+                        writer.write(_array([b'unsubscribe', canale, len(canali)]))
+                elif nome == b'PUBLISH':
+                    canale, messaggio = argomenti[0], argomenti[1]
+                    destinatari = list(self.iscritti.get(canale, ()))
+                    for destinatario in destinatari:
+                        destinatario.write(_array([b'message', canale, messaggio]))
+                    writer.write(b':%d\r\n' % len(destinatari))
+                elif nome == b'QUIT':
+                    writer.write(b'+OK\r\n')
+                    break
+                else:
+                    writer.write(b'-ERR comando non supportato: %s\r\n' % nome)
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            for canale in canali:
+                self.iscritti.get(canale, set()).discard(writer)
+            writer.close()
+
+
+async def main(host, porta):
+    server = ServerPubSub()
+    listener = await asyncio.start_server(server.gestisci, host, porta)
+    logger.info(f"Stand-in Redis in ascolto su {host}:{porta}")
+    async with listener:
+        await listener.serve_forever()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--porta', type=int, default=6390)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
+    try:
+        asyncio.run(main(args.host, args.porta))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,284 @@
+import os
+import time
+import logging
+import threading
+from typing import Callable, Dict, List, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+# Endpoint configurabili (es. per puntare ad uno stub server locale)
+TRANSLATION_GTX_URL = os.getenv('TRANSLATION_GTX_URL', 'https://translate.googleapis.com/translate_a/single')
+TRANSLATION_V2_URL = os.getenv('TRANSLATION_V2_URL', 'https://translation.googleapis.com/language/translate/v2')
+
+TRANSLATION_HTTP_POOL_SIZE = int(os.getenv('TRANSLATION_HTTP_POOL_SIZE', '10'))
+TRANSLATION_HTTP_MAX_CONCURRENCY = int(os.getenv('TRANSLATION_HTTP_MAX_CONCURRENCY', '4'))
+TRANSLATION_HTTP_TIMEOUT = float(os.getenv('TRANSLATION_HTTP_TIMEOUT', '10'))
+TRANSLATION_HTTP_RETRIES = int(os.getenv('TRANSLATION_HTTP_RETRIES', '2'))
+TRANSLATION_HTTP_BACKOFF = float(os.getenv('TRANSLATION_HTTP_BACKOFF', '0.5'))
+TRANSLATION_BREAKER_THRESHOLD = int(os.getenv('TRANSLATION_BREAKER_THRESHOLD', '5'))
+TRANSLATION_BREAKER_COOLDOWN = float(os.getenv('TRANSLATION_BREAKER_COOLDOWN', '60'))
+
+# Limiti superiori (secondi) dei bucket degli istogrammi di latenza
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class CircuitOpenError(Exception):
+    """Il circuit breaker del provider è aperto: la chiamata non viene eseguita"""
+
+
+class ConcurrencyLimitError(Exception):
+    """Troppe chiamate in corso verso i provider di traduzione"""
+
+
+class CircuitBreaker:
+    """
+    Dopo `threshold` errori consecutivi il provider viene saltato per `cooldown`
+    secondi; trascorso il cooldown passa una sola chiamata di prova (half-open)
+    che, se va a buon fine, richiude il circuito.
+    """
+
+    def __init__(self, name: str, threshold: int = 5, cooldown: float = 60.0):
+        self.name = name
+        self.threshold = max(1, threshold)
+        self.cooldown = cooldown
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._trial_in_progress = False
+        self._stats = {'aperture': 0, 'chiamate_saltate': 0}
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return 'chiuso'
+        if time.monotonic() - self._opened_at >= self.cooldown:
+            return 'semi_aperto'
+        return 'aperto'
+
+    def available(self) -> bool:
+        """True se una chiamata può essere tentata (senza prenotare la prova)"""
+        state = self.state
+        return state == 'chiuso' or (state == 'semi_aperto' and not self._trial_in_progress)
+
+    def before_call(self) -> None:
+        with self._lock:
+            state = self.state
+            if state == 'chiuso':
+                return
+            if state == 'semi_aperto' and not self._trial_in_progress:
+                self._trial_in_progress = True
+                return
+            self._stats['chiamate_saltate'] += 1
+        raise CircuitOpenError(f"Provider {self.name} temporaneamente disabilitato")
+
+    def cancel_call(self) -> None:
+        """La chiamata autorizzata da before_call non è stata eseguita"""
+        with self._lock:
+            self._trial_in_progress = False
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self._opened_at is not None:
+                logger.info(f"Circuit breaker {self.name} richiuso")
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_progress = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._trial_in_progress or (self._opened_at is None and self._failures >= self.threshold):
+                self._opened_at = time.monotonic()
+                self._stats['aperture'] += 1
+                logger.warning(f"Circuit breaker {self.name} aperto dopo {self._failures} errori consecutivi")
+            self._trial_in_progress = False
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats['stato'] = self.state
+            stats['errori_consecutivi'] = self._failures
+        return stats
+
+
+class LatencyHistogram:
+    """Istogramma cumulativo delle latenze di un provider (stile Prometheus)"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._count = 0
+        self._sum = 0.0
+        self._errors = 0
+
+    def observe(self, seconds: float, ok: bool = True) -> None:
+        with self._lock:
+            index = len(self.buckets)
+            for i, limit in enumerate(self.buckets):
+                if seconds <= limit:
+                    index = i
+                    break
+            self._counts[index] += 1
+            self._count += 1
+            self._sum += seconds
+            if not ok:
+                self._errors += 1
+
+    def _quantile(self, q: float) -> Optional[float]:
+        """Stima del quantile come limite superiore del bucket che lo contiene"""
+        if not self._count:
+            return None
+        target = q * self._count
+        cumulative = 0
+        for i, count in enumerate(self._counts):
+            cumulative += count
+            if cumulative >= target:
+                return self.buckets[i] if i < len(self.buckets) else float('inf')
+        return float('inf')
+
+    def stats(self) -> Dict:
+        with self._lock:
+            cumulative = 0
+            buckets: List[Dict] = []
+            for limit, count in zip(list(self.buckets) + ['+Inf'], self._counts):
+                cumulative += count
+                buckets.append({'le': limit, 'conteggio': cumulative})
+            return {
+                'chiamate': self._count,
+                'errori': self._errors,
+                'latenza_totale_s': self._sum,
+                'latenza_media_ms': (self._sum / self._count * 1000) if self._count else 0.0,
+                'p50_s': self._quantile(0.5),
+                'p95_s': self._quantile(0.95),
+                'p99_s': self._quantile(0.99),
+                'bucket': buckets
+            }
+
+
+class TranslationHttpClient:
+    """
+    Client HTTP condiviso per le chiamate ai provider di traduzione.
+    Una requests.Session con pool keep-alive evita un nuovo handshake TCP+TLS
+    per ogni testo; un semaforo limita le chiamate contemporanee, urllib3
+    ritenta gli errori transitori con backoff e un circuit breaker per provider
+    salta l'endpoint dopo errori ripetuti.
+    """
+
+    # Errori transitori ritentati da urllib3
+    RETRY_STATUS = (429, 500, 502, 503, 504)
+
+    def __init__(self, pool_size: int = 10, max_concurrency: int = 4, timeout: float = 10.0,
+                 retries: int = 2, backoff: float = 0.5,
+                 breaker_threshold: int = 5, breaker_cooldown: float = 60.0):
+        self.timeout = timeout
+        self.max_concurrency = max(1, max_concurrency)
+        self.breaker_threshold = breaker_threshold
+        self.breaker_cooldown = breaker_cooldown
+
+        retry = Retry(
+            total=retries,
+            connect=retries,
+            read=retries,
+            status=retries,
+            backoff_factor=backoff,
+            status_forcelist=self.RETRY_STATUS,
+            allowed_methods=frozenset(['GET', 'POST']),
+            raise_on_status=False,
+            respect_retry_after_header=True
+        )
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=pool_size, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+        # Esegue la chiamata bloccante (es. eventlet.tpool.execute); None = nel chiamante
+        self.esecutore: Optional[Callable] = None
+        self._semaphore = threading.BoundedSemaphore(self.max_concurrency)
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._histograms: Dict[str, LatencyHistogram] = {}
+
+    def _breaker(self, provider: str) -> CircuitBreaker:
+        with self._lock:
+            if provider not in self._breakers:
+                self._breakers[provider] = CircuitBreaker(provider, self.breaker_threshold, self.breaker_cooldown)
+                self._histograms[provider] = LatencyHistogram()
+            return self._breakers[provider]
+
+    def available(self, provider: str) -> bool:
+        """False se il circuit breaker del provider è aperto"""
+        return self._breaker(provider).available()
+
+    def request(self, provider: str, method: str, url: str, **kwargs) -> requests.Response:
+        """
+        Esegue una chiamata verso un provider. Le risposte 5xx/429 residue dopo
+        i retry contano come errori per il circuit breaker, le 4xx no.
+        """
+        breaker = self._breaker(provider)
+        breaker.before_call()
+
+        kwargs.setdefault('timeout', self.timeout)
+        if not self._semaphore.acquire(timeout=kwargs['timeout']):
+            breaker.cancel_call()
+            raise ConcurrencyLimitError(
+                f"Limite di {self.max_concurrency} chiamate contemporanee raggiunto per {provider}"
+            )
+
+        with self._lock:
+            self._in_flight += 1
+        start = time.perf_counter()
+        ok = False
+        try:
+            if self.esecutore is not None:
+                response = self.esecutore(self.session.request, method, url, **kwargs)
+            else:
+                response = self.session.request(method, url, **kwargs)
+            ok = response.status_code < 500 and response.status_code != 429
+            return response
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self._in_flight -= 1
+            self._semaphore.release()
+            self._histograms[provider].observe(elapsed, ok)
+            if ok:
+                breaker.record_success()
+            else:
+                breaker.record_failure()
+
+    def get(self, provider: str, url: str, **kwargs) -> requests.Response:
+        return self.request(provider, 'GET', url, **kwargs)
+
+    def post(self, provider: str, url: str, **kwargs) -> requests.Response:
+        return self.request(provider, 'POST', url, **kwargs)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            providers = list(self._breakers.keys())
+            in_flight = self._in_flight
+        return {
+            'chiamate_in_corso': in_flight,
+            'concorrenza_massima': self.max_concurrency,
+            'provider': {
+                name: dict(self._histograms[name].stats(), circuit_breaker=self._breakers[name].stats())
+                for name in providers
+            }
+        }
+
+
+# Client globale condiviso dal servizio di traduzione
+translation_http = TranslationHttpClient(
+    pool_size=TRANSLATION_HTTP_POOL_SIZE,
+    max_concurrency=TRANSLATION_HTTP_MAX_CONCURRENCY,
+    timeout=TRANSLATION_HTTP_TIMEOUT,
+    retries=TRANSLATION_HTTP_RETRIES,
+    backoff=TRANSLATION_HTTP_BACKOFF,
+    breaker_threshold=TRANSLATION_BREAKER_THRESHOLD,
+    breaker_cooldown=TRANSLATION_BREAKER_COOLDOWN
+)
@@ -0,0 +1,266 @@
+import os
+import time
+import logging
+import threading
+from typing import Callable, Dict, List, Optional
+
+from database import db_connection
+from translation_service import translation_service, TranslationService
+
+logger = logging.getLogger(__name__)
+
+TRANSLATION_QUEUE_POLL_INTERVAL = float(os.getenv('TRANSLATION_QUEUE_POLL_INTERVAL', '5'))
+TRANSLATION_QUEUE_MAX_ATTEMPTS = int(os.getenv('TRANSLATION_QUEUE_MAX_ATTEMPTS', '5'))
+
+# Lavori rimasti "in_corso" oltre questo tempo sono considerati interrotti (es. riavvio)
+JOB_STALE_SECONDS = 600
+
+
+class TranslationQueue:
+    """
+    Coda dei lavori di traduzione, persistita nella tabella traduzioni_coda
+    (migrazione 0007).
+    Gli endpoint CRUD accodano il lavoro e rispondono subito; un task in
+    background esegue le traduzioni e notifica il completamento, così una
+    risposta lenta di Google Translate non blocca l'interfaccia admin.
+    I lavori sopravvivono ai riavvii perché restano nel database.
+    """
+
+    def __init__(self, service: TranslationService, poll_interval: float = 5.0, max_attempts: int = 5):
+        self.service = service
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self._wake = False
+        self._socketio = None
+        self._on_complete: Optional[Callable[[Dict, Dict[str, str]], None]] = None
+        self._handlers = {
+            'prodotti': service.translate_and_save_product,
+            'categorie': service.translate_and_save_category,
+            'allergeni': service.translate_and_save_allergen,
+            'ingredienti': service.translate_and_save_ingredient
+        }
+        self._lock = threading.Lock()
+        self._stats = {
+            'accodati': 0,
+            'completati': 0,
+            'falliti': 0,
+            'tentativi_ripetuti': 0
+        }
+
+    def _conta(self, chiave: str) -> None:
+        with self._lock:
+            self._stats[chiave] += 1
+
+    def enqueue(self, tabella: str, elemento_id: int, nome: str, descrizione: str = None) -> int:
+        """
+        Accoda la traduzione di un elemento e restituisce l'id del lavoro.
+        Se per lo stesso elemento c'è già un lavoro in attesa ne aggiorna i testi.
+        """
+        if tabella not in self._handlers:
+            raise ValueError(f"Tabella non traducibile: {tabella}")
+
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT id FROM traduzioni_coda
+                WHERE tabella = ? AND elemento_id = ? AND stato = 'in_attesa'
+            ''', (tabella, elemento_id))
+            existing = cursor.fetchone()
+
+            if existing:
+                job_id = existing[0]
+                cursor.execute('''
+                    UPDATE traduzioni_coda
+                    SET nome = ?, descrizione = ?, updated_at = CURRENT_TIMESTAMP
+                    WHERE id = ?
+                ''', (nome, descrizione, job_id))
+            else:
+                cursor.execute('''
+                    INSERT INTO traduzioni_coda (tabella, elemento_id, nome, descrizione, eseguibile_da)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', (tabella, elemento_id, nome, descrizione, time.time()))
+                job_id = cursor.lastrowid
+            conn.commit()
+
+        self._conta('accodati')
+        self._wake = True
+        return job_id
+
+    def _claim_next(self) -> Optional[Dict]:
+        """Prende in carico il prossimo lavoro eseguibile (atomico tra più processi)"""
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            now = time.time()
+            cursor.execute('''
+                SELECT id, tabella, elemento_id, nome, descrizione, tentativi
+                FROM traduzioni_coda
+                WHERE stato = 'in_attesa' AND eseguibile_da <= ?
+                ORDER BY id
+                LIMIT 1
+            ''', (now,))
+            row = cursor.fetchone()
+            if not row:
+                return None
+
+            cursor.execute('''
+                UPDATE traduzioni_coda
+                SET stato = 'in_corso', avviato_da = ?, updated_at = CURRENT_TIMESTAMP
+                WHERE id = ? AND stato = 'in_attesa'
+            ''', (now, row[0]))
+            conn.commit()
+            if cursor.rowcount == 0:
+                # Preso in carico da un altro worker
+                return None
+
+        return {
+            'id': row[0],
+            'tabella': row[1],
+            'elemento_id': row[2],
+            'nome': row[3],
+            'descrizione': row[4],
+            'tentativi': row[5]
+        }
+
+    def _finish(self, job: Dict, errore: Optional[str] = None) -> None:
+        with db_connection() as conn:
+            if errore is None:
+                conn.execute('''
+                    UPDATE traduzioni_coda
+                    SET stato = 'completato', errore = NULL, updated_at = CURRENT_TIMESTAMP
+                    WHERE id = ?
+                ''', (job['id'],))
+            else:
+                tentativi = job['tentativi'] + 1
+                if tentativi >= self.max_attempts:
+                    stato = 'errore'
+                    eseguibile_da = time.time()
+                else:
+                    # Backoff esponenziale: 2s, 4s, 8s, ...
+                    stato = 'in_attesa'
+                    eseguibile_da = time.time() + 2 ** tentativi
+                conn.execute('''
+                    UPDATE traduzioni_coda
+                    SET stato = ?, tentativi = ?, errore = ?, eseguibile_da = ?, updated_at = CURRENT_TIMESTAMP
+                    WHERE id = ?
+                ''', (stato, tentativi, errore, eseguibile_da, job['id']))
+            conn.commit()
+
+    def process_job(self, job: Dict) -> Optional[Dict[str, str]]:
+        """Esegue un lavoro già preso in carico"""
+        handler = self._handlers[job['tabella']]
+        try:
+            # Un errore del provider fa fallire il lavoro, che viene ritentato con backoff
+            translations = handler(job['elemento_id'], job['nome'], job['descrizione'], raise_on_error=True)
+        except Exception as e:
+            logger.warning(f"Lavoro di traduzione {job['id']} fallito: {e}")
+            self._finish(job, str(e))
+            if job['tentativi'] + 1 >= self.max_attempts:
+                self._conta('falliti')
+            else:
+                self._conta('tentativi_ripetuti')
+            return None
+
+        self._finish(job)
+        self._conta('completati')
+
+        if self._on_complete:
+            try:
+                self._on_complete(job, translations)
+            except Exception as e:
+                logger.error(f"Errore nella notifica del lavoro di traduzione {job['id']}: {e}")
+        return translations
+
+    def process_pending(self, limit: Optional[int] = None) -> int:
+        """Esegue in modo sincrono i lavori in attesa (es. da script di manutenzione)"""
+        processed = 0
+        while limit is None or processed < limit:
+            job = self._claim_next()
+            if job is None:
+                break
+            self.process_job(job)
+            processed += 1
+        return processed
+
+    def _requeue_stale(self) -> None:
+        with db_connection() as conn:
+            cursor = conn.execute('''
+                UPDATE traduzioni_coda
+                SET stato = 'in_attesa', updated_at = CURRENT_TIMESTAMP
+                WHERE stato = 'in_corso' AND avviato_da < ?
+            ''', (time.time() - JOB_STALE_SECONDS,))
+            conn.commit()
+            if cursor.rowcount:
+                logger.info(f"Rimessi in coda {cursor.rowcount} lavori di traduzione interrotti")
+
+    def start(self, socketio, on_complete: Optional[Callable[[Dict, Dict[str, str]], None]] = None):
+        """Avvia il worker della coda come task in background di Socket.IO"""
+        self._socketio = socketio
+        self._on_complete = on_complete
+        if socketio.async_mode == 'eventlet':
+            from eventlet import patcher, tpool
+            # Con il monkey patching le socket sono cooperative e tutto resta nel greenlet.
+            # Senza, solo la chiamata HTTP va nel threadpool nativo: database, pool e
+            # cache traduzioni restano nel greenlet con i loro lock
+            if not patcher.is_monkey_patched('socket'):
+                self.service.http.esecutore = tpool.execute
+        self._requeue_stale()
+
+        def _worker_loop():
+            last_poll = 0.0
+            while True:
+                # Il database viene interrogato subito dopo un enqueue locale,
+                # altrimenti ogni poll_interval per i lavori accodati da altri processi
+                if self._wake or time.time() - last_poll >= self.poll_interval:
+                    self._wake = False
+                    last_poll = time.time()
+                    try:
+                        self.process_pending()
+                    except Exception as e:
+                        logger.error(f"Errore nel worker della coda traduzioni: {e}")
+                socketio.sleep(0.25)
+
+        return socketio.start_background_task(_worker_loop)
+
+    _JOB_COLUMNS = 'id, tabella, elemento_id, stato, tentativi, errore, created_at, updated_at'
+
+    @staticmethod
+    def _row_to_job(row) -> Dict:
+        return {
+            'id': row[0],
+            'tabella': row[1],
+            'elemento_id': row[2],
+            'stato': row[3],
+            'tentativi': row[4],
+            'errore': row[5],
+            'created_at': row[6],
+            'updated_at': row[7]
+        }
+
+    def get_job(self, job_id: int) -> Optional[Dict]:
+        with db_connection() as conn:
+            row = conn.execute(f'SELECT {self._JOB_COLUMNS} FROM traduzioni_coda WHERE id = ?',
+                               (job_id,)).fetchone()
+        return self._row_to_job(row) if row else None
+
+    def recent_jobs(self, limit: int = 20) -> List[Dict]:
+        with db_connection() as conn:
+            rows = conn.execute(f'SELECT {self._JOB_COLUMNS} FROM traduzioni_coda ORDER BY id DESC LIMIT ?',
+                                (limit,)).fetchall()
+        return [self._row_to_job(row) for row in rows]
+
+    def stats(self) -> Dict[str, int]:
+        with db_connection() as conn:
+            counts = dict(conn.execute('SELECT stato, COUNT(*) FROM traduzioni_coda GROUP BY stato').fetchall())
+        with self._lock:
+            stats = dict(self._stats)
+        for stato in ('in_attesa', 'in_corso', 'completato', 'errore'):
+            stats[stato] = counts.get(stato, 0)
+        return stats
+
+
+# Istanza globale della coda
+translation_queue = TranslationQueue(
+    translation_service,
+    poll_interval=TRANSLATION_QUEUE_POLL_INTERVAL,
+    max_attempts=TRANSLATION_QUEUE_MAX_ATTEMPTS
+)
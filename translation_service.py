@@ -1,12 +1,17 @@
 import os
 import json
 import time
-import requests
-import sqlite3
+import hashlib
 import logging
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
 from typing import Optional, Dict, List, Tuple
 from datetime import datetime
 
+from database import db_connection, open_connection, DATABASE_PATH
+from translation_client import translation_http, TRANSLATION_GTX_URL, TRANSLATION_V2_URL
+
 try:
     from google.cloud import translate_v2 as translate
     GOOGLE_TRANSLATE_AVAILABLE = True
@@ -16,17 +21,238 @@ except ImportError:
 
 logger = logging.getLogger(__name__)
 
+TRANSLATION_CACHE_SIZE = int(os.getenv('TRANSLATION_CACHE_SIZE', '5000'))
+TRANSLATION_CACHE_TTL_DAYS = int(os.getenv('TRANSLATION_CACHE_TTL_DAYS', '180'))
+TRANSLATION_CACHE_MAX_ROWS = int(os.getenv('TRANSLATION_CACHE_MAX_ROWS', '50000'))
+
+
+class TranslationError(Exception):
+    """Nessun provider ha restituito una traduzione"""
+
+
+class TranslationCache:
+    """
+    Cache delle traduzioni su due livelli: LRU in memoria davanti alla tabella
+    traduzioni_cache, così le traduzioni sopravvivono ai riavvii e ai deploy.
+    Le righe sono indicizzate per hash del testo, lingua di origine, lingua di
+    destinazione e provider che ha prodotto la traduzione.
+    La tabella usa una connessione dedicata, fuori dal pool: le commit della
+    cache non toccano la transazione della richiesta in corso.
+    """
+    
+    # Ordine di preferenza quando lo stesso testo è stato tradotto da più provider
+    PROVIDER_PRIORITY = ('google_v2', 'gtx')
+    # ultimo_uso delle letture viene accumulato e scritto in un'unica transazione
+    # dalla prima set() successiva (le letture non scrivono mai)
+    USAGE_FLUSH_SIZE = 100
+    USAGE_FLUSH_INTERVAL = 60
+    
+    def __init__(self, max_size: int = 5000, ttl_days: int = 180, max_rows: int = 50000,
+                 db_path: str = DATABASE_PATH):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_days * 86400
+        self.max_rows = max_rows
+        self.db_path = db_path
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = None
+        self._db_lock = threading.Lock()
+        self._usage = {}
+        self._last_usage_flush = time.time()
+        self._writes_since_cleanup = 0
+        self._stats = {
+            'hit_memoria': 0,
+            'hit_db': 0,
+            'miss': 0,
+            'scritture': 0,
+            'evizioni_memoria': 0,
+            'righe_eliminate': 0,
+            'errori_db': 0
+        }
+    
+    @staticmethod
+    def text_hash(text: str) -> str:
+        return hashlib.sha256(text.encode('utf-8')).hexdigest()
+    
+    def _count(self, name: str, amount: int = 1) -> None:
+        with self._lock:
+            self._stats[name] += amount
+    
+    @contextmanager
+    def _connection(self):
+        """Connessione dedicata della cache (la tabella è creata dalla migrazione 0005)"""
+        with self._db_lock:
+            if self._conn is None:
+                self._conn = open_connection(self.db_path)
+            try:
+                yield self._conn
+            except Exception:
+                self._conn.rollback()
+                raise
+    
+    def _remember(self, key: Tuple[str, str, str], translation: str, provider: str) -> None:
+        with self._lock:
+            self._memory[key] = (translation, provider, time.time() + self.ttl_seconds)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_size:
+                self._memory.popitem(last=False)
+                self._stats['evizioni_memoria'] += 1
+    
+    def get(self, text: str, source_lang: str, target_lang: str, include_original: bool = True) -> Optional[str]:
+        """
+        Cerca una traduzione prima in memoria e poi nel database.
+        Con include_original=False il testo originale memorizzato dopo un
+        errore dei provider non conta come traduzione.
+        """
+        key = (text, source_lang, target_lang)
+        now = time.time()
+        
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and (include_original or entry[1] != 'originale'):
+                if entry[2] > now:
+                    self._memory.move_to_end(key)
+                    self._stats['hit_memoria'] += 1
+                    return entry[0]
+                del self._memory[key]
+        
+        try:
+            text_hash = self.text_hash(text)
+            with self._connection() as conn:
+                rows = conn.execute('''
+                    SELECT provider, traduzione FROM traduzioni_cache
+                    WHERE hash_testo = ? AND lingua_origine = ? AND lingua_destinazione = ?
+                    AND testo = ? AND created_at > ?
+                ''', (text_hash, source_lang, target_lang, text, int(now - self.ttl_seconds))).fetchall()
+            
+            if rows:
+                by_provider = dict(rows)
+                provider = next((p for p in self.PROVIDER_PRIORITY if p in by_provider), rows[0][0])
+                # Nessuna scrittura in lettura: ultimo_uso viene scritto da set() e cleanup()
+                with self._lock:
+                    self._usage[(text_hash, source_lang, target_lang, provider)] = int(now)
+                self._remember(key, by_provider[provider], provider)
+                self._count('hit_db')
+                return by_provider[provider]
+        except Exception as e:
+            self._count('errori_db')
+            logger.warning(f"Errore lettura cache traduzioni: {e}")
+        
+        self._count('miss')
+        return None
+    
+    def set(self, text: str, source_lang: str, target_lang: str, translation: str,
+            provider: str, persist: bool = True) -> None:
+        """
+        Memorizza una traduzione. Con persist=False resta solo in memoria
+        (dizionario locale o testo originale restituito dopo un errore).
+        """
+        self._remember((text, source_lang, target_lang), translation, provider)
+        if not persist:
+            return
+        
+        now = int(time.time())
+        try:
+            with self._connection() as conn:
+                conn.execute('''
+                    INSERT OR REPLACE INTO traduzioni_cache
+                    (hash_testo, lingua_origine, lingua_destinazione, provider, testo, traduzione, created_at, ultimo_uso)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ''', (self.text_hash(text), source_lang, target_lang, provider, text, translation, now, now))
+                conn.commit()
+            with self._lock:
+                self._stats['scritture'] += 1
+                self._writes_since_cleanup += 1
+                cleanup_due = self._writes_since_cleanup >= 500
+                usage_due = (len(self._usage) >= self.USAGE_FLUSH_SIZE or
+                             now - self._last_usage_flush >= self.USAGE_FLUSH_INTERVAL)
+            if cleanup_due:
+                self.cleanup()
+            elif usage_due:
+                self.flush_usage()
+        except Exception as e:
+            self._count('errori_db')
+            logger.warning(f"Errore scrittura cache traduzioni: {e}")
+    
+    def flush_usage(self) -> int:
+        """Scrive gli ultimo_uso accumulati dalle letture (persi solo in caso di arresto)"""
+        with self._lock:
+            usage, self._usage = self._usage, {}
+            self._last_usage_flush = time.time()
+        if not usage:
+            return 0
+        try:
+            with self._connection() as conn:
+                conn.executemany('''
+                    UPDATE traduzioni_cache SET ultimo_uso = MAX(ultimo_uso, ?)
+                    WHERE hash_testo = ? AND lingua_origine = ? AND lingua_destinazione = ? AND provider = ?
+                ''', [(used_at,) + row_key for row_key, used_at in usage.items()])
+                conn.commit()
+        except Exception as e:
+            self._count('errori_db')
+            logger.warning(f"Errore aggiornamento ultimo_uso della cache traduzioni: {e}")
+            return 0
+        return len(usage)
+    
+    def cleanup(self) -> int:
+        """Elimina le righe scadute e, oltre max_rows, quelle usate meno di recente"""
+        with self._lock:
+            self._writes_since_cleanup = 0
+        self.flush_usage()
+        deleted = 0
+        try:
+            with self._connection() as conn:
+                cursor = conn.execute('DELETE FROM traduzioni_cache WHERE created_at <= ?',
+                                      (int(time.time() - self.ttl_seconds),))
+                deleted += cursor.rowcount
+                cursor = conn.execute('''
+                    DELETE FROM traduzioni_cache WHERE rowid IN (
+                        SELECT rowid FROM traduzioni_cache ORDER BY ultimo_uso DESC LIMIT -1 OFFSET ?
+                    )
+                ''', (self.max_rows,))
+                deleted += cursor.rowcount
+                conn.commit()
+        except Exception as e:
+            self._count('errori_db')
+            logger.warning(f"Errore pulizia cache traduzioni: {e}")
+        self._count('righe_eliminate', deleted)
+        return deleted
+    
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats['voci_memoria'] = len(self._memory)
+            stats['usi_da_scrivere'] = len(self._usage)
+        hits = stats['hit_memoria'] + stats['hit_db']
+        total = hits + stats['miss']
+        stats['hit_ratio'] = hits / total if total else 0.0
+        return stats
+
 class TranslationService:
     """
     Servizio di traduzione che utilizza Google Translate API con sistema di fallback
     Salva le traduzioni direttamente nelle tabelle del database ristorante.db
     """
     
+    # Tabelle con colonne nome_en/descrizione_en gestite dal servizio
+    TRANSLATABLE_TABLES = ('prodotti', 'categorie', 'allergeni', 'ingredienti')
+    
+    # Limiti dell'API v2: 128 segmenti per richiesta, ~5000 caratteri consigliati
+    BATCH_MAX_SEGMENTS = 128
+    BATCH_MAX_CHARS = 5000
+    # Pausa tra chiamate all'endpoint gratuito per evitare rate limiting
+    BATCH_PAUSE = 0.1
+    
     def __init__(self):
-        self.db_path = 'ristorante.db'
         self.api_key = os.getenv('GOOGLE_TRANSLATE_API_KEY')
-        self.base_url = 'https://translation.googleapis.com/language/translate/v2'
-        self.cache = {}
+        self.base_url = TRANSLATION_V2_URL
+        self.gtx_url = TRANSLATION_GTX_URL
+        self.http = translation_http
+        self.cache = TranslationCache(
+            max_size=TRANSLATION_CACHE_SIZE,
+            ttl_days=TRANSLATION_CACHE_TTL_DAYS,
+            max_rows=TRANSLATION_CACHE_MAX_ROWS
+        )
         self.fallback_translations = {
             'it': {
                 'Pizza Margherita': 'Pizza Margherita',
@@ -90,51 +316,55 @@ class TranslationService:
             }
         }
     
-    def translate_text(self, text: str, target_lang: str = 'en') -> str:
-        """Traduce un testo usando Google Translate API o fallback"""
+    def translate_text(self, text: str, target_lang: str = 'en', raise_on_error: bool = False) -> str:
+        """
+        Traduce un testo usando Google Translate API o fallback.
+        Se nessun provider risponde restituisce il testo originale, oppure
+        con raise_on_error solleva TranslationError (la coda ritenta il lavoro).
+        """
         if not text or not text.strip():
             return text
         
         text = text.strip()
         
-        # Controlla cache in memoria
-        cache_key = f"{text}_{target_lang}"
-        if cache_key in self.cache:
-            return self.cache[cache_key]
+        # Controlla cache (memoria e tabella traduzioni_cache)
+        cached = self.cache.get(text, 'it', target_lang, include_original=not raise_on_error)
+        if cached is not None:
+            return cached
         
         # Controlla fallback locale
         if target_lang in self.fallback_translations:
             if text in self.fallback_translations[target_lang]:
                 translation = self.fallback_translations[target_lang][text]
-                self.cache[cache_key] = translation
+                self.cache.set(text, 'it', target_lang, translation, 'locale', persist=False)
                 return translation
         
-        # Prova Google Translate API gratuita (senza chiave)
-        try:
-            # Usa l'endpoint pubblico di Google Translate
-            url = "https://translate.googleapis.com/translate_a/single"
-            params = {
-                'client': 'gtx',
-                'sl': 'it',  # source language
-                'tl': target_lang,  # target language
-                'dt': 't',  # return translation
-                'q': text
-            }
-            
-            response = requests.get(url, params=params, timeout=10)
-            
-            if response.status_code == 200:
-                result = response.json()
-                if result and len(result) > 0 and len(result[0]) > 0:
-                    translation = result[0][0][0]
-                    self.cache[cache_key] = translation
-                    return translation
-                        
-        except Exception as e:
-            logger.warning(f"Errore Google Translate gratuito: {e}")
+        # Prova Google Translate API gratuita (senza chiave), saltata se il circuit breaker è aperto
+        if self.http.available('gtx'):
+            try:
+                # Usa l'endpoint pubblico di Google Translate
+                params = {
+                    'client': 'gtx',
+                    'sl': 'it',  # source language
+                    'tl': target_lang,  # target language
+                    'dt': 't',  # return translation
+                    'q': text
+                }
+                
+                response = self.http.get('gtx', self.gtx_url, params=params)
+                
+                if response.status_code == 200:
+                    result = response.json()
+                    if result and len(result) > 0 and len(result[0]) > 0:
+                        translation = result[0][0][0]
+                        self.cache.set(text, 'it', target_lang, translation, 'gtx')
+                        return translation
+                            
+            except Exception as e:
+                logger.warning(f"Errore Google Translate gratuito: {e}")
         
         # Prova Google Translate API con chiave (se disponibile)
-        if self.api_key:
+        if self.api_key and self.http.available('google_v2'):
             try:
                 params = {
                     'key': self.api_key,
@@ -143,195 +373,210 @@ class TranslationService:
                     'source': 'it'
                 }
                 
-                response = requests.get(self.base_url, params=params, timeout=10)
+                response = self.http.get('google_v2', self.base_url, params=params)
                 
                 if response.status_code == 200:
                     data = response.json()
                     if 'data' in data and 'translations' in data['data']:
                         translation = data['data']['translations'][0]['translatedText']
-                        self.cache[cache_key] = translation
+                        self.cache.set(text, 'it', target_lang, translation, 'google_v2')
                         return translation
                         
             except Exception as e:
                 logger.warning(f"Errore Google Translate API: {e}")
         
-        # Fallback: restituisce il testo originale
-        self.cache[cache_key] = text
+        if raise_on_error:
+            raise TranslationError(f"Nessun provider di traduzione disponibile per '{text[:50]}'")
+        
+        # Fallback: restituisce il testo originale (solo in memoria, per ritentare dopo un riavvio)
+        self.cache.set(text, 'it', target_lang, text, 'originale', persist=False)
         return text
 
-    def translate_and_save_product(self, product_id: int, nome: str, descrizione: str = None) -> Dict[str, str]:
+    def translate_and_save_product(self, product_id: int, nome: str, descrizione: str = None,
+                                   raise_on_error: bool = False) -> Dict[str, str]:
         """
         Traduce e salva le traduzioni di un prodotto direttamente nella tabella prodotti
         """
         translations = {}
         
         # Traduci nome
-        nome_en = self.translate_text(nome, 'en')
+        nome_en = self.translate_text(nome, 'en', raise_on_error)
         translations['nome_en'] = nome_en
         
         # Traduci descrizione se presente
         descrizione_en = None
         if descrizione and descrizione.strip():
-            descrizione_en = self.translate_text(descrizione, 'en')
+            descrizione_en = self.translate_text(descrizione, 'en', raise_on_error)
             translations['descrizione_en'] = descrizione_en
         
         # Salva nel database
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            if descrizione_en:
-                cursor.execute('''
-                    UPDATE prodotti 
-                    SET nome_en = ?, descrizione_en = ?, updated_at = CURRENT_TIMESTAMP
-                    WHERE id = ?
-                ''', (nome_en, descrizione_en, product_id))
-            else:
-                cursor.execute('''
-                    UPDATE prodotti 
-                    SET nome_en = ?, updated_at = CURRENT_TIMESTAMP
-                    WHERE id = ?
-                ''', (nome_en, product_id))
-            
-            conn.commit()
-            conn.close()
+            with db_connection() as conn:
+                cursor = conn.cursor()
+                
+                if descrizione_en:
+                    cursor.execute('''
+                        UPDATE prodotti 
+                        SET nome_en = ?, descrizione_en = ?, updated_at = CURRENT_TIMESTAMP
+                        WHERE id = ?
+                    ''', (nome_en, descrizione_en, product_id))
+                else:
+                    cursor.execute('''
+                        UPDATE prodotti 
+                        SET nome_en = ?, updated_at = CURRENT_TIMESTAMP
+                        WHERE id = ?
+                    ''', (nome_en, product_id))
+                
+                conn.commit()
             
-            logger.info(f"Traduzioni salvate per prodotto {product_id}: {translations}")
+            logger.info("Traduzioni salvate per prodotto %s", product_id,
+                        extra={'tabella': 'prodotti', 'elemento_id': product_id, 'lingue': list(translations)})
             
         except Exception as e:
             logger.error(f"Errore nel salvare traduzioni prodotto {product_id}: {e}")
+            if raise_on_error:
+                raise
         
         return translations
 
-    def translate_and_save_category(self, category_id: int, nome: str, descrizione: str = None) -> Dict[str, str]:
+    def translate_and_save_category(self, category_id: int, nome: str, descrizione: str = None,
+                                    raise_on_error: bool = False) -> Dict[str, str]:
         """
         Traduce e salva le traduzioni di una categoria direttamente nella tabella categorie
         """
         translations = {}
         
         # Traduci nome
-        nome_en = self.translate_text(nome, 'en')
+        nome_en = self.translate_text(nome, 'en', raise_on_error)
         translations['nome_en'] = nome_en
         
         # Traduci descrizione se presente
         descrizione_en = None
         if descrizione and descrizione.strip():
-            descrizione_en = self.translate_text(descrizione, 'en')
+            descrizione_en = self.translate_text(descrizione, 'en', raise_on_error)
             translations['descrizione_en'] = descrizione_en
         
         # Salva nel database
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            if descrizione_en:
-                cursor.execute('''
-                    UPDATE categorie 
-                    SET nome_en = ?, descrizione_en = ?
-                    WHERE id = ?
-                ''', (nome_en, descrizione_en, category_id))
-            else:
-                cursor.execute('''
-                    UPDATE categorie 
-                    SET nome_en = ?
-                    WHERE id = ?
-                ''', (nome_en, category_id))
-            
-            conn.commit()
-            conn.close()
+            with db_connection() as conn:
+                cursor = conn.cursor()
+                
+                if descrizione_en:
+                    cursor.execute('''
+                        UPDATE categorie 
+                        SET nome_en = ?, descrizione_en = ?
+                        WHERE id = ?
+                    ''', (nome_en, descrizione_en, category_id))
+                else:
+                    cursor.execute('''
+                        UPDATE categorie 
+                        SET nome_en = ?
+                        WHERE id = ?
+                    ''', (nome_en, category_id))
+                
+                conn.commit()
             
-            logger.info(f"Traduzioni salvate per categoria {category_id}: {translations}")
+            logger.info("Traduzioni salvate per categoria %s", category_id,
+                        extra={'tabella': 'categorie', 'elemento_id': category_id, 'lingue': list(translations)})
             
         except Exception as e:
             logger.error(f"Errore nel salvare traduzioni categoria {category_id}: {e}")
+            if raise_on_error:
+                raise
         
         return translations
 
-    def translate_and_save_allergen(self, allergen_id: int, nome: str, descrizione: str = None) -> Dict[str, str]:
+    def translate_and_save_allergen(self, allergen_id: int, nome: str, descrizione: str = None,
+                                    raise_on_error: bool = False) -> Dict[str, str]:
         """
         Traduce e salva le traduzioni di un allergene direttamente nella tabella allergeni
         """
         translations = {}
         
         # Traduci nome
-        nome_en = self.translate_text(nome, 'en')
+        nome_en = self.translate_text(nome, 'en', raise_on_error)
         translations['nome_en'] = nome_en
         
         # Traduci descrizione se presente
         descrizione_en = None
         if descrizione and descrizione.strip():
-            descrizione_en = self.translate_text(descrizione, 'en')
+            descrizione_en = self.translate_text(descrizione, 'en', raise_on_error)
             translations['descrizione_en'] = descrizione_en
         
         # Salva nel database
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            if descrizione_en:
-                cursor.execute('''
-                    UPDATE allergeni 
-                    SET nome_en = ?, descrizione_en = ?
-                    WHERE id = ?
-                ''', (nome_en, descrizione_en, allergen_id))
-            else:
-                cursor.execute('''
-                    UPDATE allergeni 
-                    SET nome_en = ?
-                    WHERE id = ?
-                ''', (nome_en, allergen_id))
-            
-            conn.commit()
-            conn.close()
+            with db_connection() as conn:
+                cursor = conn.cursor()
+                
+                if descrizione_en:
+                    cursor.execute('''
+                        UPDATE allergeni 
+                        SET nome_en = ?, descrizione_en = ?
+                        WHERE id = ?
+                    ''', (nome_en, descrizione_en, allergen_id))
+                else:
+                    cursor.execute('''
+                        UPDATE allergeni 
+                        SET nome_en = ?
+                        WHERE id = ?
+                    ''', (nome_en, allergen_id))
+                
+                conn.commit()
             
-            logger.info(f"Traduzioni salvate per allergene {allergen_id}: {translations}")
+            logger.info("Traduzioni salvate per allergene %s", allergen_id,
+                        extra={'tabella': 'allergeni', 'elemento_id': allergen_id, 'lingue': list(translations)})
             
         except Exception as e:
             logger.error(f"Errore nel salvare traduzioni allergene {allergen_id}: {e}")
+            if raise_on_error:
+                raise
         
         return translations
 
-    def translate_and_save_ingredient(self, ingredient_id: int, nome: str, descrizione: str = None) -> Dict[str, str]:
+    def translate_and_save_ingredient(self, ingredient_id: int, nome: str, descrizione: str = None,
+                                      raise_on_error: bool = False) -> Dict[str, str]:
         """
         Traduce e salva le traduzioni di un ingrediente direttamente nella tabella ingredienti
         """
         translations = {}
         
         # Traduci nome
-        nome_en = self.translate_text(nome, 'en')
+        nome_en = self.translate_text(nome, 'en', raise_on_error)
         translations['nome_en'] = nome_en
         
         # Traduci descrizione se presente
         descrizione_en = None
         if descrizione and descrizione.strip():
-            descrizione_en = self.translate_text(descrizione, 'en')
+            descrizione_en = self.translate_text(descrizione, 'en', raise_on_error)
             translations['descrizione_en'] = descrizione_en
         
         # Salva nel database
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            if descrizione_en:
-                cursor.execute('''
-                    UPDATE ingredienti 
-                    SET nome_en = ?, descrizione_en = ?
-                    WHERE id = ?
-                ''', (nome_en, descrizione_en, ingredient_id))
-            else:
-                cursor.execute('''
-                    UPDATE ingredienti 
-                    SET nome_en = ?
-                    WHERE id = ?
-                ''', (nome_en, ingredient_id))
-            
-            conn.commit()
-            conn.close()
+            with db_connection() as conn:
+                cursor = conn.cursor()
+                
+                if descrizione_en:
+                    cursor.execute('''
+                        UPDATE ingredienti 
+                        SET nome_en = ?, descrizione_en = ?
+                        WHERE id = ?
+                    ''', (nome_en, descrizione_en, ingredient_id))
+                else:
+                    cursor.execute('''
+                        UPDATE ingredienti 
+                        SET nome_en = ?
+                        WHERE id = ?
+                    ''', (nome_en, ingredient_id))
+                
+                conn.commit()
             
-            logger.info(f"Traduzioni salvate per ingrediente {ingredient_id}: {translations}")
+            logger.info("Traduzioni salvate per ingrediente %s", ingredient_id,
+                        extra={'tabella': 'ingredienti', 'elemento_id': ingredient_id, 'lingue': list(translations)})
             
         except Exception as e:
             logger.error(f"Errore nel salvare traduzioni ingrediente {ingredient_id}: {e}")
+            if raise_on_error:
+                raise
         
         return translations
 
@@ -340,24 +585,23 @@ class TranslationService:
         Recupera le traduzioni per un elemento specifico dal database
         """
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            if lang == 'en':
-                cursor.execute(f'''
-                    SELECT nome, nome_en, descrizione, descrizione_en 
-                    FROM {table} 
-                    WHERE id = ?
-                ''', (item_id,))
-            else:
-                cursor.execute(f'''
-                    SELECT nome, descrizione 
-                    FROM {table} 
-                    WHERE id = ?
-                ''', (item_id,))
-            
-            result = cursor.fetchone()
-            conn.close()
+            with db_connection() as conn:
+                cursor = conn.cursor()
+                
+                if lang == 'en':
+                    cursor.execute(f'''
+                        SELECT nome, nome_en, descrizione, descrizione_en 
+                        FROM {table} 
+                        WHERE id = ?
+                    ''', (item_id,))
+                else:
+                    cursor.execute(f'''
+                        SELECT nome, descrizione 
+                        FROM {table} 
+                        WHERE id = ?
+                    ''', (item_id,))
+                
+                result = cursor.fetchone()
             
             if result:
                 if lang == 'en' and len(result) == 4:
@@ -376,46 +620,162 @@ class TranslationService:
         
         return {}
 
-    def batch_translate_table(self, table: str, force_retranslate: bool = False) -> int:
+    def translate_batch(self, texts: List[str], target_lang: str = 'en') -> Dict[str, str]:
         """
-        Traduce tutti gli elementi di una tabella in batch
+        Traduce una lista di testi deduplicandoli. I testi già in cache non
+        generano chiamate; con la chiave API i restanti vengono inviati in
+        richieste multi-q dimensionate sui limiti del provider.
+        Restituisce un dizionario testo originale (strip) -> traduzione.
         """
+        unique_texts = list(dict.fromkeys(t.strip() for t in texts if t and t.strip()))
+        translations = {}
+        pending = []
+        
+        for text in unique_texts:
+            cached = self.cache.get(text, 'it', target_lang)
+            if cached is not None:
+                translations[text] = cached
+            elif text in self.fallback_translations.get(target_lang, {}):
+                translations[text] = self.translate_text(text, target_lang)
+            else:
+                pending.append(text)
+        
+        if pending and self.api_key:
+            for chunk in self._batch_chunks(pending):
+                translations.update(self._translate_many_v2(chunk, target_lang))
+        
+        # Senza chiave (o dopo un errore) l'endpoint gratuito accetta un solo testo per
+        # richiesta: i testi restano una chiamata ciascuno, distanziate da BATCH_PAUSE
+        for text in pending:
+            if text not in translations:
+                translations[text] = self.translate_text(text, target_lang)
+                time.sleep(self.BATCH_PAUSE)
+        
+        return translations
+    
+    def _batch_chunks(self, texts: List[str]) -> List[List[str]]:
+        chunks = []
+        current = []
+        current_chars = 0
+        for text in texts:
+            if current and (len(current) >= self.BATCH_MAX_SEGMENTS or
+                            current_chars + len(text) > self.BATCH_MAX_CHARS):
+                chunks.append(current)
+                current = []
+                current_chars = 0
+            current.append(text)
+            current_chars += len(text)
+        if current:
+            chunks.append(current)
+        return chunks
+    
+    def _translate_many_v2(self, texts: List[str], target_lang: str) -> Dict[str, str]:
+        """Traduce più testi con una sola richiesta all'API v2 con chiave"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
+            response = self.http.post('google_v2', self.base_url, data={
+                'key': self.api_key,
+                'q': texts,
+                'target': target_lang,
+                'source': 'it',
+                'format': 'text'
+            }, timeout=30)
             
-            # Seleziona elementi da tradurre
-            if force_retranslate:
-                cursor.execute(f'SELECT id, nome, descrizione FROM {table}')
-            else:
-                cursor.execute(f'SELECT id, nome, descrizione FROM {table} WHERE nome_en IS NULL OR nome_en = ""')
+            if response.status_code == 200:
+                data = response.json()
+                items = data.get('data', {}).get('translations', [])
+                if len(items) == len(texts):
+                    result = {}
+                    for text, item in zip(texts, items):
+                        translation = item['translatedText']
+                        self.cache.set(text, 'it', target_lang, translation, 'google_v2')
+                        result[text] = translation
+                    return result
+            logger.warning(f"Risposta inattesa da Google Translate API batch: HTTP {response.status_code}")
+        except Exception as e:
+            logger.warning(f"Errore Google Translate API batch: {e}")
+        return {}
+    
+    def batch_translate_tables(self, tables: List[str] = None, force_retranslate: bool = False) -> Dict[str, int]:
+        """
+        Traduce in blocco gli elementi delle tabelle indicate (tutte se None):
+        raccoglie nomi e descrizioni da tradurre, li traduce deduplicati con
+        translate_batch e scrive i risultati con executemany in un'unica transazione.
+        Restituisce per tabella il numero di righe aggiornate.
+        """
+        tables = list(tables or self.TRANSLATABLE_TABLES)
+        for table in tables:
+            if table not in self.TRANSLATABLE_TABLES:
+                raise ValueError(f"Tabella non traducibile: {table}")
+        
+        try:
+            # Le righe vengono lette e la connessione rilasciata: le chiamate HTTP
+            # e le pause di translate_batch non tengono occupato il pool
+            items = {}
+            with db_connection() as conn:
+                cursor = conn.cursor()
+                for table in tables:
+                    if force_retranslate:
+                        cursor.execute(f'SELECT id, nome, descrizione FROM {table}')
+                    else:
+                        cursor.execute(f'SELECT id, nome, descrizione FROM {table} WHERE nome_en IS NULL OR nome_en = ""')
+                    items[table] = cursor.fetchall()
             
-            items = cursor.fetchall()
-            conn.close()
+            texts = []
+            for rows in items.values():
+                for item_id, nome, descrizione in rows:
+                    texts.append(nome)
+                    texts.append(descrizione)
             
-            translated_count = 0
+            translations = self.translate_batch(texts, 'en')
             
-            for item_id, nome, descrizione in items:
-                if table == 'prodotti':
-                    self.translate_and_save_product(item_id, nome, descrizione)
-                elif table == 'categorie':
-                    self.translate_and_save_category(item_id, nome, descrizione)
-                elif table == 'allergeni':
-                    self.translate_and_save_allergen(item_id, nome, descrizione)
-                elif table == 'ingredienti':
-                    self.translate_and_save_ingredient(item_id, nome, descrizione)
+            # Le righe modificate nel frattempo non vengono sovrascritte:
+            # la loro traduzione è già stata accodata dagli endpoint CRUD
+            counts = {}
+            with db_connection() as conn:
+                cursor = conn.cursor()
+                for table, rows in items.items():
+                    updated_at = ', updated_at = CURRENT_TIMESTAMP' if table == 'prodotti' else ''
+                    with_description = []
+                    name_only = []
+                    for item_id, nome, descrizione in rows:
+                        nome_en = translations.get(nome.strip(), nome) if nome else nome
+                        if descrizione and descrizione.strip():
+                            with_description.append((nome_en, translations.get(descrizione.strip(), descrizione),
+                                                     item_id, nome, descrizione))
+                        else:
+                            name_only.append((nome_en, item_id, nome, descrizione))
+                    
+                    counts[table] = 0
+                    if with_description:
+                        cursor.executemany(f'''
+                            UPDATE {table}
+                            SET nome_en = ?, descrizione_en = ?{updated_at}
+                            WHERE id = ? AND nome IS ? AND descrizione IS ?
+                        ''', with_description)
+                        counts[table] += cursor.rowcount
+                    if name_only:
+                        cursor.executemany(f'''
+                            UPDATE {table}
+                            SET nome_en = ?{updated_at}
+                            WHERE id = ? AND nome IS ? AND descrizione IS ?
+                        ''', name_only)
+                        counts[table] += cursor.rowcount
                 
-                translated_count += 1
-                
-                # Pausa per evitare rate limiting
-                time.sleep(0.1)
+                conn.commit()
             
-            logger.info(f"Tradotti {translated_count} elementi dalla tabella {table}")
-            return translated_count
+            logger.info("Traduzione batch completata (%d testi distinti)", len(translations),
+                        extra={'conteggi': counts})
+            return counts
             
         except Exception as e:
-            logger.error(f"Errore nella traduzione batch della tabella {table}: {e}")
-            return 0
+            logger.error(f"Errore nella traduzione batch delle tabelle {tables}: {e}")
+            return {table: 0 for table in tables}
+
+    def batch_translate_table(self, table: str, force_retranslate: bool = False) -> int:
+        """
+        Traduce tutti gli elementi di una tabella in batch
+        """
+        return self.batch_translate_tables([table], force_retranslate)[table]
 
 # Istanza globale del servizio
 translation_service = TranslationService()
\ No newline at end of file
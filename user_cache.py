@@ -0,0 +1,156 @@
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Tuple
+
+from flask import has_request_context, session
+
+logger = logging.getLogger(__name__)
+
+USER_CACHE_TTL = int(os.getenv('USER_CACHE_TTL', '300'))
+USER_CACHE_MAX_SIZE = int(os.getenv('USER_CACHE_MAX_SIZE', '1000'))
+# Se attivo, id e username restano nella sessione firmata e il loader non tocca né cache né database
+USER_SESSION_IDENTITY = os.getenv('USER_SESSION_IDENTITY', 'false').lower() in ('1', 'true', 'yes')
+
+# Riga di utenti: (id, username, password_hash)
+UserRow = Tuple
+
+_CHIAVE_SESSIONE = '_identita_utente'
+
+
+class UserCache:
+    """
+    Cache in processo degli utenti caricati da Flask-Login.
+    Evita la SELECT su utenti ad ogni richiesta autenticata; le voci scadono
+    dopo `ttl` secondi e vanno invalidate esplicitamente quando un utente
+    cambia password o viene eliminato.
+
+    Con session_identity l'identità minima (id, username) viene conservata
+    nella sessione firmata per `ttl` secondi: un'invalidazione la revoca
+    nel processo corrente, negli altri worker scade al più tardi col TTL.
+    """
+
+    def __init__(self, ttl: int = 300, max_size: int = 1000, session_identity: bool = False):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.session_identity = session_identity
+        self._entries = OrderedDict()
+        self._revoked: Dict[str, float] = {}
+        self._revoked_all = 0.0
+        self._lock = threading.Lock()
+        self._stats = {
+            'caricamenti': 0,
+            'hit_sessione': 0,
+            'hit_cache': 0,
+            'miss': 0,
+            'invalidazioni': 0,
+            'tempo_loader_totale_ms': 0.0,
+            'tempo_loader_max_ms': 0.0,
+            'tempo_database_totale_ms': 0.0
+        }
+
+    def _from_session(self, key: str) -> Optional[UserRow]:
+        if not (self.session_identity and has_request_context()):
+            return None
+        identita = session.get(_CHIAVE_SESSIONE)
+        if not identita or str(identita.get('id')) != key:
+            return None
+        emessa = identita.get('emessa', 0)
+        revocata = max(self._revoked.get(key, 0.0), self._revoked_all)
+        if time.time() - emessa > self.ttl or emessa <= revocata:
+            session.pop(_CHIAVE_SESSIONE, None)
+            return None
+        return (identita['id'], identita['username'], None)
+
+    def _to_session(self, row: UserRow) -> None:
+        if self.session_identity and has_request_context():
+            session[_CHIAVE_SESSIONE] = {'id': row[0], 'username': row[1], 'emessa': time.time()}
+
+    def load(self, user_id, loader: Callable[[str], Optional[UserRow]]) -> Optional[UserRow]:
+        """
+        Restituisce la riga dell'utente dalla sessione, dalla cache o, se
+        mancante/scaduta, chiamando loader(user_id). Gli utenti inesistenti
+        non vengono messi in cache.
+        """
+        start = time.perf_counter()
+        key = str(user_id)
+        try:
+            row = self._from_session(key)
+            if row is not None:
+                with self._lock:
+                    self._stats['hit_sessione'] += 1
+                return row
+
+            now = time.monotonic()
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None and entry[1] > now:
+                    self._entries.move_to_end(key)
+                    self._stats['hit_cache'] += 1
+                    row = entry[0]
+            if row is not None:
+                return row
+
+            db_start = time.perf_counter()
+            row = loader(key)
+            db_ms = (time.perf_counter() - db_start) * 1000
+
+            with self._lock:
+                self._stats['miss'] += 1
+                self._stats['tempo_database_totale_ms'] += db_ms
+                if row is not None:
+                    self._entries[key] = (row, now + self.ttl)
+                    self._entries.move_to_end(key)
+                    while len(self._entries) > self.max_size:
+                        self._entries.popitem(last=False)
+                else:
+                    self._entries.pop(key, None)
+            if row is not None:
+                # L'identità in sessione parte solo da una lettura fresca del database
+                self._to_session(row)
+            return row
+        finally:
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            with self._lock:
+                self._stats['caricamenti'] += 1
+                self._stats['tempo_loader_totale_ms'] += elapsed_ms
+                if elapsed_ms > self._stats['tempo_loader_max_ms']:
+                    self._stats['tempo_loader_max_ms'] = elapsed_ms
+
+    def invalidate(self, user_id=None) -> None:
+        """
+        Da chiamare dopo cambio password o eliminazione di un utente
+        (tutti gli utenti se user_id è None).
+        """
+        with self._lock:
+            if user_id is None:
+                self._entries.clear()
+                self._revoked_all = time.time()
+            else:
+                self._entries.pop(str(user_id), None)
+                self._revoked[str(user_id)] = time.time()
+            self._stats['invalidazioni'] += 1
+        logger.debug(f"Cache utenti invalidata ({user_id if user_id is not None else 'tutti'})")
+
+    def clear_session(self) -> None:
+        """Rimuove l'identità dalla sessione (es. al logout)"""
+        if has_request_context():
+            session.pop(_CHIAVE_SESSIONE, None)
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats['voci'] = len(self._entries)
+            stats['ttl'] = self.ttl
+            stats['identita_in_sessione'] = self.session_identity
+        caricamenti = stats['caricamenti']
+        stats['tempo_loader_medio_ms'] = stats['tempo_loader_totale_ms'] / caricamenti if caricamenti else 0.0
+        hit = stats['hit_sessione'] + stats['hit_cache']
+        stats['hit_ratio'] = hit / caricamenti if caricamenti else 0.0
+        return stats
+
+
+# Istanza globale della cache utenti
+user_cache = UserCache(ttl=USER_CACHE_TTL, max_size=USER_CACHE_MAX_SIZE, session_identity=USER_SESSION_IDENTITY)